@@ -0,0 +1,120 @@
+"""
+Answer Parser - incremental parser for the sectioned answer format of the unified prompt
+"""
+from typing import Dict, List, Optional, Tuple
+
+# Section markers the unified prompt asks the model to write, and the section each one opens
+SECTION_MARKERS = {
+    "=== JAWABAN UTAMA ===": "answer",
+    "=== KESIMPULAN ===": "summary",
+    "=== SARAN PRAKTIS ===": "suggestions",
+    "=== SUMBER DOKUMEN ===": "sources",
+}
+# Text before the first marker (model preamble)
+PREAMBLE = "preamble"
+
+_LONGEST_MARKER = max(len(marker) for marker in SECTION_MARKERS)
+
+
+class StructuredAnswerParser:
+    """State machine over streamed model output: each delta is scanned once.
+
+    `feed` returns (section, text) events for text whose section is known; a tail
+    that could still be the start of a marker is held back until the next delta
+    decides it. Section texts and the raw output are kept as lists of parts and
+    joined once in `finish`, so a long answer costs linear time.
+    """
+
+    def __init__(self):
+        self.section = PREAMBLE
+        self.seen: List[str] = []
+        self._parts: Dict[str, List[str]] = {PREAMBLE: []}
+        self._raw: List[str] = []
+        self._pending = ""
+        self._texts: Optional[Dict[str, str]] = None
+
+    def _emit(self, text: str, events: List[Tuple[str, str]]):
+        if text:
+            self._parts.setdefault(self.section, []).append(text)
+            events.append((self.section, text))
+
+    def _held_back(self) -> int:
+        """Length of the longest suffix of the pending text that starts some marker"""
+        for size in range(min(len(self._pending), _LONGEST_MARKER - 1), 0, -1):
+            tail = self._pending[-size:]
+            if any(marker.startswith(tail) for marker in SECTION_MARKERS):
+                return size
+        return 0
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        """Consume one streamed delta; returns (section, text) events ready to show"""
+        self._raw.append(delta)
+        self._pending += delta
+        events: List[Tuple[str, str]] = []
+        while True:
+            found = [(self._pending.find(marker), marker) for marker in SECTION_MARKERS]
+            found = [(pos, marker) for pos, marker in found if pos >= 0]
+            if not found:
+                break
+            pos, marker = min(found)
+            self._emit(self._pending[:pos], events)
+            self.section = SECTION_MARKERS[marker]
+            self.seen.append(self.section)
+            events.append((self.section, ""))
+            self._pending = self._pending[pos + len(marker):]
+        keep = self._held_back()
+        self._emit(self._pending[:len(self._pending) - keep], events)
+        self._pending = self._pending[len(self._pending) - keep:]
+        return events
+
+    def finish(self) -> List[Tuple[str, str]]:
+        """Flush held-back text at the end of the stream"""
+        events: List[Tuple[str, str]] = []
+        self._emit(self._pending, events)
+        self._pending = ""
+        self._texts = {section: "".join(parts).strip() for section, parts in self._parts.items()}
+        self._texts["raw"] = "".join(self._raw)
+        return events
+
+    def text(self, section: str) -> str:
+        if self._texts is None:
+            self.finish()
+        return self._texts.get(section, "")
+
+    @property
+    def raw(self) -> str:
+        return self.text("raw")
+
+    def listed_sources(self) -> List[str]:
+        """'Dokumen: ...' entries the model wrote under SUMBER DOKUMEN"""
+        sources_text = self.text("sources")
+        if len(sources_text) <= 20:
+            return []
+        return [f"Dokumen: {item.strip()}" for item in sources_text.split("Dokumen:") if item.strip()]
+
+    def to_answer(self, sources: List[str]) -> Dict:
+        """Answer record (cache entry shape) from the parsed sections.
+
+        Without both the JAWABAN UTAMA and KESIMPULAN markers the whole output is
+        the answer. Suggestions saying there are none ("tidak ada saran") are dropped.
+        """
+        raw = self.raw
+        structured = "answer" in self.seen and "summary" in self.seen
+        response = self.text("answer") if structured else raw.strip()
+        suggestions = self.text("suggestions")
+        if "tidak ada saran" in suggestions.lower():
+            suggestions = ""
+        return {
+            'response': response or raw,
+            'sources': sources,
+            'summary': (self.text("summary") or None) if structured else None,
+            'suggestions': suggestions or None,
+        }
+
+
+def parse_answer(text: str) -> StructuredAnswerParser:
+    """Parse a complete (non-streamed) model output"""
+    parser = StructuredAnswerParser()
+    parser.feed(text)
+    parser.finish()
+    return parser
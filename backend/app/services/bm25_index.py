@@ -0,0 +1,231 @@
+"""
+BM25 Index - inverted index over chunk texts for exact-term (sparse) retrieval
+"""
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Function words that carry no meaning for regulation lookups
+STOPWORDS = frozenset("""
+ada adalah agar akan antara apa apabila atas atau bagaimana bagi bahwa baik belum berapa
+bila boleh dalam dan dapat dari demikian dengan di dia hal hanya harus ia ialah ini itu jika
+juga kami kapan karena ke kepada kita mana masih maupun mereka namun oleh pada para saat saja
+sama sampai saya secara sebagai sebagaimana sebelum sedang sehingga sejak selain seperti
+serta setelah siapa suatu sudah tanpa tentang tersebut tetapi untuk yaitu yakni yang
+""".split())
+
+# Words followed by a number or roman numeral that name a specific provision ("pasal 23",
+# "pp 95", "ipk 2,00"); the pair is indexed as one extra term so exact references outrank
+# chunks that merely contain both words somewhere
+REFERENCE_TERMS = frozenset("""
+pasal bab ayat huruf angka bagian paragraf lampiran nomor no pp uu perpres permen
+permendikbud permendikbudristek permenristekdikti kepmen sk perek peraturan semester
+sks ipk ips tahun
+""".split())
+
+_TOKEN_RE = re.compile(r"\d+(?:[.,/]\d+)*|[^\W\d_]+(?:-[^\W\d_]+)*")
+_ROMAN_RE = re.compile(r"^[ivxlc]+$")
+_PARTICLE_RE = re.compile(r"(?:lah|kah|tah|pun)$")
+_POSSESSIVE_RE = re.compile(r"(?:nya|ku|mu)$")
+
+
+def _strip_suffixes(word: str) -> str:
+    """Light Indonesian stemming: inflectional particles and possessives only.
+
+    Derivational affixes (me-, ber-, -an, ...) are kept: in regulations "peraturan"
+    and "mengatur" should not collapse into one term.
+    """
+    if len(word) > 5:
+        word = _PARTICLE_RE.sub("", word)
+    if len(word) > 5:
+        word = _POSSESSIVE_RE.sub("", word)
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of `text` for BM25.
+
+    Numbers keep their separators ("2,00", "95/2023"), reduplicated plurals collapse
+    ("mahasiswa-mahasiswa" -> "mahasiswa"), stopwords are dropped, and a reference
+    word followed by a number or roman numeral adds a joined term ("pasal_23").
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    terms: List[str] = []
+    previous = ""
+    for raw in _TOKEN_RE.findall(text):
+        is_number = raw[0].isdigit()
+        if is_number:
+            words = [raw.rstrip(".,/")]
+        else:
+            parts = raw.split("-")
+            words = parts[:1] if len(set(parts)) == 1 else parts
+        for word in words:
+            if previous in REFERENCE_TERMS and (is_number or _ROMAN_RE.match(word)):
+                terms.append(f"{previous}_{word}")
+            # "PP No. 95" refers to PP 95: keep the reference word across "no"/"nomor"
+            if not (word in ("no", "nomor") and previous in REFERENCE_TERMS):
+                previous = word
+            if not is_number:
+                if word in STOPWORDS or (len(word) < 2 and not _ROMAN_RE.match(word)):
+                    continue
+                word = _strip_suffixes(word)
+            terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, keyed by the same chunk ids as the FAISS index.
+
+    Two CSR layouts of the same counts are kept:
+      - per document (term ids + term frequencies), so an incremental rebuild reuses
+        the tokenization of every unchanged chunk;
+      - per term (postings), with the full BM25 weight of every posting precomputed,
+        so a query is a gather of a few postings lists and one `np.bincount`.
+    """
+
+    def __init__(self, ids: np.ndarray, vocab: Sequence[str], doc_indptr: np.ndarray,
+                 doc_terms: np.ndarray, doc_tf: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vocab = list(vocab)
+        self.k1 = k1
+        self.b = b
+        self._doc_indptr = np.asarray(doc_indptr, dtype=np.int64)
+        self._doc_terms = np.asarray(doc_terms, dtype=np.int32)
+        self._doc_tf = np.asarray(doc_tf, dtype=np.float32)
+        self._term_ids: Dict[str, int] = {term: i for i, term in enumerate(self.vocab)}
+        self._row_by_id = {int(cid): row for row, cid in enumerate(self.ids)}
+        self._build_postings()
+
+    def _build_postings(self):
+        n_docs = len(self.ids)
+        rows = np.repeat(np.arange(n_docs, dtype=np.int32), np.diff(self._doc_indptr))
+        # Document length counts repeated terms, not distinct ones
+        doc_len = np.bincount(rows, weights=self._doc_tf, minlength=n_docs)
+        avg_len = float(doc_len.mean()) if n_docs and doc_len.mean() > 0 else 1.0
+
+        order = np.argsort(self._doc_terms, kind="stable")
+        self._post_docs = rows[order]
+        terms = self._doc_terms[order]
+        tf = self._doc_tf[order]
+        df = np.bincount(terms, minlength=len(self.vocab))
+        self._post_indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * doc_len[self._post_docs] / avg_len)
+        self._post_weight = (idf[terms] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+    @classmethod
+    def build(cls, chunks: Iterable[Dict], previous: Optional["BM25Index"] = None,
+              k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Index `chunks` (dicts with id and text); chunks already in `previous` are not re-tokenized"""
+        ids: List[int] = []
+        counts: List[Counter] = []
+        for chunk in chunks:
+            cid = int(chunk["id"])
+            row = previous._row_by_id.get(cid) if previous is not None else None
+            if row is not None:
+                counts.append(previous._doc_counts(row))
+            else:
+                counts.append(Counter(tokenize(chunk["text"])))
+            ids.append(cid)
+
+        term_ids: Dict[str, int] = {}
+        doc_indptr = [0]
+        doc_terms: List[int] = []
+        doc_tf: List[int] = []
+        for doc in counts:
+            for term, tf in doc.items():
+                doc_terms.append(term_ids.setdefault(term, len(term_ids)))
+                doc_tf.append(tf)
+            doc_indptr.append(len(doc_terms))
+        return cls(np.array(ids, dtype=np.int64), list(term_ids), np.array(doc_indptr),
+                   np.array(doc_terms, dtype=np.int32), np.array(doc_tf, dtype=np.float32), k1, b)
+
+    @classmethod
+    def empty(cls) -> "BM25Index":
+        return cls.build([])
+
+    def _doc_counts(self, row: int) -> Counter:
+        start, end = self._doc_indptr[row], self._doc_indptr[row + 1]
+        return Counter({self.vocab[t]: int(tf) for t, tf in zip(self._doc_terms[start:end], self._doc_tf[start:end])})
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Chunk ids and BM25 scores of the best `k` chunks sharing a term with `query`"""
+        term_ids = {self._term_ids[t] for t in tokenize(query) if t in self._term_ids}
+        if not term_ids or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        spans = [slice(self._post_indptr[t], self._post_indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self._post_docs[s] for s in spans])
+        weights = np.concatenate([self._post_weight[s] for s in spans])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.ids))
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return self.ids[matched], scores[matched].astype(np.float32)
+
+    def idf(self, terms: Sequence[str]) -> np.ndarray:
+        """BM25 idf of each term (terms not in the index get the idf of df = 0)"""
+        df = np.array([self._post_indptr[t + 1] - self._post_indptr[t] if t is not None else 0
+                       for t in (self._term_ids.get(term) for term in terms)], dtype=np.float64)
+        return np.log1p((len(self.ids) - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def term_presence(self, chunk_ids: Sequence[int], terms: Sequence[str]) -> np.ndarray:
+        """Boolean (chunks x terms) matrix: chunk contains term. Unknown chunks get an all-False row."""
+        presence = np.zeros((len(chunk_ids), len(terms)), dtype=bool)
+        term_ids = np.array([self._term_ids.get(term, -1) for term in terms], dtype=np.int64)
+        found = [(i, row) for i, row in enumerate(self._row_by_id.get(int(cid)) for cid in chunk_ids)
+                 if row is not None]
+        if not found or not (term_ids >= 0).any():
+            return presence
+        rows = np.array([row for _, row in found])
+        starts, ends = self._doc_indptr[rows], self._doc_indptr[rows + 1]
+        doc_terms = np.concatenate([self._doc_terms[a:b] for a, b in zip(starts, ends)])
+        owner = np.repeat([i for i, _ in found], ends - starts)
+        order = np.argsort(term_ids)
+        sorted_ids = term_ids[order]
+        pos = np.minimum(np.searchsorted(sorted_ids, doc_terms), len(sorted_ids) - 1)
+        hit = sorted_ids[pos] == doc_terms
+        presence[owner[hit], order[pos[hit]]] = True
+        return presence
+
+    def save(self, path: str):
+        """Write to a temp file, then rename over `path`"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, version=FORMAT_VERSION, ids=self.ids, vocab=np.array(self.vocab, dtype=str),
+                     doc_indptr=self._doc_indptr, doc_terms=self._doc_terms, doc_tf=self._doc_tf,
+                     params=np.array([self.k1, self.b], dtype=np.float64))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != FORMAT_VERSION:
+                raise ValueError(f"unsupported BM25 index version {int(data['version'])}")
+            k1, b = (float(v) for v in data["params"])
+            return cls(data["ids"], data["vocab"].tolist(), data["doc_indptr"], data["doc_terms"],
+                       data["doc_tf"], k1, b)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank), rank from 1.
+
+    Only ranks are used, so cosine similarities and BM25 scores never have to be put
+    on one scale. Returns (id, fused score), best first; ties keep first-seen order.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            cid = int(cid)
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,301 @@
+"""
+Cache Backends - storage for QueryCache (memory, SQLite file, Redis protocol)
+
+All backends store JSON-serializable dict values and enforce the same policy:
+TTL expiry, LRU eviction, a maximum entry count and a maximum total byte size.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class CacheBackend:
+    """Interface shared by all QueryCache storage backends"""
+
+    name = "base"
+
+    def __init__(self, max_entries: int = 100, max_bytes: int = 50 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _encode(value: Dict) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    def _decode(raw: bytes) -> Dict:
+        return json.loads(raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw)
+
+    def get(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def usage(self) -> Tuple[int, int]:
+        """Return (entry count, total bytes)"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        entries, total_bytes = self.usage()
+        return {
+            'backend': self.name,
+            'size': entries,
+            'bytes': total_bytes,
+            'max_size': self.max_entries,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process OrderedDict (the original QueryCache behaviour)"""
+
+    name = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # key -> (encoded value, stored_at)
+        self._data: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        raw, stored_at = item
+        if time.time() - stored_at >= self.ttl_seconds:
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return self._decode(raw)
+
+    def set(self, key: str, value: Dict):
+        raw = self._encode(value)
+        if len(raw) > self.max_bytes:
+            return
+        self.delete(key)
+        self._data[key] = (raw, time.time())
+        self._bytes += len(raw)
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            oldest, (old_raw, _) = self._data.popitem(last=False)
+            self._bytes -= len(old_raw)
+            print(f"[CACHE] Evicted oldest entry")
+
+    def delete(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[0])
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def usage(self) -> Tuple[int, int]:
+        return len(self._data), self._bytes
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Local file cache shared by every uvicorn worker on the host.
+
+    WAL mode lets readers run concurrently with one writer; writes take an
+    IMMEDIATE transaction so eviction decisions are consistent across processes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_cache_last_access ON query_cache (last_access)")
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM query_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            raw, stored_at = row
+            if now - stored_at >= self.ttl_seconds:
+                self._conn.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE query_cache SET last_access = ? WHERE key = ?", (now, key))
+        return self._decode(raw)
+
+    def set(self, key: str, value: Dict):
+        raw = self._encode(value)
+        if len(raw) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, value, size, stored_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, raw, len(raw), now, now),
+                )
+                # Expired rows first, then least recently used until under both caps
+                self._conn.execute("DELETE FROM query_cache WHERE stored_at <= ?", (now - self.ttl_seconds,))
+                count, total = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_cache"
+                ).fetchone()
+                if count > self.max_entries or total > self.max_bytes:
+                    victims = []
+                    for victim_key, size in self._conn.execute(
+                        "SELECT key, size FROM query_cache WHERE key != ? ORDER BY last_access ASC", (key,)
+                    ):
+                        if count <= self.max_entries and total <= self.max_bytes:
+                            break
+                        victims.append((victim_key,))
+                        count -= 1
+                        total -= size
+                    self._conn.executemany("DELETE FROM query_cache WHERE key = ?", victims)
+                    print(f"[CACHE] Evicted {len(victims)} entries")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM query_cache")
+
+    def usage(self) -> Tuple[int, int]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_cache"
+            ).fetchone()
+        return int(count), int(total)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache on a Redis-protocol server (Redis, Valkey, KeyDB or a local stand-in).
+
+    Only basic commands are used (GET/SET EX/DEL/ZADD/ZRANGE/ZREM/HSET/HGET/HDEL/INCRBY),
+    LRU order lives in a sorted set and sizes in a hash, so the byte cap does
+    not depend on the server's maxmemory policy.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, prefix: str = "chatbot:query_cache", client=None, **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("QUERY_CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            client = redis.Redis.from_url(url)
+        # Any client speaking the same commands works, e.g. an in-process stand-in in tests
+        self.client = client
+        self.prefix = prefix
+        self._lru_key = f"{prefix}:lru"
+        self._sizes_key = f"{prefix}:sizes"
+        self._bytes_key = f"{prefix}:bytes"
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        raw = self.client.get(self._entry_key(key))
+        if raw is None:
+            # Expired by Redis TTL; drop its bookkeeping
+            if self.client.hget(self._sizes_key, key) is not None:
+                self.delete(key)
+            return None
+        self.client.zadd(self._lru_key, {key: time.time()})
+        return self._decode(raw)
+
+    def set(self, key: str, value: Dict):
+        raw = self._encode(value)
+        if len(raw) > self.max_bytes:
+            return
+        previous = self.client.hget(self._sizes_key, key)
+        pipe = self.client.pipeline()
+        pipe.set(self._entry_key(key), raw, ex=max(1, int(self.ttl_seconds)))
+        pipe.zadd(self._lru_key, {key: time.time()})
+        pipe.hset(self._sizes_key, key, len(raw))
+        pipe.incrby(self._bytes_key, len(raw) - int(previous or 0))
+        pipe.execute()
+        self._evict(protect=key)
+
+    def _evict(self, protect: str):
+        evicted = 0
+        while True:
+            count = self.client.zcard(self._lru_key)
+            total = int(self.client.get(self._bytes_key) or 0)
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            oldest = self.client.zrange(self._lru_key, 0, 1)
+            victims = [v.decode() if isinstance(v, bytes) else v for v in oldest]
+            victims = [v for v in victims if v != protect]
+            if not victims:
+                break
+            self.delete(victims[0])
+            evicted += 1
+        if evicted:
+            print(f"[CACHE] Evicted {evicted} entries")
+
+    def delete(self, key: str):
+        size = self.client.hget(self._sizes_key, key)
+        pipe = self.client.pipeline()
+        pipe.delete(self._entry_key(key))
+        pipe.zrem(self._lru_key, key)
+        pipe.hdel(self._sizes_key, key)
+        if size is not None:
+            pipe.incrby(self._bytes_key, -int(size))
+        pipe.execute()
+
+    def clear(self):
+        keys = [k.decode() if isinstance(k, bytes) else k for k in self.client.zrange(self._lru_key, 0, -1)]
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.delete(self._entry_key(key))
+        pipe.delete(self._lru_key, self._sizes_key, self._bytes_key)
+        pipe.execute()
+
+    def usage(self) -> Tuple[int, int]:
+        return int(self.client.zcard(self._lru_key)), int(self.client.get(self._bytes_key) or 0)
+
+
+def create_cache_backend(kind: str, max_entries: int, max_bytes: int, ttl_seconds: float,
+                         path: Optional[str] = None, redis_url: Optional[str] = None) -> CacheBackend:
+    """Build the backend selected by QUERY_CACHE_BACKEND"""
+    kind = (kind or "memory").lower()
+    common = dict(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    if kind == "sqlite":
+        return SQLiteCacheBackend(path, **common)
+    if kind == "redis":
+        return RedisCacheBackend(redis_url or "redis://localhost:6379/0", **common)
+    if kind != "memory":
+        raise ValueError(f"Unknown QUERY_CACHE_BACKEND: {kind} (expected memory, sqlite or redis)")
+    return MemoryCacheBackend(**common)
@@ -0,0 +1,167 @@
+"""
+Chunk Store - compact, memory-mappable storage of document chunks
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# One row per chunk; the text itself lives in the UTF-8 blob at [offset, offset + length)
+ROW_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<i4'),
+    ('file', '<i4'),
+    ('hash', 'u1', (32,)),
+    ('heading', '<i4'),
+])
+FORMAT_VERSION = 2
+
+
+class ChunkStore:
+    """Read-only chunk table: text blob + row array + interned file table.
+
+    Files on disk (`<path>` is a base name):
+      <path>.text.bin   chunk texts, UTF-8, back to back
+      <path>.rows.npy   ROW_DTYPE array: FAISS id, blob offset/length, file id, sha256,
+                        byte length of the heading path the text starts with
+      <path>.files.json [[filename, filepath], ...] plus counts used to check the set
+
+    `load` memory-maps the blob and rows, so startup cost and resident memory stay
+    flat as the corpus grows; only chunks that are read get decoded. Chunks come
+    back as the same dicts the JSON chunk list used (id, content_hash, text,
+    filename, filepath) plus their heading path ('' when the chunk has none).
+    """
+
+    def __init__(self, text: np.ndarray, rows: np.ndarray, files: List[List[str]]):
+        self._text = text
+        self._rows = rows
+        self._files = files
+        # Row positions sorted by id, for id -> row lookups without a per-chunk dict
+        self._by_id = np.argsort(rows['id'], kind='stable')
+        self._sorted_ids = rows['id'][self._by_id]
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict]) -> "ChunkStore":
+        """Build a store from chunk dicts. Chunks without an id get their list position."""
+        blob = bytearray()
+        rows = []
+        file_ids: Dict[str, int] = {}
+        files: List[List[str]] = []
+        for position, chunk in enumerate(chunks):
+            text = chunk['text'].encode('utf-8')
+            filename = chunk.get('filename', '')
+            if filename not in file_ids:
+                file_ids[filename] = len(files)
+                files.append([filename, chunk.get('filepath', '')])
+            digest = (bytes.fromhex(chunk['content_hash']) if chunk.get('content_hash')
+                      else hashlib.sha256(text).digest())
+            heading = chunk.get('heading', '').encode('utf-8')
+            rows.append((int(chunk.get('id', position)), len(blob), len(text), file_ids[filename],
+                         np.frombuffer(digest, dtype=np.uint8), len(heading) if text.startswith(heading) else 0))
+            blob += text
+        return cls(np.frombuffer(bytes(blob), dtype=np.uint8), np.array(rows, dtype=ROW_DTYPE), files)
+
+    @classmethod
+    def empty(cls) -> "ChunkStore":
+        return cls(np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=ROW_DTYPE), [])
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in range(len(self._rows)):
+            yield self[row]
+
+    def __getitem__(self, row: int) -> Dict:
+        record = self._rows[row]
+        offset, length = int(record['offset']), int(record['length'])
+        filename, filepath = self._files[int(record['file'])]
+        text = self._text[offset:offset + length].tobytes()
+        return {
+            'id': int(record['id']),
+            'content_hash': record['hash'].tobytes().hex(),
+            'text': text.decode('utf-8'),
+            'heading': text[:int(record['heading'])].decode('utf-8'),
+            'filename': filename,
+            'filepath': filepath,
+        }
+
+    def row_of(self, chunk_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self._sorted_ids, chunk_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == chunk_id:
+            return int(self._by_id[pos])
+        return None
+
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        row = self.row_of(chunk_id)
+        return None if row is None else self[row]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.asarray(self._rows['id'])
+
+    @property
+    def filenames(self) -> List[str]:
+        return [filename for filename, _ in self._files]
+
+    def file_mask(self, filenames: Iterable[str]) -> np.ndarray:
+        """Boolean row mask of chunks that belong to any of `filenames`"""
+        wanted = set(filenames)
+        file_ids = [i for i, (filename, _) in enumerate(self._files) if filename in wanted]
+        return np.isin(self._rows['file'], file_ids)
+
+    def counts_by_filename(self) -> Dict[str, int]:
+        counts = np.bincount(self._rows['file'], minlength=len(self._files)) if len(self._rows) else []
+        return {filename: int(count) for (filename, _), count in zip(self._files, counts) if count}
+
+    def save(self, path: str):
+        """Write every file to a temp path, then rename; the file table goes last and
+        records the sizes, so `load` can tell a torn set of files apart."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.text.bin.tmp", "wb") as f:
+            f.write(self._text.tobytes())
+        with open(f"{path}.rows.npy.tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self._rows))
+        with open(f"{path}.files.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({'version': FORMAT_VERSION, 'chunk_count': len(self._rows),
+                       'text_bytes': int(self._text.size), 'files': self._files}, f, ensure_ascii=False)
+        for suffix in (".text.bin", ".rows.npy", ".files.json"):
+            os.replace(f"{path}{suffix}.tmp", f"{path}{suffix}")
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return all(os.path.exists(f"{path}{suffix}") for suffix in (".text.bin", ".rows.npy", ".files.json"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "ChunkStore":
+        """Open a saved store; without `mmap` the files are read into private memory"""
+        with open(f"{path}.files.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        rows = np.load(f"{path}.rows.npy", mmap_mode="r" if mmap else None)
+        if meta.get('version', 1) < FORMAT_VERSION:
+            # Stores written before heading paths: copy into the current row layout (no headings)
+            upgraded = np.zeros(len(rows), dtype=ROW_DTYPE)
+            for name in rows.dtype.names:
+                upgraded[name] = rows[name]
+            rows = upgraded
+        text_bytes = os.path.getsize(f"{path}.text.bin")
+        if len(rows) != meta['chunk_count'] or text_bytes != meta['text_bytes']:
+            raise ValueError(f"chunk store files out of sync: {len(rows)} rows/{text_bytes} bytes, "
+                             f"expected {meta['chunk_count']}/{meta['text_bytes']}")
+        if not mmap:
+            text = np.fromfile(f"{path}.text.bin", dtype=np.uint8)
+        elif text_bytes:
+            text = np.memmap(f"{path}.text.bin", dtype=np.uint8, mode="r")
+        else:
+            # np.memmap cannot map an empty file
+            text = np.zeros(0, dtype=np.uint8)
+        return cls(text, rows, [list(entry) for entry in meta['files']])
+
+    @classmethod
+    def from_json(cls, json_path: str) -> "ChunkStore":
+        """Convert a doc_chunks.json chunk list (the previous on-disk format)"""
+        with open(json_path, "r", encoding="utf-8") as f:
+            return cls.from_chunks(json.load(f))
@@ -0,0 +1,129 @@
+"""
+Context Packer - fit retrieved chunks into a token budget for the RAG prompt
+"""
+import math
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count without a tokenizer: ~4 characters per word piece, 1 per punctuation mark.
+
+    Errs on the high side for Indonesian text, so a packed context stays under budget.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECE_RE.findall(text))
+
+
+def _overlap(head: str, tail: str, min_chars: int = 20, max_chars: int = 400) -> int:
+    """Length of the longest suffix of `head` that `tail` starts with (0 below `min_chars`)"""
+    for size in range(min(len(head), len(tail), max_chars), min_chars - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+def _body(chunk: Dict) -> str:
+    """Chunk text without the heading path line it starts with"""
+    text, heading = chunk["text"], chunk.get("heading") or ""
+    if heading and text.startswith(heading):
+        return text[len(heading):].lstrip("\n")
+    return text
+
+
+class PackedContext:
+    """Result of `pack_context`: prompt text plus what went into it"""
+
+    def __init__(self, text: str, chunks: List[Dict], tokens: int, budget: int, dropped: int, merged: int):
+        self.text = text
+        self.chunks = chunks
+        self.tokens = tokens
+        self.budget = budget
+        self.dropped = dropped
+        self.merged = merged
+
+    @property
+    def files(self) -> List[str]:
+        return list(dict.fromkeys(chunk["filename"] for chunk in self.chunks))
+
+
+def pack_context(chunks: Sequence[Dict], budget_tokens: int, score: Callable[[Dict], float],
+                 position: Optional[Callable[[Dict], Optional[int]]] = None,
+                 count_tokens: Callable[[str], int] = estimate_tokens) -> PackedContext:
+    """Assemble the context block for retrieved `chunks` within `budget_tokens`.
+
+    1. Chunks whose text is contained in another retrieved chunk are dropped.
+    2. Chunks that are neighbours in their file (`position` returns consecutive values)
+       are merged into one passage, with the overlapping span between sliding-window
+       chunks written once. A heading path identical to the previous chunk's is
+       dropped; a different one (the next Pasal, or the next ayat span of a split
+       Pasal) stays as a line between the two, so every provision keeps its label.
+    3. Passages are ranked by their best chunk `score` and added greedily while they
+       fit; a passage that does not fit is skipped in favour of smaller ones after it.
+       If not even the best passage fits, it is cut at a line or sentence end.
+
+    Every passage is labelled with its file so the model can name its sources.
+    """
+    ranked = sorted(chunks, key=score, reverse=True)
+    unique: List[Dict] = []
+    for chunk in ranked:
+        if any(chunk["text"] in kept["text"] for kept in unique):
+            continue
+        unique.append(chunk)
+    dropped = len(chunks) - len(unique)
+
+    # Group neighbours: sort by (file, position), then split wherever positions are not consecutive
+    groups: List[List[Dict]] = []
+    if position is not None:
+        placed = [c for c in unique if position(c) is not None]
+        unplaced = [c for c in unique if position(c) is None]
+        for chunk in sorted(placed, key=lambda c: (c["filename"], position(c))):
+            last = groups[-1][-1] if groups else None
+            if last is not None and last["filename"] == chunk["filename"] and position(chunk) == position(last) + 1:
+                groups[-1].append(chunk)
+            else:
+                groups.append([chunk])
+        groups.extend([chunk] for chunk in unplaced)
+    else:
+        groups = [[chunk] for chunk in unique]
+    merged = sum(len(group) - 1 for group in groups)
+
+    passages = []
+    for group in groups:
+        text = group[0]["text"]
+        for previous, chunk in zip(group, group[1:]):
+            same_heading = (chunk.get("heading") or "") == (previous.get("heading") or "")
+            body = _body(chunk) if same_heading else chunk["text"]
+            cut = _overlap(text, body)
+            text = f"{text}{body[cut:]}" if cut else f"{text}\n{body}"
+        passages.append({"text": f"[Dokumen: {group[0]['filename']}]\n{text}", "chunks": group,
+                         "score": max(score(chunk) for chunk in group)})
+    passages.sort(key=lambda p: p["score"], reverse=True)
+
+    selected: List[Dict] = []
+    used = 0
+    for passage in passages:
+        cost = count_tokens(passage["text"])
+        if used + cost <= budget_tokens:
+            selected.append(passage)
+            used += cost
+        else:
+            dropped += len(passage["chunks"])
+
+    if not selected and passages:
+        best = passages[0]
+        dropped -= len(best["chunks"])
+        text = best["text"]
+        while text and count_tokens(text) > budget_tokens:
+            # Drop the last line, or the last sentence of a single long line
+            cut = max(text.rfind("\n"), text.rfind(". ") + 1)
+            text = text[:cut] if cut > 0 else text[:len(text) * 3 // 4]
+        selected = [{**best, "text": text}]
+        used = count_tokens(text)
+
+    return PackedContext(
+        text="\n\n".join(p["text"] for p in selected),
+        chunks=[chunk for p in selected for chunk in p["chunks"]],
+        tokens=used, budget=budget_tokens, dropped=dropped, merged=merged,
+    )
@@ -0,0 +1,126 @@
+"""
+Degradation - per-request latency budget and answers that need no language model
+"""
+import asyncio
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+# Degradation levels, from a full model answer down to giving up
+FULL = "full"
+CACHED_NEAR_MATCH = "cached_near_match"
+EXTRACTIVE = "extractive"
+UNAVAILABLE = "unavailable"
+LEVELS = (FULL, CACHED_NEAR_MATCH, EXTRACTIVE, UNAVAILABLE)
+
+_SENTENCE_END_RE = re.compile(r"[.;:](?=\s)")
+
+
+class RequestBudget:
+    """Wall-clock budget of one request, split across ordered stages.
+
+    `shares` maps stage -> fraction of the total; each stage ends at the cumulative
+    share of the budget, so time a fast stage leaves over carries into the next one.
+    Times are `loop.time()` values, the clock OpenRouter deadlines already use.
+    """
+
+    def __init__(self, total_seconds: float, shares: Dict[str, float]):
+        self.total = total_seconds
+        self.start = asyncio.get_running_loop().time()
+        self.end = self.start + total_seconds
+        self._stage_end: Dict[str, float] = {}
+        elapsed_share = 0.0
+        for stage, share in shares.items():
+            elapsed_share += share
+            self._stage_end[stage] = self.start + total_seconds * min(elapsed_share, 1.0)
+
+    def now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def remaining(self) -> float:
+        return max(0.0, self.end - self.now())
+
+    def time_left(self, stage: str) -> float:
+        """Seconds until `stage` must be done (never past the overall end)"""
+        return max(0.0, min(self._stage_end.get(stage, self.end), self.end) - self.now())
+
+    def elapsed(self) -> float:
+        return self.now() - self.start
+
+
+async def consume_stream(open_stream: Callable[[], Awaitable[AsyncIterator]], on_item: Callable[[Any], None],
+                         deadline: float):
+    """Open a stream and pass every item to `on_item`, all before the `loop.time()` deadline.
+
+    An HTTP read timeout only bounds the wait for each next chunk, so a stream that
+    stalls or trickles could run far past the request budget. Here opening and
+    reading share one timeout: at the deadline the stream is closed and
+    asyncio.TimeoutError raised. Items already passed on stay delivered.
+    """
+    loop = asyncio.get_running_loop()
+    stream = None
+
+    async def _run():
+        nonlocal stream
+        stream = await open_stream()
+        async for item in stream:
+            on_item(item)
+
+    try:
+        await asyncio.wait_for(_run(), timeout=max(0.0, deadline - loop.time()))
+    finally:
+        if stream is not None:
+            await stream.close()
+
+
+class DegradationMetrics:
+    """How often each degradation level answered a request"""
+
+    def __init__(self):
+        self.counts = {level: 0 for level in LEVELS}
+        self.reasons: Dict[str, int] = {}
+
+    def record(self, level: str, reason: Optional[str] = None):
+        self.counts[level] = self.counts.get(level, 0) + 1
+        if reason:
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def stats(self) -> Dict:
+        total = sum(self.counts.values())
+        degraded = total - self.counts[FULL]
+        return {
+            'counts': dict(self.counts),
+            'reasons': dict(self.reasons),
+            'degraded_rate': round(degraded / total, 4) if total else 0.0,
+        }
+
+
+def _excerpt(text: str, max_chars: int) -> str:
+    """`text` cut at the last sentence end before `max_chars`"""
+    if len(text) <= max_chars:
+        return text
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(text, 0, max_chars)]
+    cut = ends[-1] if ends and ends[-1] > max_chars // 2 else max_chars
+    return text[:cut].rstrip() + " ..."
+
+
+def extractive_answer(chunks: Sequence[Dict], max_chunks: int = 3, max_chars: int = 700) -> Dict:
+    """Answer record quoting the best retrieved passages, for when the model cannot answer in time"""
+    quoted: List[str] = []
+    files: List[str] = []
+    for chunk in list(chunks)[:max_chunks]:
+        heading = chunk.get('heading') or ""
+        body = chunk['text'][len(heading):].lstrip("\n") if heading and chunk['text'].startswith(heading) else chunk['text']
+        quoted.append(f"**{heading or chunk['filename']}**\n{_excerpt(body.strip(), max_chars)}")
+        if chunk['filename'] not in files:
+            files.append(chunk['filename'])
+    response = (
+        "Maaf, layanan model sedang tidak tersedia sehingga jawaban lengkap belum dapat disusun. "
+        "Berikut kutipan paling relevan dari dokumen peraturan:\n\n" + "\n\n".join(quoted)
+    )
+    return {
+        'response': response,
+        'sources': [f"Dokumen: {filename}" for filename in files],
+        'summary': None,
+        'suggestions': None,
+        'degraded': EXTRACTIVE,
+    }
@@ -0,0 +1,93 @@
+"""
+Document Extraction - .docx text extraction and chunking, optionally on a process pool
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from docx import Document
+
+from app.services.structured_chunker import structured_chunks
+
+
+def extract_paragraphs_from_docx(filepath) -> List[str]:
+    """Non-empty paragraphs of a .docx file, stripped, in document order."""
+    doc = Document(filepath)
+    return [para.text.strip() for para in doc.paragraphs if para.text.strip()]
+
+
+def extract_text_from_docx(filepath):
+    """Extracts text from a .docx file."""
+    return "\n".join(extract_paragraphs_from_docx(filepath))
+
+
+def chunk_text(text, max_chars=1000, overlap=100):
+    """Chunks text into smaller pieces with optional overlap."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        chunk = text[start:end]
+        chunks.append(chunk)
+        if end == len(text):
+            break
+        start += (max_chars - overlap)
+    return chunks
+
+
+def extract_chunks(filepath: str, strategy: str = "structured", max_chars: int = 1500) -> List[Dict]:
+    """Chunks ({'heading', 'text'}) of one .docx (runs inside pool workers, so it only needs python-docx).
+
+    "structured" splits on BAB/Pasal/ayat boundaries; "fixed" is the 1000-character
+    sliding window with 100 characters of overlap and no headings.
+    """
+    if strategy == "fixed":
+        return [{"heading": "", "text": chunk} for chunk in chunk_text(extract_text_from_docx(filepath))]
+    return structured_chunks(extract_paragraphs_from_docx(filepath), max_chars=max_chars)
+
+
+def extract_many(filepaths: Sequence[str], workers: int = 1,
+                 on_file: Optional[Callable[[int], None]] = None, strategy: str = "structured",
+                 max_chars: int = 1500) -> Tuple[Dict[str, List[Dict]], Dict[str, str]]:
+    """Extract and chunk `filepaths`, in parallel when `workers` > 1.
+
+    Returns (chunks by path, error message by path). Both dicts follow the order of
+    `filepaths` no matter which worker finished first, so chunk order is stable.
+    `on_file` gets the number of files finished so far.
+    """
+    results: Dict[str, List[Dict]] = {}
+    errors: Dict[str, str] = {}
+    workers = max(1, min(workers, len(filepaths)))
+
+    if workers == 1:
+        for done, path in enumerate(filepaths, start=1):
+            try:
+                results[path] = extract_chunks(path, strategy, max_chars)
+            except Exception as e:
+                errors[path] = str(e)
+            if on_file:
+                on_file(done)
+    else:
+        # spawn: forking a process that runs threads (uvicorn, the embedding pool) can deadlock.
+        # Spawned workers import this module (python-docx only) but also re-import the parent's
+        # __main__ script: entry points keep app imports out of module level (rebuild_index.py),
+        # or run under `uvicorn main:app`, whose __main__ is uvicorn's. `python main.py` loads the
+        # whole app in every worker.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(extract_chunks, path, strategy, max_chars): path for path in filepaths}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    errors[path] = str(e)
+                if on_file:
+                    on_file(done)
+
+    return ({path: results[path] for path in filepaths if path in results},
+            {path: errors[path] for path in filepaths if path in errors})
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
@@ -0,0 +1,135 @@
+"""
+Embedding Pipeline - concurrent, rate-limited batch embedding for index builds
+"""
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then take them"""
+        if self.rate <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# HTTP statuses worth another attempt: rate limited or a transient server-side failure
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+# Transport errors of requests / httpx, matched by class name so neither has to be imported
+_TRANSIENT_ERROR_NAMES = frozenset({"ConnectionError", "Timeout", "TimeoutException", "TransportError"})
+# The Nomic client raises a plain Exception whose message starts with "<status>: <body>"
+_STATUS_PREFIX_RE = re.compile(r"^\W*(\d{3})\s*[:,]")
+
+
+def error_status(err: Exception) -> Optional[int]:
+    """HTTP status carried by `err`: a `status_code`/`status` attribute, the attached
+    response (requests.HTTPError, httpx.HTTPStatusError) or a leading status code."""
+    for source in (err, getattr(err, "response", None)):
+        for attr in ("status_code", "status"):
+            value = getattr(source, attr, None)
+            if isinstance(value, int):
+                return value
+    match = _STATUS_PREFIX_RE.match(str(err))
+    return int(match.group(1)) if match else None
+
+
+def is_retryable_embedding_error(err: Exception) -> bool:
+    """Rate limits, 5xx and connection problems are worth another attempt.
+
+    Decided from the exception type and HTTP status, never from words in the
+    message: a 400 about "500 texts" or a "timeout" field is not transient.
+    """
+    if isinstance(err, (ConnectionError, TimeoutError)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(err).__mro__):
+        return True
+    return error_status(err) in RETRYABLE_STATUS
+
+
+def embed_in_batches(
+    texts: Sequence[str],
+    embed_batch: Callable[[List[str]], Sequence[Sequence[float]]],
+    on_batch: Callable[[List[int], np.ndarray], None],
+    batch_size: int = 100,
+    concurrency: int = 4,
+    limiter: Optional[TokenBucket] = None,
+    max_attempts: int = 5,
+    backoff_base: float = 1.0,
+    backoff_max: float = 30.0,
+) -> Dict[int, str]:
+    """Embed `texts` in batches, `concurrency` batches at a time.
+
+    Every batch takes one token from `limiter` per attempt and is retried with
+    exponential backoff + full jitter on retryable errors. `on_batch(positions,
+    vectors)` is called in the calling thread for each finished batch, so it can
+    store and checkpoint results without locking. Vectors that come back empty,
+    all-zero or non-finite are never passed on.
+
+    Returns {position: error} for every text that could not be embedded.
+    """
+    batches = [list(range(i, min(i + batch_size, len(texts)))) for i in range(0, len(texts), batch_size)]
+    failures: Dict[int, str] = {}
+
+    def _run(positions: List[int]) -> np.ndarray:
+        batch_texts = [texts[p] for p in positions]
+        for attempt in range(1, max_attempts + 1):
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                vectors = np.asarray(embed_batch(batch_texts), dtype=np.float32)
+                if vectors.ndim != 2 or len(vectors) != len(batch_texts):
+                    raise ValueError(f"Nomic returned {len(vectors)} embeddings for {len(batch_texts)} inputs")
+                return vectors
+            except Exception as err:
+                if attempt == max_attempts or not is_retryable_embedding_error(err):
+                    raise
+                delay = random.uniform(0, min(backoff_max, backoff_base * (2 ** (attempt - 1))))
+                print(f"[EMBED_PIPELINE] Retryable error on batch at {positions[0]}: {err}. "
+                      f"Backing off {delay:.2f}s (attempt {attempt}/{max_attempts})")
+                time.sleep(delay)
+
+    if not batches:
+        return failures
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        futures = {pool.submit(_run, positions): positions for positions in batches}
+        for future in as_completed(futures):
+            positions = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as err:
+                print(f"[EMBED_PIPELINE] Batch at {positions[0]} failed: {err}")
+                failures.update({p: str(err) for p in positions})
+                continue
+            valid = np.isfinite(vectors).all(axis=1) & np.any(vectors != 0, axis=1)
+            for p, ok in zip(positions, valid):
+                if not ok:
+                    failures[p] = "empty or invalid embedding"
+            kept = [i for i, ok in enumerate(valid) if ok]
+            if kept:
+                on_batch([positions[i] for i in kept], vectors[kept])
+    return failures
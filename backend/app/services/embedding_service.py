@@ -6,7 +6,7 @@ import os
 import numpy as np
 from nomic import embed
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Tuple
+from typing import List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,10 +14,17 @@ logger = logging.getLogger(__name__)
 class EmbeddingService:
     """Service untuk generate embedding secara async"""
     
-    def __init__(self, api_key: str, model: str = "nomic-embed-text-v1.5", max_workers: int = 4):
+    def __init__(self, api_key: str, model: str = "nomic-embed-text-v1.5", max_workers: int = 4,
+                 max_in_flight: int = 8, timeout: Optional[float] = 10.0):
         self.api_key = api_key
         self.model = model
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Batas permintaan embedding yang berjalan bersamaan per proses;
+        # permintaan berikutnya menunggu slot tanpa memblokir event loop
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
         # Authentication for Nomic SDK uses NOMIC_API_KEY env var
         if os.getenv("NOMIC_API_KEY") is None and api_key:
             # Allow passing api_key to set env for this process
@@ -42,28 +49,44 @@ class EmbeddingService:
             logger.error(f"Error generating embedding: {e}")
             raise
     
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Dibuat saat pertama dipakai agar terikat ke event loop yang sedang berjalan
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def _run_bounded(self, func, *args):
+        """Run a blocking Nomic call in the thread pool under the in-flight limit and timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        semaphore = self._get_semaphore()
+        # Timeout mencakup waktu menunggu slot dan panggilan ke Nomic
+        await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        self.in_flight += 1
+        future = loop.run_in_executor(self.executor, func, *args)
+
+        def _release(done: asyncio.Future):
+            # Slot dilepas saat thread selesai, bukan saat timeout: panggilan Nomic yang
+            # sudah ditinggalkan pemanggilnya tetap dihitung sampai benar-benar berakhir
+            self.in_flight -= 1
+            semaphore.release()
+            if not done.cancelled():
+                done.exception()
+
+        future.add_done_callback(_release)
+        remaining = None if deadline is None else max(0.0, deadline - loop.time())
+        # shield: a timeout abandons the call without marking the thread's future done early
+        return await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+
     async def generate_embedding_async(self, text: str, task_type: str = "RETRIEVAL_QUERY") -> np.ndarray:
         """Generate embedding secara async (non-blocking)"""
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(
-            self.executor,
-            self._generate_embedding_sync,
-            text,
-            task_type
-        )
-        return embedding
+        return await self._run_bounded(self._generate_embedding_sync, text, task_type)
     
     async def generate_embeddings_batch(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[np.ndarray]:
         """Generate multiple embeddings in one Nomic batch call"""
         if not texts:
             return []
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._generate_embeddings_batch_sync,
-            texts,
-            task_type,
-        )
+        return await self._run_bounded(self._generate_embeddings_batch_sync, texts, task_type)
 
     def _generate_embeddings_batch_sync(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[np.ndarray]:
         task = "search_document" if (task_type or "").upper().endswith("DOCUMENT") else "search_query"
@@ -83,6 +106,14 @@ class EmbeddingService:
         """Generate embedding secara sync (untuk backward compatibility)"""
         return self._generate_embedding_sync(text, task_type)
     
+    def stats(self) -> dict:
+        """Current load of the embedding pipeline"""
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'timeout_seconds': self.timeout,
+        }
+
     def close(self):
         """Close thread pool executor"""
         self.executor.shutdown(wait=True)
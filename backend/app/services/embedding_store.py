@@ -0,0 +1,159 @@
+"""
+Embedding Store - on-disk embedding cache keyed by (model, dimension, task, content hash)
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def content_hash(text: str) -> str:
+    """sha256 of the chunk text; identical text always maps to the same embedding"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+STORE_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+class EmbeddingStore:
+    """Persistent map of content hash -> embedding vector for one (model, dimension, task).
+
+    Saved as `<path>.npy` (float32 or float16 matrix) plus `<path>.json` (row keys,
+    model, dimension and task type). The matrix is memory-mapped on load, so a large
+    cache costs no RAM until rows are read. A store written for another model,
+    dimension or task is discarded on load, since its vectors are not comparable
+    with new ones.
+    """
+
+    def __init__(self, path: str, model: str, dimension: int = 768, task_type: str = "search_document",
+                 dtype: str = "float32"):
+        self.path = path
+        self.model = model
+        self.dimension = dimension
+        self.task_type = task_type
+        self.dtype = STORE_DTYPES[dtype]
+        # (key -> row, matrix) swapped as one reference, so a reader on another thread
+        # (MMR on the event loop) never pairs a row map with the wrong matrix. put_many
+        # only appends keys whose rows lie past every matrix published before, and
+        # readers treat a row beyond their matrix as missing; prune publishes new objects.
+        self._state: Tuple[Dict[str, int], np.ndarray] = ({}, np.zeros((0, dimension), dtype=self.dtype))
+        # Writable, over-allocated storage the published matrix is a prefix view of once rows
+        # are added; it grows geometrically, so a rebuild's put_many calls copy each row O(1) times
+        self._buffer: Optional[np.ndarray] = None
+        self._write_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._state[0])
+
+    def __contains__(self, key: str) -> bool:
+        rows, vectors = self._state
+        return rows.get(key, len(vectors)) < len(vectors)
+
+    def missing(self, keys: Iterable[str]) -> List[str]:
+        """Keys without a stored embedding, in first-seen order"""
+        seen = set()
+        result = []
+        for key in keys:
+            if key not in self and key not in seen:
+                seen.add(key)
+                result.append(key)
+        return result
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        rows, vectors = self._state
+        row = rows.get(key, len(vectors))
+        return None if row >= len(vectors) else np.asarray(vectors[row], dtype=np.float32)
+
+    def get_many(self, keys: List[str]) -> np.ndarray:
+        """float32 matrix of embeddings for `keys` (all of them must be present)"""
+        vectors, found = self.lookup(keys)
+        if not found.all():
+            raise KeyError(f"{int((~found).sum())} of {len(keys)} keys have no stored embedding")
+        return vectors
+
+    def lookup(self, keys: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(float32 matrix, found mask) for `keys` from one consistent view; missing rows are zero"""
+        rows, vectors = self._state
+        positions = np.array([rows.get(key, len(vectors)) for key in keys], dtype=np.int64)
+        found = positions < len(vectors)
+        result = np.zeros((len(keys), self.dimension), dtype=np.float32)
+        if found.any():
+            result[found] = vectors[positions[found]]
+        return result, found
+
+    def put_many(self, keys: List[str], vectors) -> int:
+        """Store new embeddings; zero vectors (failed embedding calls) are not kept"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dimension}")
+        with self._write_lock:
+            rows, current = self._state
+            keep = [i for i, key in enumerate(keys) if key not in rows and np.any(vectors[i])]
+            if not keep:
+                return 0
+            start = len(current)
+            end = start + len(keep)
+            if self._buffer is None or len(self._buffer) < end:
+                # First write after load/prune (the rows may be a read-only map) or out of room
+                capacity = max(end, 2 * start, 1024)
+                buffer = np.empty((capacity, self.dimension), dtype=self.dtype)
+                buffer[:start] = current
+                self._buffer = buffer
+            self._buffer[start:end] = vectors[keep]
+            # Publish the longer matrix first: until the keys are added it just has unused rows
+            self._state = (rows, self._buffer[:end])
+            for offset, i in enumerate(keep):
+                rows[keys[i]] = start + offset
+            return len(keep)
+
+    def prune(self, keep_keys: Iterable[str]) -> int:
+        """Drop embeddings no chunk refers to any more"""
+        with self._write_lock:
+            keep_keys = [key for key in dict.fromkeys(keep_keys) if key in self]
+            removed = len(self) - len(keep_keys)
+            if removed:
+                vectors = self.get_many(keep_keys).astype(self.dtype)
+                self._state = ({key: row for row, key in enumerate(keep_keys)}, vectors)
+                self._buffer = None
+            return removed
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._write_lock:
+            rows, vectors = self._state
+            keys = sorted(rows, key=rows.get)
+        # Write to temp files first so a crash never leaves keys and vectors out of sync
+        with open(f"{self.path}.npy.tmp", "wb") as f:
+            np.save(f, np.asarray(vectors, dtype=self.dtype))
+        with open(f"{self.path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({'model': self.model, 'dimension': self.dimension, 'task_type': self.task_type,
+                       'dtype': np.dtype(self.dtype).name, 'keys': keys}, f)
+        os.replace(f"{self.path}.npy.tmp", f"{self.path}.npy")
+        os.replace(f"{self.path}.json.tmp", f"{self.path}.json")
+
+    def load(self) -> "EmbeddingStore":
+        if not (os.path.exists(f"{self.path}.npy") and os.path.exists(f"{self.path}.json")):
+            return self
+        try:
+            with open(f"{self.path}.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # Stores written before task types were recorded only held document embeddings
+            stored = (meta.get('model'), meta.get('dimension'), meta.get('task_type', "search_document"))
+            if stored != (self.model, self.dimension, self.task_type):
+                print(f"[EMBED_STORE] Stored embeddings are for {stored[0]} ({stored[1]}d, {stored[2]}); starting empty")
+                return self
+            vectors = np.load(f"{self.path}.npy", mmap_mode="r")
+            if len(vectors) != len(meta['keys']):
+                raise ValueError(f"{len(vectors)} vectors for {len(meta['keys'])} keys")
+            # Read-only memory map; the first put_many/prune copies it into memory
+            vectors = vectors if vectors.dtype == self.dtype else vectors.astype(self.dtype)
+            with self._write_lock:
+                self._state = ({key: row for row, key in enumerate(meta['keys'])}, vectors)
+                self._buffer = None
+            print(f"[EMBED_STORE] Loaded {len(self)} stored embeddings")
+        except Exception as e:
+            print(f"[EMBED_STORE] Could not load embedding store: {e}; starting empty")
+        return self
@@ -0,0 +1,94 @@
+"""
+Index Generation - identifies which knowledge-base build an answer came from
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+
+def file_fingerprint(filepath: str) -> str:
+    """sha256 of the file contents"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexGeneration:
+    """Generation id of the loaded index plus a fingerprint of every source file.
+
+    Cache entries carry a stamp from `stamp()`. An entry from an older generation is
+    still current under the "sources" policy when every file it was answered from is
+    unchanged, so a rebuild only drops answers that depend on changed or deleted
+    documents instead of emptying the whole cache. The "strict" policy drops every
+    entry from an older generation.
+    """
+
+    def __init__(self, generation: int = 0, files: Optional[Dict[str, str]] = None,
+                 built_at: Optional[str] = None, policy: str = "sources"):
+        self.generation = generation
+        self.files: Dict[str, str] = files or {}
+        self.built_at = built_at
+        self.policy = policy
+
+    def stamp(self, filenames: Iterable[str]) -> Dict:
+        """Stamp for a cache entry built from `filenames`"""
+        return {
+            'generation': self.generation,
+            'files': {fn: self.files.get(fn) for fn in filenames},
+        }
+
+    def is_current(self, stamp: Optional[Dict]) -> bool:
+        if not stamp:
+            return False
+        if stamp.get('generation', -1) >= self.generation:
+            return True
+        if self.policy != "sources":
+            return False
+        files = stamp.get('files') or {}
+        return bool(files) and all(
+            fingerprint is not None and self.files.get(fn) == fingerprint
+            for fn, fingerprint in files.items()
+        )
+
+    def update(self, other: "IndexGeneration"):
+        """Switch to another build in place (caches hold a reference to this object)"""
+        self.generation = other.generation
+        self.files = dict(other.files)
+        self.built_at = other.built_at
+
+    def next(self, files: Dict[str, str]) -> "IndexGeneration":
+        return IndexGeneration(
+            generation=self.generation + 1,
+            files=files,
+            built_at=datetime.utcnow().isoformat(),
+            policy=self.policy,
+        )
+
+    def to_dict(self) -> Dict:
+        return {'generation': self.generation, 'built_at': self.built_at, 'files': self.files}
+
+    def save(self, path: str, **extra):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**self.to_dict(), **extra}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, policy: str = "sources") -> "IndexGeneration":
+        if not os.path.exists(path):
+            return cls(policy=policy)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f), policy=policy)
+
+    @classmethod
+    def from_dict(cls, meta: Dict, policy: str = "sources") -> "IndexGeneration":
+        return cls(
+            generation=int(meta.get('generation', 0)),
+            files=meta.get('files') or {},
+            built_at=meta.get('built_at'),
+            policy=policy,
+        )
@@ -0,0 +1,236 @@
+"""
+Index Jobs - run knowledge-base rebuilds in the background and report their progress
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: rebuilds are only serialized within one process
+    fcntl = None
+
+
+class IndexJob:
+    """One queued or running rebuild.
+
+    `reasons` lists every request merged into this job (e.g. three uploads made
+    while an earlier rebuild was still running). Progress is reported per stage,
+    and the ETA is extrapolated from the rate of the current stage.
+    """
+
+    def __init__(self, full_rebuild: bool = False, reason: str = "",
+                 on_change: Optional[Callable[["IndexJob"], None]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.full_rebuild = full_rebuild
+        self.reasons: List[str] = [reason] if reason else []
+        self.status = "queued"
+        self.stage = "queued"
+        self.processed = 0
+        self.total = 0
+        self.error: Optional[str] = None
+        self.result: Dict = {}
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._stage_started = time.monotonic()
+        # Called with the job when its progress should be saved (at most once a second per stage)
+        self._on_change = on_change
+        self._saved_at = 0.0
+
+    def merge(self, full_rebuild: bool, reason: str):
+        self.full_rebuild = self.full_rebuild or full_rebuild
+        if reason:
+            self.reasons.append(reason)
+
+    def progress(self, stage: str, processed: int = 0, total: int = 0):
+        """Progress callback; safe to call from the worker thread doing the rebuild"""
+        now = time.monotonic()
+        if stage != self.stage:
+            self._stage_started = now
+            self._saved_at = 0.0
+        self.stage = stage
+        self.processed = processed
+        self.total = total
+        if self._on_change is not None and now - self._saved_at >= 1.0:
+            self._saved_at = now
+            self._on_change(self)
+
+    def eta_seconds(self) -> Optional[float]:
+        if self.status != "running" or not self.total or not self.processed:
+            return None
+        elapsed = time.monotonic() - self._stage_started
+        return round(elapsed / self.processed * (self.total - self.processed), 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'processed': self.processed,
+            'total': self.total,
+            'eta_seconds': self.eta_seconds(),
+            'full_rebuild': self.full_rebuild,
+            'reasons': self.reasons,
+            'error': self.error,
+            'result': self.result,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+@contextmanager
+def build_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `path` held by one process at a time (blocking).
+
+    Worker processes and rebuild_index.py take it around a rebuild so two builds of
+    the same index never run at once. Without fcntl (Windows) it does nothing.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class IndexJobQueue:
+    """Runs rebuilds one at a time on a background task.
+
+    A request submitted while a job is still queued joins that job instead of
+    adding another one, so back-to-back uploads lead to a single rebuild. Jobs wait
+    `debounce` seconds before starting to give a burst of uploads time to arrive.
+
+    With `status_dir`, every job's status is also written to <status_dir>/<id>.json,
+    so any worker process can report on a job another one is running.
+    """
+
+    def __init__(self, runner: Callable[[IndexJob], Awaitable[Dict]], debounce: float = 2.0,
+                 history: int = 50, status_dir: Optional[str] = None):
+        self._runner = runner
+        self.debounce = debounce
+        self.history = history
+        self.status_dir = status_dir
+        self._jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self._pending: Optional[IndexJob] = None
+        self._running: Optional[IndexJob] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, full_rebuild: bool = False, reason: str = "") -> IndexJob:
+        if self._pending is not None:
+            self._pending.merge(full_rebuild, reason)
+            self._save(self._pending)
+            return self._pending
+        job = IndexJob(full_rebuild=full_rebuild, reason=reason, on_change=self._save)
+        self._pending = job
+        self._jobs[job.id] = job
+        self._save(job)
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status not in ("done", "failed"):
+                break
+            self._jobs.popitem(last=False)
+            self._forget(oldest)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IndexJob]:
+        return list(reversed(self._jobs.values()))
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Status of a job run by this process or, from its status file, by another one"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.status_dir is None or not all(c.isalnum() for c in job_id):
+            return None
+        return self._read(os.path.join(self.status_dir, f"{job_id}.json"))
+
+    def statuses(self) -> List[Dict]:
+        """Recent jobs of every process sharing `status_dir`, newest first"""
+        found = {job.id: job.to_dict() for job in self._jobs.values()}
+        if self.status_dir is not None and os.path.isdir(self.status_dir):
+            for name in os.listdir(self.status_dir):
+                if name.endswith(".json") and name[:-5] not in found:
+                    status = self._read(os.path.join(self.status_dir, name))
+                    if status is not None:
+                        found[status['id']] = status
+        return sorted(found.values(), key=lambda status: status['created_at'], reverse=True)[:self.history]
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, job: IndexJob):
+        if self.status_dir is None:
+            return
+        try:
+            os.makedirs(self.status_dir, exist_ok=True)
+            path = os.path.join(self.status_dir, f"{job.id}.json")
+            # Progress is saved from the rebuild thread, transitions from the event loop
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[INDEX_JOB] Could not save the status of job {job.id}: {e}")
+
+    def _forget(self, job: IndexJob):
+        if self.status_dir is not None:
+            try:
+                os.remove(os.path.join(self.status_dir, f"{job.id}.json"))
+            except OSError:
+                pass
+
+    @property
+    def running(self) -> Optional[IndexJob]:
+        return self._running
+
+    async def _work(self):
+        while self._pending is not None:
+            await asyncio.sleep(self.debounce)
+            job, self._pending = self._pending, None
+            self._running = job
+            job.status = "running"
+            job.started_at = datetime.utcnow().isoformat()
+            self._save(job)
+            try:
+                job.result = await self._runner(job) or {}
+                job.status = "done"
+                job.stage = "done"
+            except Exception as e:
+                print(f"[INDEX_JOB] Job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.utcnow().isoformat()
+                self._running = None
+                self._save(job)
+
+    async def close(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
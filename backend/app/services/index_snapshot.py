@@ -0,0 +1,141 @@
+"""
+Index Snapshot - one consistent (index, chunks, BM25, generation) view for readers
+"""
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.services.bm25_index import BM25Index
+from app.services.chunk_store import ChunkStore
+from app.services.index_generation import IndexGeneration
+from app.services.vector_index import read_index, search_parameters
+
+
+def build_paths(directory: str) -> Tuple[str, str, str]:
+    """(FAISS index, chunk store base name, BM25 index) paths of the build saved in `directory`"""
+    return (os.path.join(directory, "faiss_index.bin"), os.path.join(directory, "chunks"),
+            os.path.join(directory, "bm25.npz"))
+
+
+def published_build_dir(vector_db_dir: str, meta: Dict) -> Optional[str]:
+    """Directory of the build `meta` (index_meta.json) publishes: `vector_db_dir` itself for a
+    build saved before per-build directories, None when the published build is empty."""
+    if 'build_dir' not in meta:
+        return vector_db_dir
+    return os.path.join(vector_db_dir, meta['build_dir']) if meta['build_dir'] else None
+
+
+def published_build_paths(vector_db_dir: str) -> Optional[Tuple[str, str, str]]:
+    """`build_paths` of the build published in `vector_db_dir` (None when it is empty)"""
+    meta_path = os.path.join(vector_db_dir, "index_meta.json")
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    build_dir = published_build_dir(vector_db_dir, meta)
+    return build_paths(build_dir) if build_dir else None
+
+
+class IndexSnapshot:
+    """A FAISS index together with the chunk store, BM25 index and generation it was built with.
+
+    A snapshot is never modified after it is published. Rebuilds create a new one
+    off to the side and swap the module-level reference in a single assignment, so
+    a request that grabbed a snapshot keeps a matching index and chunk list until it
+    finishes, whatever happens to the knowledge base meanwhile.
+
+    On disk every build gets its own directory (`save_build`); the index metadata
+    file names the published one, so readers never pair files of different builds.
+    """
+
+    __slots__ = ("index", "chunks", "generation", "settings", "mapped", "bm25", "files", "index_path")
+
+    def __init__(self, index: Optional[faiss.Index] = None, chunks: Optional[ChunkStore] = None,
+                 generation: int = 0, settings: Optional[Dict] = None, mapped: bool = False,
+                 bm25: Optional[BM25Index] = None, files: Optional[Dict[str, str]] = None,
+                 index_path: Optional[str] = None):
+        self.index = index
+        self.chunks = chunks if chunks is not None else ChunkStore.empty()
+        self.generation = generation
+        self.settings: Dict = dict(settings or {})
+        # True when the index vectors are memory-mapped from disk (read-only, shared page cache)
+        self.mapped = mapped
+        # Sparse index over the same chunk ids, for exact-term retrieval
+        self.bm25 = bm25 if bm25 is not None else BM25Index.empty()
+        # Fingerprint of every source file in this build, for stamping answers made from it
+        self.files: Dict[str, str] = dict(files or {})
+        # File the index was read from (None for a build that was never loaded from disk)
+        self.index_path = index_path
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None and len(self.chunks) > 0
+
+    @property
+    def vector_count(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def get_chunk(self, idx) -> Optional[Dict]:
+        """Chunk for an id returned by `index.search` (-1 means no result)"""
+        return self.chunks.get(int(idx)) if idx >= 0 else None
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """`index.search` with this snapshot's search settings (nprobe/efSearch) passed per call"""
+        search = self.settings.get('search') or {}
+        params = search_parameters(self.index, search.get('nprobe'), search.get('ef_search'))
+        return self.index.search(queries, k, params=params)
+
+    def stamp(self, filenames: Iterable[str]) -> Dict:
+        """Cache stamp for an answer built from this snapshot's chunks of `filenames`.
+
+        Taken from the snapshot rather than the live IndexGeneration, so an answer that
+        finishes after a rebuild was published is still stamped with the build it used.
+        """
+        return IndexGeneration(self.generation, self.files).stamp(filenames)
+
+    def with_settings(self, **changes) -> "IndexSnapshot":
+        """Same index and chunks with updated settings (e.g. new search parameters, used by `search`)"""
+        return IndexSnapshot(self.index, self.chunks, self.generation, {**self.settings, **changes},
+                             self.mapped, self.bm25, self.files, self.index_path)
+
+    def save(self, index_path: str, chunks_path: str, bm25_path: str):
+        """Write everything to temp paths, then rename them over the old ones"""
+        faiss.write_index(self.index, f"{index_path}.tmp")
+        self.chunks.save(chunks_path)
+        self.bm25.save(bm25_path)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def save_build(self, root: str) -> str:
+        """Save into a new directory under `root` and return its name.
+
+        The directory is tagged with the generation and never written again, so the
+        files only become visible as a set once the caller points the index metadata
+        at it (one rename).
+        """
+        directory = tempfile.mkdtemp(prefix=f"gen-{self.generation}-", dir=root)
+        self.save(*build_paths(directory))
+        return os.path.basename(directory)
+
+    @classmethod
+    def load(cls, index_path: str, chunks_path: str, bm25_path: str, generation: int = 0,
+             settings: Optional[Dict] = None, mmap: bool = True,
+             files: Optional[Dict[str, str]] = None) -> "IndexSnapshot":
+        """Open saved files; with `mmap` the index (where supported) and chunk store are mapped.
+
+        A missing or stale BM25 file (e.g. saved before it existed) is rebuilt from the
+        chunk store and written back; that needs no embedding calls.
+        """
+        index, mapped = read_index(index_path, mmap=mmap)
+        chunks = ChunkStore.load(chunks_path, mmap=mmap)
+        if index.ntotal != len(chunks):
+            raise ValueError(f"index holds {index.ntotal} vectors but {len(chunks)} chunks were saved")
+        bm25 = BM25Index.load(bm25_path) if os.path.exists(bm25_path) else None
+        if bm25 is None or not np.array_equal(bm25.ids, chunks.ids):
+            print(f"[INDEX] Building the BM25 index for {len(chunks)} chunks")
+            bm25 = BM25Index.build(chunks)
+            bm25.save(bm25_path)
+        return cls(index, chunks, generation, settings, mapped, bm25, files, index_path)
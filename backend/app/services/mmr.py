@@ -0,0 +1,64 @@
+"""
+MMR - maximal marginal relevance selection of diverse retrieval results
+"""
+from typing import List, Optional
+
+import numpy as np
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def scale_relevance(scores: np.ndarray) -> np.ndarray:
+    """`scores` scaled to [0, 1] by their maximum, for `mmr_select(relevance=...)`.
+
+    Negative scores are shifted up by the minimum first; when no score is above the
+    rest (all zero, all equal, or empty) every candidate gets relevance 1, so the
+    selection never sees NaN or inf.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.size == 0:
+        return scores
+    if scores.min() < 0:
+        scores = scores - scores.min()
+    top = scores.max()
+    if top <= 0:
+        return np.ones_like(scores)
+    return scores / top
+
+
+def mmr_select(query: np.ndarray, vectors: np.ndarray, k: int, lambda_: float = 0.7,
+               relevance: Optional[np.ndarray] = None) -> List[int]:
+    """Positions of `k` candidates picked greedily by maximal marginal relevance.
+
+    Each step takes argmax  lambda_ * relevance - (1 - lambda_) * max cosine to the
+    already picked ones, so a near-duplicate of a picked chunk loses to a slightly
+    less relevant chunk that adds something new. `relevance` defaults to the cosine
+    of each candidate with `query`; pass e.g. fused retrieval scores scaled to [0, 1]
+    to keep another ranking signal. lambda_ = 1 keeps the relevance order.
+
+    Candidate vectors that are all zero (unknown) never count as redundant.
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return []
+    unit = _unit_rows(vectors)
+    if relevance is None:
+        relevance = unit @ _unit_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+    relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = unit @ unit.T
+
+    selected: List[int] = []
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(k, n)):
+        gain = lambda_ * relevance - (1 - lambda_) * max_similarity
+        gain[~available] = -np.inf
+        best = int(np.argmax(gain))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
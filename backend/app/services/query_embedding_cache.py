@@ -0,0 +1,65 @@
+"""
+Query Embedding Cache - skip the Nomic round-trip for query texts embedded recently
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class QueryEmbeddingCache:
+    """LRU + TTL cache of query text -> float32 embedding.
+
+    Keys include the model and dimensionality, so switching EMBEDDING_MODEL never
+    serves a vector from the old embedding space. Query text is expected to be
+    normalized by the caller (the same normalization as the answer cache key).
+    Cached vectors are read-only; callers that need to modify one must copy it.
+    """
+
+    def __init__(self, model: str, dimension: int = 768, max_size: int = 1000, ttl_minutes: int = 60):
+        self.model = model
+        self.dimension = dimension
+        self.max_size = max_size
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[np.ndarray, datetime]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, query: str) -> Tuple[str, int, str]:
+        return (self.model, self.dimension, query)
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = self._key(query)
+        entry = self._entries.get(key)
+        if entry is not None and datetime.now() - entry[1] < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, query: str, vector: np.ndarray):
+        vector = np.array(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        key = self._key(query)
+        self._entries[key] = (vector, datetime.now())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'ttl_minutes': self.ttl.total_seconds() / 60,
+        }
@@ -0,0 +1,95 @@
+"""
+Reranker - cheap lexical/structural rescoring of retrieval candidates on CPU
+"""
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.bm25_index import BM25Index, tokenize
+
+# Share of the final score per signal; the retrieval score keeps the largest share
+DEFAULT_WEIGHTS = {
+    'retrieval': 0.45,  # incoming score (cosine or RRF), scaled to [0, 1]
+    'coverage': 0.25,   # idf-weighted share of query terms found in the chunk
+    'reference': 0.20,  # "pasal 23" / "pp 95" style references of the query found in the chunk
+    'heading': 0.10,    # query terms found in the chunk's heading path
+}
+
+
+class OverBudget(Exception):
+    pass
+
+
+class LexicalReranker:
+    """Rescore candidates by query-term coverage, provision references and heading paths.
+
+    Term lookups use the BM25 index's per-chunk term lists, so no candidate text is
+    tokenized again; only heading paths (a few words each) are. All scores are
+    computed as arrays over the candidates. The budget is checked between stages;
+    once it is spent `rerank` returns None and the caller keeps the retrieval order.
+    """
+
+    def __init__(self, budget_ms: float = 5.0, weights: Optional[Dict[str, float]] = None):
+        self.budget_ms = budget_ms
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.runs = 0
+        self.over_budget = 0
+
+    def rerank(self, query: str, chunks: Sequence[Dict], base_scores: Sequence[float],
+               bm25: BM25Index) -> Tuple[Optional[np.ndarray], float]:
+        """(new score per chunk or None when over budget, elapsed ms)"""
+        start = time.perf_counter()
+        self.runs += 1
+
+        def checkpoint():
+            if (time.perf_counter() - start) * 1000 > self.budget_ms:
+                raise OverBudget()
+
+        try:
+            scores = self._score(query, chunks, base_scores, bm25, checkpoint)
+            checkpoint()
+        except OverBudget:
+            self.over_budget += 1
+            return None, (time.perf_counter() - start) * 1000
+        return scores, (time.perf_counter() - start) * 1000
+
+    def _score(self, query: str, chunks: Sequence[Dict], base_scores: Sequence[float],
+               bm25: BM25Index, checkpoint) -> np.ndarray:
+        base = np.asarray(base_scores, dtype=np.float32)
+        low, high = float(base.min()), float(base.max())
+        retrieval = (base - low) / (high - low) if high > low else np.ones_like(base)
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return retrieval
+        is_reference = np.array(["_" in term for term in terms])
+        idf = bm25.idf(terms)
+        presence = bm25.term_presence([chunk['id'] for chunk in chunks], terms)
+        checkpoint()
+
+        plain = ~is_reference
+        coverage = (presence[:, plain] @ idf[plain]) / idf[plain].sum() if plain.any() else np.zeros(len(chunks))
+        reference = presence[:, is_reference].mean(axis=1) if is_reference.any() else np.zeros(len(chunks))
+
+        heading_terms = [set(tokenize(chunk.get('heading') or '')) for chunk in chunks]
+        checkpoint()
+        heading = np.array([[term in words for term in terms] for words in heading_terms], dtype=np.float32)
+        # A referenced Pasal named in the heading is the provision itself, not a mention of it
+        heading_score = np.maximum(heading[:, plain].mean(axis=1) if plain.any() else 0,
+                                   heading[:, is_reference].max(axis=1) if is_reference.any() else 0)
+
+        w = self.weights
+        return (w['retrieval'] * retrieval + w['coverage'] * coverage + w['reference'] * reference
+                + w['heading'] * heading_score).astype(np.float32)
+
+    def stats(self) -> Dict:
+        return {'runs': self.runs, 'over_budget': self.over_budget, 'budget_ms': self.budget_ms}
+
+
+def apply_scores(chunks: List[Dict], scores: np.ndarray) -> List[Dict]:
+    """`chunks` sorted by `scores` (best first), each with its 'rerank_score'"""
+    for chunk, score in zip(chunks, scores):
+        chunk['rerank_score'] = float(score)
+    order = np.argsort(-scores, kind='stable')
+    return [chunks[i] for i in order]
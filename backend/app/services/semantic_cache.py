@@ -0,0 +1,157 @@
+"""
+Semantic Answer Cache - reuse answers for paraphrased queries
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.index_generation import IndexGeneration
+
+
+class SemanticQueryCache:
+    """LRU cache of answered queries looked up by cosine similarity of query embeddings.
+
+    Vectors are L2-normalized and kept in one preallocated float32 matrix, so a lookup
+    is a single matrix-vector product over at most `max_size` rows.
+    """
+
+    def __init__(self, max_size: int = 500, threshold: float = 0.92, ttl_minutes: int = 60,
+                 near_miss_margin: float = 0.05, generation: Optional[IndexGeneration] = None):
+        self.max_size = max_size
+        self.generation = generation
+        self.threshold = threshold
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.near_miss_margin = near_miss_margin
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict]] = [None] * max_size
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        # Counters for tuning the threshold
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _ensure_matrix(self, dim: int) -> bool:
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_size, dim), dtype=np.float32)
+        return self._vectors.shape[1] == dim
+
+    def get(self, query_vector: np.ndarray, query: str = "") -> Optional[Dict]:
+        """Return the cached response of the most similar query above threshold"""
+        q = self._normalize(query_vector)
+        if self._vectors is None or not self._valid.any() or not self._ensure_matrix(q.shape[0]):
+            self.misses += 1
+            return None
+
+        scores = self._vectors @ q
+        scores[~self._valid] = -1.0
+        slot = int(np.argmax(scores))
+        best = float(scores[slot])
+
+        if best >= self.threshold:
+            entry = self._entries[slot]
+            if self.generation is not None and not self.generation.is_current(entry.get('stamp')):
+                # Answered from an older knowledge base; evict lazily
+                self._invalidate(slot)
+                self.stale += 1
+                print(f"[SEMANTIC_CACHE] STALE (old index generation) for query: {entry['query'][:50]}...")
+            elif datetime.now() - entry['timestamp'] < self.ttl:
+                self._last_used[slot] = datetime.now().timestamp()
+                self.hits += 1
+                print(f"[SEMANTIC_CACHE] HIT score={best:.3f} for query: {query[:50]}... (cached: {entry['query'][:50]}...)")
+                return entry['response']
+            else:
+                # Expired, remove
+                self._invalidate(slot)
+                print(f"[SEMANTIC_CACHE] EXPIRED for query: {entry['query'][:50]}...")
+        elif best >= self.threshold - self.near_miss_margin:
+            self.near_misses += 1
+            print(f"[SEMANTIC_CACHE] NEAR MISS score={best:.3f} for query: {query[:50]}...")
+
+        self.misses += 1
+        return None
+
+    def closest(self, query_vector: np.ndarray, min_score: float) -> Optional[Tuple[Dict, float]]:
+        """(response, score) of the most similar live entry scoring at least `min_score`.
+
+        A looser lookup than `get` for degraded answers; it leaves the hit/miss
+        counters and the entries untouched.
+        """
+        q = self._normalize(query_vector)
+        if self._vectors is None or not self._valid.any() or self._vectors.shape[1] != q.shape[0]:
+            return None
+        scores = self._vectors @ q
+        scores[~self._valid] = -1.0
+        for slot in np.argsort(-scores):
+            best = float(scores[slot])
+            if best < min_score:
+                break
+            entry = self._entries[int(slot)]
+            fresh = datetime.now() - entry['timestamp'] < self.ttl
+            current = self.generation is None or self.generation.is_current(entry.get('stamp'))
+            if fresh and current:
+                return entry['response'], best
+        return None
+
+    def set(self, query_vector: np.ndarray, query: str, response: Dict, stamp: Optional[Dict] = None):
+        """Cache a response under the query embedding with the stamp of the snapshot it was answered from"""
+        q = self._normalize(query_vector)
+        if not self._ensure_matrix(q.shape[0]):
+            # Embedding dimension changed (new model); start over
+            self.clear()
+            self._ensure_matrix(q.shape[0])
+
+        free_slots = np.flatnonzero(~self._valid)
+        if free_slots.size:
+            slot = int(free_slots[0])
+        else:
+            # Evict least recently used
+            slot = int(np.argmin(self._last_used))
+            print(f"[SEMANTIC_CACHE] Evicted entry: {self._entries[slot]['query'][:50]}...")
+
+        self._vectors[slot] = q
+        self._entries[slot] = {
+            'query': query,
+            'response': response,
+            'timestamp': datetime.now(),
+            'stamp': stamp,
+        }
+        self._last_used[slot] = datetime.now().timestamp()
+        self._valid[slot] = True
+        print(f"[SEMANTIC_CACHE] STORED for query: {query[:50]}...")
+
+    def _invalidate(self, slot: int):
+        self._valid[slot] = False
+        self._entries[slot] = None
+        self._last_used[slot] = 0.0
+
+    def clear(self):
+        """Clear all cache"""
+        self._vectors = None
+        self._entries = [None] * self.max_size
+        self._last_used[:] = 0.0
+        self._valid[:] = False
+        print(f"[SEMANTIC_CACHE] Cleared all entries")
+
+    def stats(self) -> Dict:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': int(self._valid.sum()),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'near_misses': self.near_misses,
+            'stale': self.stale,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'ttl_minutes': self.ttl.total_seconds() / 60
+        }
@@ -0,0 +1,106 @@
+"""
+Single-Flight - coalesce identical concurrent requests into one computation
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+
+class Flight:
+    """One in-flight computation shared by every request with the same key.
+
+    The producer publishes partial output (stream events) and finally a result or
+    an exception; any number of subscribers can replay the events seen so far and
+    follow new ones, or just await the final result.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.tokens: List[Any] = []
+        self.waiters = 1
+        self.task: "asyncio.Task | None" = None
+        self._future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Mark exceptions as retrieved even when every client went away
+        self._future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, token: Any):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, result: Any):
+        if not self._future.done():
+            self._future.set_result(result)
+        self._notify()
+
+    def fail(self, error: BaseException):
+        if not self._future.done():
+            self._future.set_exception(error)
+        self._notify()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Yield every published token (from the beginning) until the flight ends"""
+        position = 0
+        while True:
+            while position < len(self.tokens):
+                yield self.tokens[position]
+                position += 1
+            if self._future.done():
+                return
+            await self._changed.wait()
+
+    async def result(self) -> Any:
+        # shield: one cancelled client must not cancel the shared computation
+        return await asyncio.shield(self._future)
+
+
+class SingleFlight:
+    """Registry of in-flight computations keyed by a normalized request key"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def join(self, key: str, producer: Callable[[Flight], Awaitable[Any]]) -> Tuple[Flight, bool]:
+        """Attach to the flight for `key`, starting `producer(flight)` if there is none.
+
+        Returns (flight, is_leader). The producer runs as its own task so it is not
+        tied to the lifetime of the request that started it.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and not flight.done():
+            flight.waiters += 1
+            self.coalesced += 1
+            return flight, False
+
+        flight = Flight(key)
+        self._flights[key] = flight
+        self.started += 1
+
+        async def _run():
+            try:
+                flight.finish(await producer(flight))
+            except BaseException as e:
+                flight.fail(e)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+            finally:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+        flight.task = asyncio.create_task(_run())
+        return flight, True
+
+    def stats(self) -> Dict:
+        return {
+            'in_flight': len(self._flights),
+            'started': self.started,
+            'coalesced': self.coalesced,
+        }
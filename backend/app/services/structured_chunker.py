@@ -0,0 +1,200 @@
+"""
+Structured Chunker - split regulation text on BAB / Bagian / Pasal / ayat boundaries
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+BAB_RE = re.compile(r"^BAB\s+([IVXLC]+|\d+)\b\.?\s*(.*)$", re.IGNORECASE)
+BAGIAN_RE = re.compile(r"^Bagian\s+(Ke[a-z]+|\d+)\b\.?\s*(.*)$", re.IGNORECASE)
+PARAGRAF_RE = re.compile(r"^Paragraf\s+(\d+)\b\.?\s*(.*)$", re.IGNORECASE)
+# Only a paragraph that is the heading itself; "... dimaksud dalam Pasal 12" is a reference
+PASAL_RE = re.compile(r"^Pasal\s+(\d+[A-Z]?)\s*$", re.IGNORECASE)
+AYAT_RE = re.compile(r"^\((\d+[a-z]?)\)\s*")
+# List item inside a Pasal or ayat: "a. ...", "1. ...", "b) ..."
+ITEM_RE = re.compile(r"^(?:[a-z]|\d{1,2})[.)]\s+")
+SENTENCE_END_RE = re.compile(r"(?<=[.;:])\s+")
+
+# Heading levels, outermost first; a heading clears every level below it
+LEVELS = ("bab", "bagian", "paragraf", "pasal")
+MAX_TITLE_CHARS = 120
+
+
+def _is_title(paragraph: str) -> bool:
+    """Short line without closing punctuation, as the title under "BAB III" or "Bagian Kesatu"."""
+    return (len(paragraph) <= MAX_TITLE_CHARS and not paragraph.endswith((".", ";", ":"))
+            and not any(regex.match(paragraph) for regex in (BAB_RE, BAGIAN_RE, PARAGRAF_RE, PASAL_RE, AYAT_RE, ITEM_RE)))
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Split one oversized paragraph at sentence ends, then hard-wrap what is still too long."""
+    pieces: List[str] = []
+    current = ""
+    for sentence in SENTENCE_END_RE.split(text):
+        candidate = f"{current} {sentence}".strip()
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        current = sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _item_groups(paragraphs: Sequence[str]) -> List[List[str]]:
+    """Paragraphs of one block grouped by list item, so a split falls between items.
+
+    An item ("a.", "1.", "b)") keeps the plain paragraphs after it up to the next
+    item; a lead-in ending with ":" ("... sebagai berikut:") stays with the first
+    item. Outside lists every paragraph is a group of its own.
+    """
+    groups: List[List[str]] = []
+    in_list = False
+    for paragraph in paragraphs:
+        if ITEM_RE.match(paragraph):
+            lead_in = groups and not in_list and len(groups[-1]) == 1 and groups[-1][0].endswith(":")
+            if lead_in:
+                groups[-1].append(paragraph)
+            else:
+                groups.append([paragraph])
+            in_list = True
+        elif in_list:
+            groups[-1].append(paragraph)
+        else:
+            groups.append([paragraph])
+    return groups
+
+
+class _Section:
+    """Paragraphs under one heading path, grouped into blocks that start at an ayat."""
+
+    def __init__(self, path: Dict[str, str]):
+        self.path = dict(path)
+        self.blocks: List[Tuple[Optional[str], List[str]]] = []
+
+    def add(self, paragraph: str):
+        ayat = AYAT_RE.match(paragraph)
+        if ayat or not self.blocks:
+            self.blocks.append((ayat.group(1) if ayat else None, []))
+        self.blocks[-1][1].append(paragraph)
+
+    @property
+    def size(self) -> int:
+        return sum(len(p) + 1 for _, paragraphs in self.blocks for p in paragraphs)
+
+    def heading(self, ayat: Sequence[Optional[str]] = ()) -> str:
+        parts = [self.path[level] for level in LEVELS if self.path.get(level)]
+        labels = [label for label in ayat if label]
+        if labels and parts and self.path.get("pasal"):
+            span = f"({labels[0]})" if len(labels) == 1 else f"({labels[0]})-({labels[-1]})"
+            parts[-1] = f"{parts[-1]} ayat {span}"
+        return " > ".join(parts)
+
+
+def _sections(paragraphs: Sequence[str]) -> List[_Section]:
+    path: Dict[str, str] = {}
+    sections: List[_Section] = []
+    awaiting_title: Optional[str] = None
+    for paragraph in paragraphs:
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if awaiting_title and _is_title(paragraph):
+            path[awaiting_title] = f"{path[awaiting_title]} {paragraph}"
+            awaiting_title = None
+            continue
+        awaiting_title = None
+        for level, regex in (("bab", BAB_RE), ("bagian", BAGIAN_RE), ("paragraf", PARAGRAF_RE), ("pasal", PASAL_RE)):
+            match = regex.match(paragraph)
+            if match:
+                for lower in LEVELS[LEVELS.index(level):]:
+                    path.pop(lower, None)
+                path[level] = " ".join(paragraph.split())
+                # BAB/Bagian/Paragraf titles usually sit on the next line
+                if level != "pasal" and not match.group(2):
+                    awaiting_title = level
+                sections.append(_Section(path))
+                break
+        else:
+            if not sections or sections[-1].path != path:
+                sections.append(_Section(path))
+            sections[-1].add(paragraph)
+    return [section for section in sections if section.blocks]
+
+
+def _pack(section: _Section, max_chars: int) -> List[Dict]:
+    """Whole section if it fits, else consecutive ayat packed up to `max_chars`."""
+    if section.size <= max_chars:
+        body = "\n".join(p for _, paragraphs in section.blocks for p in paragraphs)
+        return [{"heading": section.heading(), "body": body}]
+
+    # Break oversized blocks into list-item, paragraph- or sentence-sized units that keep their ayat label
+    units: List[Tuple[Optional[str], str]] = []
+    for label, paragraphs in section.blocks:
+        for group in _item_groups(paragraphs):
+            text = "\n".join(group)
+            if len(text) <= max_chars:
+                units.append((label, text))
+                continue
+            for paragraph in group:
+                pieces = [paragraph] if len(paragraph) <= max_chars else _split_long(paragraph, max_chars)
+                units.extend((label, piece) for piece in pieces)
+
+    chunks: List[Dict] = []
+    labels: List[Optional[str]] = []
+    lines: List[str] = []
+    size = 0
+    for label, text in units:
+        if lines and size + len(text) + 1 > max_chars:
+            chunks.append({"heading": section.heading(labels), "body": "\n".join(lines)})
+            labels, lines, size = [], [], 0
+        if label not in labels:
+            labels.append(label)
+        lines.append(text)
+        size += len(text) + 1
+    if lines:
+        chunks.append({"heading": section.heading(labels), "body": "\n".join(lines)})
+    return chunks
+
+
+def _parent(section: _Section) -> Tuple[str, ...]:
+    return tuple(section.path.get(level, "") for level in LEVELS[:-1])
+
+
+def structured_chunks(paragraphs: Sequence[str], max_chars: int = 1500, min_chars: int = 200) -> List[Dict]:
+    """Chunk document paragraphs along their legal structure.
+
+    Every Pasal becomes one chunk when it fits in `max_chars`; longer ones are split
+    between ayat (then list items, paragraphs, sentences), never in the middle of a word.
+    Neighbouring Pasal shorter than `min_chars` under the same BAB/Bagian are merged.
+    Each chunk is {'heading': heading path, 'text': heading + newline + body}; the
+    heading path (e.g. "BAB III PERKULIAHAN > Pasal 12 ayat (1)-(3)") stays in the
+    text so embeddings, BM25 and the prompt all see which provision it is. Text
+    without any headings falls back to paragraph packing.
+    """
+    pieces: List[Dict] = []
+    for section in _sections(paragraphs):
+        parent = _parent(section)
+        for piece in _pack(section, max_chars):
+            previous = pieces[-1] if pieces else None
+            if (previous is not None and previous["pasal"] and section.path.get("pasal") and previous["parent"] == parent
+                    and len(previous["body"]) < min_chars and len(piece["body"]) < min_chars
+                    and len(previous["body"]) + len(piece["heading"]) + len(piece["body"]) + 2 <= max_chars):
+                previous["body"] = f"{previous['body']}\n{section.path['pasal']}\n{piece['body']}"
+                previous["last_pasal"] = section.path["pasal"]
+                continue
+            pieces.append({**piece, "parent": parent, "pasal": bool(section.path.get("pasal")), "last_pasal": None})
+
+    chunks = []
+    for piece in pieces:
+        heading = piece["heading"]
+        if piece["last_pasal"]:
+            heading = f"{heading} - {piece['last_pasal']}"
+        chunks.append({"heading": heading, "text": f"{heading}\n{piece['body']}" if heading else piece["body"]})
+    return chunks
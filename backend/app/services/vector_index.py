@@ -0,0 +1,280 @@
+"""
+Vector Index - FAISS index factory, search-time tuning and recall checks
+"""
+import hashlib
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# cosine = inner product over L2-normalized vectors; l2 = legacy Euclidean distance
+METRICS = {"cosine": faiss.METRIC_INNER_PRODUCT, "l2": faiss.METRIC_L2}
+
+
+def chunk_id(filename: str, text: str) -> int:
+    """Stable 60-bit FAISS id for a chunk: hash of its file name and text"""
+    digest = hashlib.sha256(f"{filename}\0{text}".encode("utf-8")).hexdigest()
+    return int(digest[:15], 16)
+
+
+def read_index(path: str, mmap: bool = True) -> Tuple[faiss.Index, bool]:
+    """Read an index, memory-mapping its vectors when the index type allows it.
+
+    A mapped index is read-only and its pages live in the shared page cache, so
+    several worker processes serving the same file hold one copy. Returns
+    (index, mapped); `mapped` is True only when the loaded index really keeps
+    mmap-backed storage. IVF inverted lists can always be mapped; Flat and HNSW
+    codes only with IO_FLAG_MMAP_IFC (newer FAISS), otherwise they are read
+    into private memory.
+    """
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            index = faiss.read_index(path, flags)
+        except RuntimeError as e:
+            print(f"[INDEX] Cannot memory-map {path} ({e}); reading it into memory")
+            return faiss.read_index(path), False
+        if is_mapped(index):
+            return index, True
+        print(f"[INDEX] FAISS {faiss.__version__} cannot memory-map {type(_unwrap(index)).__name__} "
+              f"(no IO_FLAG_MMAP_IFC); {path} is held in private memory")
+        return index, False
+    return faiss.read_index(path), False
+
+
+def _has_mapped_lists(index: faiss.Index) -> bool:
+    base = _unwrap(index)
+    return (isinstance(base, faiss.IndexIVF)
+            and isinstance(faiss.downcast_InvertedLists(base.invlists), faiss.OnDiskInvertedLists))
+
+
+def is_mapped(index: faiss.Index) -> bool:
+    """True when the index storage is backed by a memory-mapped file"""
+    if _has_mapped_lists(index):
+        return True
+    base = _unwrap(index)
+    return (hasattr(faiss, "IO_FLAG_MMAP_IFC")
+            and isinstance(base, (faiss.IndexFlatCodes, faiss.IndexHNSW)))
+
+
+def writable_copy(index: faiss.Index, path: str) -> faiss.Index:
+    """Private in-memory copy of a published index, safe to add to and remove from.
+
+    clone_index cannot copy mapped IVF lists (OnDiskInvertedLists), so such an
+    index is read again from `path`, the file it was mapped from, without mmap.
+    """
+    if _has_mapped_lists(index):
+        return faiss.read_index(path)
+    return faiss.clone_index(index)
+
+
+def metric_name(index: faiss.Index) -> str:
+    return "cosine" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+
+def prepare_vectors(vectors, metric: str = "cosine") -> np.ndarray:
+    """float32 C-contiguous copy of `vectors`, L2-normalized in place for the cosine metric"""
+    vectors = np.array(vectors, dtype='float32', order='C', ndmin=2)
+    if metric == "cosine":
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def similarity_scores(distances: np.ndarray, metric: str = "cosine") -> np.ndarray:
+    """Turn FAISS search output into higher-is-better scores (cosine in [-1, 1] for IP)"""
+    if metric == "cosine":
+        return distances
+    return 1.0 / (1.0 + distances)
+
+
+def default_nlist(n_vectors: int) -> int:
+    """Rule of thumb: about 4 * sqrt(n) inverted lists"""
+    return max(1, int(4 * math.sqrt(max(n_vectors, 1))))
+
+
+def index_description(index_type: str, dimension: int, n_vectors: int, nlist: Optional[int] = None,
+                      pq_m: int = 64, pq_nbits: int = 8, hnsw_m: int = 32, metric: str = "cosine") -> Dict:
+    """Resolve the requested index type into a faiss.index_factory string.
+
+    Falls back to Flat when there are too few vectors to train the requested
+    structure (IVF needs ~39 points per list, PQ needs 2^nbits points per codebook).
+    """
+    index_type = (index_type or "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+
+    if metric not in METRICS:
+        raise ValueError(f"Unknown INDEX_METRIC: {metric} (expected one of {', '.join(METRICS)})")
+    settings = {'type': index_type, 'dimension': dimension, 'metric': metric}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(n_vectors)
+        nlist = max(1, min(nlist, n_vectors // 39))
+        if nlist < 2 or (index_type == "ivf_pq" and n_vectors < 2 ** pq_nbits * 39 // 10):
+            print(f"[INDEX] Only {n_vectors} vectors; not enough to train {index_type}. Using flat instead.")
+            return {'type': 'flat', 'dimension': dimension, 'metric': metric, 'factory': "Flat",
+                    'requested_type': index_type}
+        settings['nlist'] = nlist
+        if index_type == "ivf_flat":
+            settings['factory'] = f"IVF{nlist},Flat"
+        else:
+            if dimension % pq_m != 0:
+                raise ValueError(f"INDEX_PQ_M ({pq_m}) must divide the embedding dimension ({dimension})")
+            settings.update(pq_m=pq_m, pq_nbits=pq_nbits)
+            settings['factory'] = f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    elif index_type == "hnsw":
+        settings.update(hnsw_m=hnsw_m, factory=f"HNSW{hnsw_m}")
+    else:
+        settings['factory'] = "Flat"
+    return settings
+
+
+def build_index(embeddings: np.ndarray, settings: Dict, ids: Optional[np.ndarray] = None,
+                ef_construction: int = 200) -> faiss.Index:
+    """Create, train (if needed) and fill an index described by `settings`.
+
+    `embeddings` must already be prepared for the metric (see `prepare_vectors`).
+    With `ids`, search results are those ids instead of row positions: IVF indexes
+    store ids natively, Flat and HNSW are wrapped in an IndexIDMap.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    metric = METRICS[settings.get('metric', 'l2')]
+    index = faiss.index_factory(embeddings.shape[1], settings['factory'], metric)
+    hnsw = _find_hnsw(index)
+    if hnsw is not None:
+        hnsw.efConstruction = ef_construction
+    if not index.is_trained:
+        start = time.perf_counter()
+        index.train(embeddings)
+        print(f"[INDEX] Trained {settings['factory']} on {len(embeddings)} vectors in {time.perf_counter() - start:.2f}s")
+    if ids is None:
+        index.add(embeddings)
+        return index
+    if not isinstance(faiss.downcast_index(index), faiss.IndexIVF):
+        index = faiss.IndexIDMap(index)
+    add_vectors(index, embeddings, ids)
+    return index
+
+
+def has_ids(index: faiss.Index) -> bool:
+    """True when search returns chunk ids (IDMap or IVF built with ids), not row positions"""
+    index = faiss.downcast_index(index)
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """HNSW graphs cannot delete vectors; everything else here can"""
+    return not isinstance(_unwrap(index), faiss.IndexHNSW)
+
+
+def add_vectors(index: faiss.Index, vectors: np.ndarray, ids) -> None:
+    if len(ids):
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype='float32'), np.asarray(ids, dtype='int64'))
+
+
+def remove_vectors(index: faiss.Index, ids) -> int:
+    if not len(ids):
+        return 0
+    return int(index.remove_ids(np.asarray(ids, dtype='int64')))
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """Strip IDMap / PreTransform wrappers to reach the index that holds search parameters"""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def _find_hnsw(index: faiss.Index):
+    base = _unwrap(index)
+    return base.hnsw if isinstance(base, faiss.IndexHNSW) else None
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    """Search knobs for one `index.search(..., params=...)` call; the index itself is not changed.
+
+    A published index is shared by every request searching it, so runtime tuning is
+    passed per call instead of set on the index.
+    """
+    base = _unwrap(index)
+    if isinstance(base, faiss.IndexIVF) and nprobe:
+        return faiss.SearchParametersIVF(nprobe=min(int(nprobe), base.nlist))
+    if _find_hnsw(index) is not None and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+
+def resolve_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None) -> Dict:
+    """The values `search_parameters` would use (defaults from the index), without changing it"""
+    resolved = {}
+    base = _unwrap(index)
+    if isinstance(base, faiss.IndexIVF):
+        resolved['nprobe'] = min(int(nprobe), base.nlist) if nprobe else base.nprobe
+    hnsw = _find_hnsw(index)
+    if hnsw is not None:
+        resolved['ef_search'] = int(ef_search) if ef_search else hnsw.efSearch
+    return resolved
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict:
+    """Apply runtime search knobs to an index not yet published; returns the values actually in effect"""
+    applied = {}
+    base = _unwrap(index)
+    if isinstance(base, faiss.IndexIVF):
+        if nprobe:
+            base.nprobe = min(int(nprobe), base.nlist)
+        applied['nprobe'] = base.nprobe
+    hnsw = _find_hnsw(index)
+    if hnsw is not None:
+        if ef_search:
+            hnsw.efSearch = int(ef_search)
+        applied['ef_search'] = hnsw.efSearch
+    return applied
+
+
+def recall_at_k(candidate: faiss.Index, exact: faiss.Index, queries: np.ndarray, k: int = 10) -> Dict:
+    """Recall@k of `candidate` against the exact (Flat) index for the same vectors"""
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    k = min(k, exact.ntotal)
+    _, truth = exact.search(queries, k)
+
+    start = time.perf_counter()
+    _, found = candidate.search(queries, k)
+    elapsed = time.perf_counter() - start
+
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return {
+        'k': k,
+        'queries': len(queries),
+        'recall': hits / float(k * len(queries)) if len(queries) else 0.0,
+        'avg_search_ms': elapsed * 1000 / max(len(queries), 1),
+    }
+
+
+def sample_queries(embeddings: np.ndarray, n: int = 200, seed: int = 0) -> np.ndarray:
+    """Sample stored vectors (plus slight noise) to use as recall-check queries"""
+    rng = np.random.default_rng(seed)
+    take = rng.choice(len(embeddings), size=min(n, len(embeddings)), replace=False)
+    queries = embeddings[take].astype('float32')
+    scale = float(np.std(embeddings)) * 0.05
+    return queries + rng.normal(0, scale, size=queries.shape).astype('float32')
+
+
+def check_recall(index: faiss.Index, embeddings: np.ndarray, ids: Optional[np.ndarray] = None,
+                 k: int = 10, n_queries: int = 200) -> Dict:
+    """Build an exact Flat index over the same vectors (and ids) and measure recall@k of `index`"""
+    exact = faiss.IndexFlat(embeddings.shape[1], index.metric_type)
+    if ids is not None:
+        exact = faiss.IndexIDMap(exact)
+        add_vectors(exact, embeddings, ids)
+    else:
+        exact.add(np.ascontiguousarray(embeddings, dtype='float32'))
+    queries = sample_queries(embeddings, n_queries)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(queries)
+    return recall_at_k(index, exact, queries, k)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Time BM25 queries against the saved sparse index and show the top chunks for each.
+
+Usage: python benchmark_bm25.py ["query" ...]
+"""
+import os
+import sys
+import time
+
+from app.services.bm25_index import BM25Index, tokenize
+from app.services.chunk_store import ChunkStore
+from app.services.index_snapshot import published_build_paths
+
+VECTOR_DB_DIR = os.path.join(os.path.dirname(__file__), "vector_db")
+DEFAULT_QUERIES = [
+    "Apa isi Pasal 23?",
+    "Berapa IPK minimal 2,00 untuk lulus?",
+    "Berapa SKS maksimal per semester?",
+    "PP No. 95 Tahun 2021 tentang perguruan tinggi",
+    "sanksi drop out mahasiswa",
+]
+
+
+def main():
+    queries = sys.argv[1:] or DEFAULT_QUERIES
+    paths = published_build_paths(VECTOR_DB_DIR)
+    if paths is None:
+        print("❌ No index has been built yet.")
+        sys.exit(1)
+    _, chunks_path, bm25_path = paths
+    chunks = ChunkStore.load(chunks_path)
+    start = time.perf_counter()
+    bm25 = BM25Index.load(bm25_path) if os.path.exists(bm25_path) else BM25Index.build(chunks)
+    print(f"📚 {len(bm25)} chunks, {len(bm25.vocab)} terms, loaded in {time.perf_counter() - start:.2f}s\n")
+
+    for query in queries:
+        repeat = 200
+        start = time.perf_counter()
+        for _ in range(repeat):
+            ids, scores = bm25.search(query, 20)
+        per_query_ms = (time.perf_counter() - start) / repeat * 1000
+        print(f"🔎 {query}")
+        print(f"   terms={tokenize(query)}  {per_query_ms:.3f} ms/query")
+        for cid, score in list(zip(ids, scores))[:3]:
+            chunk = chunks.get(int(cid))
+            print(f"   {score:6.2f}  {chunk['filename']}: {chunk['text'][:80]!r}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
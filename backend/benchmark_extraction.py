@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Time .docx extraction + chunking of a document folder with different worker counts
+and check that every run yields the same chunks in the same order.
+
+Usage: python benchmark_extraction.py [data_dir] [workers,workers,...] [repeat]
+"""
+import os
+import sys
+import time
+
+from app.services.document_extraction import extract_many, default_workers
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "data")
+    cpus = default_workers()
+    worker_counts = ([int(v) for v in sys.argv[2].split(",")] if len(sys.argv) > 2
+                     else sorted({1, 2, 4, 8, cpus}))
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    paths = [os.path.join(data_dir, fn) for fn in sorted(os.listdir(data_dir))
+             if fn.endswith(".docx") and not fn.startswith("~$")]
+    if not paths:
+        print(f"❌ No .docx files in {data_dir}")
+        return
+    print(f"📄 {len(paths)} files, {cpus} CPUs, best of {repeat} runs\n")
+
+    baseline = None
+    baseline_seconds = None
+    for workers in worker_counts:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks, errors = extract_many(paths, workers=workers)
+            best = min(best, time.perf_counter() - start)
+        ordered = [(path, chunk) for path, texts in chunks.items() for chunk in texts]
+        if baseline is None:
+            baseline, baseline_seconds = ordered, best
+        same = "same chunks" if ordered == baseline else "❌ chunks differ from first run"
+        print(f"  workers={workers:<3} {best:7.2f}s  speedup={baseline_seconds / best:5.2f}x  "
+              f"chunks={len(ordered)} errors={len(errors)}  {same}")
+
+
+if __name__ == "__main__":
+    main()
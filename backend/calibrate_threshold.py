@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Pick RETRIEVAL_MIN_SCORE and RETRIEVAL_TOP_K from a labeled query set.
+
+Each line of the labeled file is a JSON object:
+  {"query": "...", "relevant_files": ["a.docx"], "relevant_texts": ["Pasal 12"]}
+A chunk counts as relevant when its file is in relevant_files or its text contains one of
+relevant_texts. Queries with neither field are out-of-scope questions that should retrieve
+nothing above the threshold.
+
+Usage: python calibrate_threshold.py calibration_queries.jsonl [max_k]
+"""
+import os
+import sys
+import json
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+load_dotenv()
+
+import main
+from app.services.vector_index import metric_name, prepare_vectors, similarity_scores
+
+
+def load_labeled_queries(path):
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                queries.append(json.loads(line))
+    return queries
+
+
+def is_relevant(chunk, item):
+    if chunk.get('filename') in (item.get('relevant_files') or []):
+        return True
+    text = chunk.get('text', '').lower()
+    return any(t.lower() in text for t in (item.get('relevant_texts') or []))
+
+
+def evaluate(scored, threshold, k):
+    """Chunk precision, positive-query hit rate and negative-query rejection at (threshold, k)"""
+    tp = fp = hits = positives = rejected = negatives = 0
+    for labels, scores in scored:
+        passed = [rel for rel, s in zip(labels[:k], scores[:k]) if s >= threshold]
+        tp += sum(passed)
+        fp += len(passed) - sum(passed)
+        if any(labels):
+            positives += 1
+            hits += any(passed)
+        else:
+            negatives += 1
+            rejected += not passed
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    hit_rate = hits / positives if positives else 0.0
+    f1 = 2 * precision * hit_rate / (precision + hit_rate) if precision + hit_rate else 0.0
+    return {
+        'threshold': round(float(threshold), 3),
+        'k': k,
+        'precision': precision,
+        'hit_rate': hit_rate,
+        'negative_rejection': rejected / negatives if negatives else None,
+        'f1': f1,
+    }
+
+
+def main_cli():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    labeled = load_labeled_queries(sys.argv[1])
+    max_k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    main.load_faiss_index_and_chunks()
+    snapshot = main.index_snapshot
+    if snapshot.index is None:
+        print("❌ Index not found; build it first (python rebuild_index.py).")
+        sys.exit(1)
+    metric = metric_name(snapshot.index)
+    print(f"📊 {len(labeled)} labeled queries, {snapshot.vector_count} chunks, metric {metric}")
+
+    vectors = main.generate_embeddings([item['query'] for item in labeled], task_type="RETRIEVAL_QUERY")
+    distances, indices = snapshot.index.search(prepare_vectors(vectors, metric), max_k)
+
+    scored = []
+    for item, dist_row, idx_row in zip(labeled, distances, indices):
+        pairs = [(is_relevant(snapshot.get_chunk(i), item), float(s))
+                 for s, i in zip(similarity_scores(dist_row, metric), idx_row) if snapshot.get_chunk(i) is not None]
+        scored.append(([p[0] for p in pairs], [p[1] for p in pairs]))
+        if any(item.get(key) for key in ('relevant_files', 'relevant_texts')) and not any(p[0] for p in pairs):
+            print(f"⚠️ No relevant chunk in top {max_k} for: {item['query'][:60]}")
+
+    all_scores = sorted({s for _, scores in scored for s in scores})
+    thresholds = np.unique(np.round(all_scores, 3)) if all_scores else np.array([0.0])
+
+    best_per_k = []
+    for k in range(1, max_k + 1):
+        best = max((evaluate(scored, t, k) for t in thresholds), key=lambda r: (r['f1'], r['threshold']))
+        best_per_k.append(best)
+        rejection = "-" if best['negative_rejection'] is None else f"{best['negative_rejection']:.2f}"
+        print(f"  k={k:<3} threshold={best['threshold']:.3f} precision={best['precision']:.2f} "
+              f"hit_rate={best['hit_rate']:.2f} negative_rejection={rejection} f1={best['f1']:.3f}")
+
+    # Smallest k whose best F1 is within 0.01 of the overall best
+    top_f1 = max(r['f1'] for r in best_per_k)
+    chosen = next(r for r in best_per_k if r['f1'] >= top_f1 - 0.01)
+    print("\n✅ Suggested settings:")
+    print(f"RETRIEVAL_MIN_SCORE={chosen['threshold']}")
+    print(f"RETRIEVAL_TOP_K={chosen['k']}")
+
+
+if __name__ == "__main__":
+    main_cli()
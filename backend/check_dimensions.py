@@ -5,10 +5,13 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Load index
-index_path = os.path.join(os.path.dirname(__file__), "vector_db", "faiss_index.bin")
+from app.services.index_snapshot import published_build_paths
 
-if os.path.exists(index_path):
+# Load the index of the published build
+paths = published_build_paths(os.path.join(os.path.dirname(__file__), "vector_db"))
+index_path = paths[0] if paths else None
+
+if index_path and os.path.exists(index_path):
     index = faiss.read_index(index_path)
     print(f"✅ Index loaded successfully")
     print(f"📊 Index dimension: {index.d}")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Convert vector_db/doc_chunks.json to the compact chunk store
+(vector_db/chunks.text.bin, chunks.rows.npy, chunks.files.json).
+
+The server also converts on startup; this script lets you do it ahead of time
+and compare sizes. The JSON file is kept unless --remove-json is given.
+
+Usage: python convert_chunks.py [doc_chunks.json] [store_base_path] [--remove-json]
+"""
+import os
+import sys
+import time
+
+from app.services.chunk_store import ChunkStore
+
+vector_db_dir = os.path.join(os.path.dirname(__file__), "vector_db")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    json_path = args[0] if args else os.path.join(vector_db_dir, "doc_chunks.json")
+    store_path = args[1] if len(args) > 1 else os.path.join(vector_db_dir, "chunks")
+
+    if not os.path.exists(json_path):
+        print(f"❌ {json_path} not found")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    store = ChunkStore.from_json(json_path)
+    store.save(store_path)
+    print(f"✅ Converted {len(store)} chunks from {len(store.filenames)} files in {time.perf_counter() - start:.2f}s")
+
+    # Round-trip check: every chunk reads back with the same text and file
+    loaded = ChunkStore.load(store_path)
+    original = ChunkStore.from_json(json_path)
+    mismatches = sum(1 for a, b in zip(original, loaded)
+                     if (a['id'], a['text'], a['filename']) != (b['id'], b['text'], b['filename']))
+    if mismatches or len(original) != len(loaded):
+        print(f"❌ {mismatches} chunks differ after conversion")
+        sys.exit(1)
+
+    json_bytes = os.path.getsize(json_path)
+    store_bytes = sum(os.path.getsize(store_path + s) for s in (".text.bin", ".rows.npy", ".files.json"))
+    print(f"📦 {json_bytes / 1024:.0f} KB JSON -> {store_bytes / 1024:.0f} KB chunk store")
+
+    start = time.perf_counter()
+    ChunkStore.load(store_path)
+    print(f"⏱️ Chunk store opens in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if "--remove-json" in sys.argv:
+        os.remove(json_path)
+        print(f"🗑️ Removed {json_path}")
+
+
+if __name__ == "__main__":
+    main()
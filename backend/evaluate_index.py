@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare FAISS index types (recall@k vs exact Flat search, build time, query latency)
+on the embeddings of the current knowledge base.
+
+Usage: python evaluate_index.py [k] [nprobe,nprobe,...] [efSearch,efSearch,...]
+"""
+import os
+import sys
+import time
+import faiss
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+load_dotenv()
+
+from app.services.vector_index import (
+    INDEX_TYPES, METRICS, index_description, build_index, set_search_params,
+    recall_at_k, sample_queries, metric_name, prepare_vectors,
+)
+from app.services.index_snapshot import published_build_paths
+
+VECTOR_DB_DIR = os.path.join(os.path.dirname(__file__), "vector_db")
+
+
+def load_vectors(index_path: str):
+    index = faiss.downcast_index(faiss.read_index(index_path))
+    if isinstance(index, faiss.IndexIDMap):
+        # Chunk-id indexes wrap the storage index; its rows hold the same vectors
+        index = index.index
+    try:
+        return index.reconstruct_n(0, index.ntotal), metric_name(index)
+    except RuntimeError:
+        print("❌ The saved index cannot return its vectors; rebuild once with INDEX_TYPE=flat and run this again.")
+        sys.exit(1)
+
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    nprobes = [int(v) for v in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 4, 16, 64]
+    ef_searches = [int(v) for v in sys.argv[3].split(",")] if len(sys.argv) > 3 else [16, 64, 128]
+
+    # The files of the build index_meta.json currently publishes
+    paths = published_build_paths(VECTOR_DB_DIR)
+    if paths is None or not os.path.exists(paths[0]):
+        print("❌ Index file not found!")
+        return
+
+    vectors, metric = load_vectors(paths[0])
+    print(f"📊 {len(vectors)} vectors, dimension {vectors.shape[1]}, metric {metric}, recall@{k}\n")
+
+    exact = faiss.IndexFlat(vectors.shape[1], METRICS[metric])
+    exact.add(vectors)
+    queries = prepare_vectors(sample_queries(vectors), metric)
+
+    for index_type in INDEX_TYPES:
+        settings = index_description(
+            index_type, vectors.shape[1], len(vectors),
+            nlist=int(os.getenv("INDEX_NLIST", "0")) or None,
+            pq_m=int(os.getenv("INDEX_PQ_M", "64")),
+            pq_nbits=int(os.getenv("INDEX_PQ_NBITS", "8")),
+            hnsw_m=int(os.getenv("INDEX_HNSW_M", "32")),
+            metric=metric,
+        )
+        if settings['type'] != index_type:
+            continue
+        start = time.perf_counter()
+        index = build_index(vectors, settings, ef_construction=int(os.getenv("INDEX_EF_CONSTRUCTION", "200")))
+        build_seconds = time.perf_counter() - start
+
+        if index_type.startswith("ivf"):
+            variants = [{'nprobe': n} for n in nprobes]
+        elif index_type == "hnsw":
+            variants = [{'ef_search': ef} for ef in ef_searches]
+        else:
+            variants = [{}]
+
+        for params in variants:
+            applied = set_search_params(index, **params)
+            result = recall_at_k(index, exact, queries, k)
+            print(f"  {settings['factory']:<20} {str(applied):<22} recall={result['recall']:.3f} "
+                  f"search={result['avg_search_ms']:.3f} ms/query build={build_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
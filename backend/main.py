@@ -1,6 +1,10 @@
 import os
 import json
+import asyncio
 from datetime import datetime, timedelta
+import random
+import sys
+import threading
 import time
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
@@ -8,22 +12,48 @@ from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Header, s
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from openai import OpenAI
+import openai
+import httpx
+from openai import AsyncOpenAI
 from nomic import embed
-from docx import Document
 import faiss
 import numpy as np
 import shutil
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple
 import traceback
 from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db, create_tables, User
+from database import get_db, create_tables, User, SessionLocal
 from chat_service import ChatService
 from auth_service import AuthService
 from admin_service import AdminService
+from app.services.embedding_service import EmbeddingService
+from app.services.semantic_cache import SemanticQueryCache
+from app.services.query_embedding_cache import QueryEmbeddingCache
+from app.services.cache_backends import CacheBackend, MemoryCacheBackend, create_cache_backend
+from app.services.index_generation import IndexGeneration, file_fingerprint
+from app.services.single_flight import Flight, SingleFlight
+from app.services.vector_index import (
+    index_description, build_index, set_search_params, resolve_search_params, check_recall,
+    metric_name, prepare_vectors, similarity_scores,
+    chunk_id, has_ids, supports_remove, add_vectors, remove_vectors, writable_copy,
+)
+from app.services.embedding_store import EmbeddingStore, content_hash
+from app.services.index_jobs import IndexJob, IndexJobQueue, build_lock
+from app.services.index_snapshot import IndexSnapshot, build_paths, published_build_dir, published_build_paths
+from app.services.chunk_store import ChunkStore
+from app.services.bm25_index import BM25Index, reciprocal_rank_fusion
+from app.services.context_packer import pack_context
+from app.services.mmr import mmr_select, scale_relevance
+from app.services.reranker import LexicalReranker, apply_scores
+from app.services.answer_parser import StructuredAnswerParser, parse_answer
+from app.services.degradation import (
+    RequestBudget, DegradationMetrics, consume_stream, extractive_answer,
+    FULL, CACHED_NEAR_MATCH, EXTRACTIVE, UNAVAILABLE,
+)
+from app.services.embedding_pipeline import TokenBucket, embed_in_batches
+from app.services.document_extraction import extract_many, default_workers
 import hashlib
-from collections import OrderedDict
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
@@ -34,13 +64,83 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     raise ValueError("OPENROUTER_API_KEY not found. Please set it in environment or .env file.")
 
-# Lazy OpenRouter client factory to avoid initializing during non-chat scripts
-def get_openrouter_client() -> OpenAI:
-    return OpenAI(
+# OpenRouter HTTP tuning: one long-lived client per process (created in lifespan)
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "50"))
+OPENROUTER_MAX_KEEPALIVE = int(os.getenv("OPENROUTER_MAX_KEEPALIVE", "20"))
+OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+OPENROUTER_MAX_ATTEMPTS = int(os.getenv("OPENROUTER_MAX_ATTEMPTS", "3"))
+OPENROUTER_BACKOFF_BASE = float(os.getenv("OPENROUTER_BACKOFF_BASE", "0.6"))
+OPENROUTER_BACKOFF_MAX = float(os.getenv("OPENROUTER_BACKOFF_MAX", "8"))
+# Total deadline for one generation request (all retries included)
+OPENROUTER_DEADLINE_SECONDS = float(os.getenv("OPENROUTER_DEADLINE_SECONDS", "90"))
+
+# OpenRouter client factory; called once from lifespan, never per request
+def get_openrouter_client() -> AsyncOpenAI:
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE,
+            keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(OPENROUTER_DEADLINE_SECONDS, connect=10.0),
+    )
+    return AsyncOpenAI(
         base_url="https://openrouter.ai/api/v1",
         api_key=OPENROUTER_API_KEY,
+        http_client=http_client,
+        # Retries are handled by call_openrouter_with_retries (async backoff + deadline)
+        max_retries=0,
     )
 
+def is_retryable_openrouter_error(err: Exception) -> bool:
+    """Rate limits, 5xx and connection problems are worth another attempt."""
+    if isinstance(err, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    err_text = str(err).lower()
+    return "429" in err_text or "rate limit" in err_text or "rate-limited" in err_text
+
+async def call_openrouter_with_retries(
+    client: AsyncOpenAI,
+    model_name: str,
+    messages: List[Dict],
+    deadline: Optional[float] = None,
+    **kwargs
+):
+    """Call chat.completions.create with exponential backoff + full jitter.
+
+    `deadline` is an absolute `loop.time()` value; each attempt gets only the time
+    that is left and backoff never sleeps past it (asyncio.TimeoutError is raised).
+    """
+    loop = asyncio.get_running_loop()
+    last_error = None
+    for attempt in range(1, OPENROUTER_MAX_ATTEMPTS + 1):
+        remaining = None if deadline is None else deadline - loop.time()
+        if remaining is not None and remaining <= 0:
+            raise asyncio.TimeoutError("OpenRouter request deadline exceeded")
+        try:
+            print(f"[OPENROUTER] Attempt {attempt}/{OPENROUTER_MAX_ATTEMPTS} using model: {model_name}")
+            return await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                timeout=remaining if remaining is not None else openai.NOT_GIVEN,
+                **kwargs
+            )
+        except Exception as err:
+            last_error = err
+            if attempt < OPENROUTER_MAX_ATTEMPTS and is_retryable_openrouter_error(err):
+                delay = random.uniform(0, min(OPENROUTER_BACKOFF_MAX, OPENROUTER_BACKOFF_BASE * (2 ** (attempt - 1))))
+                if deadline is not None and loop.time() + delay >= deadline:
+                    print(f"[OPENROUTER] No time left for another attempt on {model_name}")
+                    break
+                print(f"[OPENROUTER] Retryable error on {model_name}: {err}. Backing off {delay:.2f}s then retry...")
+                await asyncio.sleep(delay)
+                continue
+            print(f"[OPENROUTER] Error on {model_name}: {err}")
+            break
+    if isinstance(last_error, openai.APITimeoutError):
+        raise asyncio.TimeoutError("OpenRouter request deadline exceeded") from last_error
+    raise last_error if last_error else RuntimeError("Unknown error calling OpenRouter")
+
 # Nomic API key (for embeddings)
 NOMIC_API_KEY = os.getenv("NOMIC_API_KEY")
 if not NOMIC_API_KEY:
@@ -60,211 +160,819 @@ GENERATIVE_MODEL = os.getenv("CHAT_MODEL", "tngtech/deepseek-r1t2-chimera:free")
 #         "openai/gpt-4o-mini,qwen/qwen-2.5-7b-instruct:free,mistralai/mistral-7b-instruct:free"
 #     ).split(",") if m.strip()
 # ]
+# Query embedding pipeline (non-blocking, bounded per process)
+EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", "10"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "8"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+# Document embedding during index builds: concurrent Nomic batches under a token bucket
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_BUILD_CONCURRENCY = int(os.getenv("EMBED_BUILD_CONCURRENCY", "4"))
+EMBED_RATE_PER_SECOND = float(os.getenv("EMBED_RATE_PER_SECOND", "2"))  # batch requests/s, 0 = unlimited
+EMBED_RATE_BURST = float(os.getenv("EMBED_RATE_BURST", "4"))
+EMBED_MAX_ATTEMPTS = int(os.getenv("EMBED_MAX_ATTEMPTS", "5"))
+# Finished batches are saved to the embedding store this often, so a crashed rebuild resumes
+EMBED_CHECKPOINT_SECONDS = float(os.getenv("EMBED_CHECKPOINT_SECONDS", "15"))
+
 VECTOR_DB_DIR = os.path.join(os.path.dirname(__file__), "vector_db")
+# Each build (FAISS index, memory-mapped chunk store, BM25 index) is saved to its own
+# gen-<N>-* directory; index_meta.json names the published one ("build_dir")
+INDEX_META_PATH = os.path.join(VECTOR_DB_DIR, "index_meta.json")
+# Files of a build saved before per-build directories, directly in VECTOR_DB_DIR
 FAISS_INDEX_PATH = os.path.join(VECTOR_DB_DIR, "faiss_index.bin")
+CHUNK_STORE_PATH = os.path.join(VECTOR_DB_DIR, "chunks")
+BM25_INDEX_PATH = os.path.join(VECTOR_DB_DIR, "bm25.npz")
+# Previous JSON chunk list; converted to the chunk store on first load
 DOC_CHUNKS_PATH = os.path.join(VECTOR_DB_DIR, "doc_chunks.json")
+# Held by whichever process (uvicorn worker, rebuild_index.py) is rebuilding the index
+INDEX_BUILD_LOCK_PATH = os.path.join(VECTOR_DB_DIR, ".build.lock")
+# Status of every index job, readable by all worker processes
+INDEX_JOB_STATUS_DIR = os.path.join(VECTOR_DB_DIR, "jobs")
+# How often each worker checks index_meta.json for a build another process published (0 = never)
+INDEX_RELOAD_SECONDS = float(os.getenv("INDEX_RELOAD_SECONDS", "2"))
+# On-disk embedding cache keyed by (model, dimension, task, content hash); document
+# embeddings live at this path, other tasks get a suffixed file next to it
+EMBEDDING_STORE_PATH = os.path.join(VECTOR_DB_DIR, "embeddings")
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")  # float32 | float16 (half the disk/RAM)
+EMBEDDING_DIMENSION = 768
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# Processes that parse .docx files in parallel during rebuilds (1 = in-process)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(default_workers())))
+# structured = one chunk per Pasal (split between ayat above CHUNK_MAX_CHARS); fixed = 1000-char windows
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "structured").lower()
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+# Recorded with the index; a different value forces a full rebuild, since every chunk changes
+CHUNKER = f"{CHUNK_STRATEGY}:{CHUNK_MAX_CHARS}" if CHUNK_STRATEGY != "fixed" else "fixed"
+
+# FAISS index type chosen at build time: flat | ivf_flat | ivf_pq | hnsw
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+INDEX_NLIST = int(os.getenv("INDEX_NLIST", "0"))  # 0 = auto (~4*sqrt(n))
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "64"))
+INDEX_PQ_NBITS = int(os.getenv("INDEX_PQ_NBITS", "8"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_EF_CONSTRUCTION = int(os.getenv("INDEX_EF_CONSTRUCTION", "200"))
+# Search-time knobs, also adjustable at runtime via /admin/index/settings
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "16"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+INDEX_RECALL_K = int(os.getenv("INDEX_RECALL_K", "10"))
+INDEX_MIN_RECALL = float(os.getenv("INDEX_MIN_RECALL", "0.9"))
+# cosine: inner product over L2-normalized embeddings | l2: legacy Euclidean index
+INDEX_METRIC = os.getenv("INDEX_METRIC", "cosine").lower()
+# Memory-map the saved index and chunk store so uvicorn workers share one page-cache copy
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+
+# Retrieval: cosine threshold chosen with calibrate_threshold.py
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.55"))
+# Chunks still sent when none pass the threshold (0 = answer "not found")
+RETRIEVAL_FALLBACK_K = int(os.getenv("RETRIEVAL_FALLBACK_K", "2"))
+# 1/(1+L2) threshold used only by indexes built before the cosine switch
+LEGACY_L2_MIN_SCORE = 0.7
+# dense = FAISS only; hybrid = FAISS + BM25 fused by reciprocal rank fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Candidates taken from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# BM25 score a chunk found only lexically needs to be used (about one rare term, e.g. "pasal 23", matching)
+BM25_MIN_SCORE = float(os.getenv("BM25_MIN_SCORE", "4.0"))
+# MMR trade-off between relevance and novelty (1.0 = off) and the qualifying candidates it chooses from
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "15"))
+# Lexical/structural rerank of up to RERANK_CANDIDATES qualifying chunks; skipped when over RERANK_BUDGET_MS
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "5"))
+# Hard wall-clock budget of one /chat pipeline run, split across its stages (shares of the total)
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "60"))
+CHAT_STAGE_SHARES = {
+    "embed": float(os.getenv("CHAT_EMBED_SHARE", "0.15")),
+    "search": float(os.getenv("CHAT_SEARCH_SHARE", "0.05")),
+    "generate": 1.0,
+}
+# Below this many seconds left after retrieval the model is not called at all
+CHAT_MIN_GENERATE_SECONDS = float(os.getenv("CHAT_MIN_GENERATE_SECONDS", "5"))
+# Cached answer similarity good enough to serve when the model cannot answer in time
+DEGRADE_NEAR_MATCH_MIN_SCORE = float(os.getenv("DEGRADE_NEAR_MATCH_MIN_SCORE", "0.85"))
+# Estimated tokens of retrieved text allowed in the prompt (the instruction template comes on top)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1800"))
+
+# Index, chunks and settings of the current build. Rebuilds publish a new snapshot
+# with one assignment; requests read the reference once and keep using it.
+index_snapshot = IndexSnapshot()
+# (generation, build directory) of the index_meta.json this process serves; a different
+# value on disk means another worker published a build. Changed under index_publish_lock.
+served_build: Tuple[int, Optional[str]] = (-1, None)
+index_publish_lock = threading.Lock()
+embedding_stores: Dict[str, EmbeddingStore] = {}
+
+# --- Cache for Query Responses (LRU + TTL, pluggable storage backend) ---
+# memory: per-process (default) | sqlite: file shared by all workers | redis: shared server
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "100"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+QUERY_CACHE_TTL_MINUTES = int(os.getenv("QUERY_CACHE_TTL_MINUTES", "60"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join(os.path.dirname(__file__), "cache", "query_cache.sqlite3"))
+QUERY_CACHE_REDIS_URL = os.getenv("QUERY_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Cache entries are stamped with the index generation they were answered from.
+# sources: older entries stay valid while every source file they used is unchanged
+# strict: any rebuild invalidates all older entries
+CACHE_GENERATION_POLICY = os.getenv("CACHE_GENERATION_POLICY", "sources")
+index_generation = IndexGeneration(policy=CACHE_GENERATION_POLICY)
+
+def normalize_query(query: str) -> str:
+    """Normalized query text shared by the cache key and the single-flight key"""
+    return query.lower().strip()
 
-faiss_index = None
-doc_chunks = []
-
-# --- In-Memory Cache for Query Responses (LRU Cache) ---
 class QueryCache:
-    """Simple LRU cache for query responses with TTL"""
-    def __init__(self, max_size=100, ttl_minutes=60):
-        self.cache: OrderedDict[str, Dict] = OrderedDict()
+    """LRU cache for query responses with TTL, stored in a CacheBackend"""
+    def __init__(self, max_size=100, ttl_minutes=60, backend: Optional[CacheBackend] = None,
+                 generation: Optional[IndexGeneration] = None):
         self.max_size = max_size
+        self.generation = generation
         self.ttl = timedelta(minutes=ttl_minutes)
+        self.backend = backend or MemoryCacheBackend(
+            max_entries=max_size, ttl_seconds=self.ttl.total_seconds()
+        )
+        # File and network backends block on I/O; the async methods run them in a worker thread
+        self.blocking = self.backend.name != "memory"
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
     
     def _hash_query(self, query: str) -> str:
         """Create hash of normalized query for cache key"""
-        normalized = query.lower().strip()
+        normalized = normalize_query(query)
         return hashlib.md5(normalized.encode()).hexdigest()
     
-    def get(self, query: str) -> Optional[Dict]:
-        """Get cached response if exists and not expired"""
+    def _fetch(self, query: str) -> Tuple[Optional[Dict], bool]:
+        """Backend lookup only: (live entry or None, whether a stale entry was evicted)"""
         key = self._hash_query(query)
-        if key in self.cache:
-            cached_data = self.cache[key]
-            # Check if expired
-            if datetime.now() - cached_data['timestamp'] < self.ttl:
-                # Move to end (most recently used)
-                self.cache.move_to_end(key)
-                print(f"[CACHE] HIT for query: {query[:50]}...")
-                return cached_data['response']
-            else:
-                # Expired, remove
-                del self.cache[key]
-                print(f"[CACHE] EXPIRED for query: {query[:50]}...")
+        try:
+            cached = self.backend.get(key)
+            if cached is not None and self.generation is not None and not self.generation.is_current(cached.get('stamp')):
+                # Built from an older knowledge base; evict lazily instead of serving it
+                self.backend.delete(key)
+                return None, True
+            return cached, False
+        except Exception as e:
+            # A cache outage must never fail the chat request
+            print(f"[CACHE] Backend error on get: {e}")
+            return None, False
+
+    def _record(self, query: str, cached: Optional[Dict], stale: bool) -> Optional[Dict]:
+        """Count the lookup (on the event loop) and return the cached response"""
+        if stale:
+            self.stale += 1
+            print(f"[CACHE] STALE (old index generation) for query: {query[:50]}...")
+        if cached is not None:
+            self.hits += 1
+            print(f"[CACHE] HIT for query: {query[:50]}...")
+            return cached['response']
+        self.misses += 1
         return None
-    
-    def set(self, query: str, response: Dict):
-        """Cache a response"""
-        key = self._hash_query(query)
-        
-        # Remove oldest if at max size
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            oldest = next(iter(self.cache))
-            del self.cache[oldest]
-            print(f"[CACHE] Evicted oldest entry")
-        
-        self.cache[key] = {
-            'response': response,
-            'timestamp': datetime.now()
-        }
-        print(f"[CACHE] STORED for query: {query[:50]}...")
+
+    def get(self, query: str) -> Optional[Dict]:
+        """Get cached response if exists and not expired"""
+        return self._record(query, *self._fetch(query))
+
+    async def get_async(self, query: str) -> Optional[Dict]:
+        """`get` without blocking the event loop on a file or network backend"""
+        if not self.blocking:
+            return self.get(query)
+        return self._record(query, *(await asyncio.to_thread(self._fetch, query)))
+
+    def _entry(self, response: Dict, stamp: Optional[Dict]) -> Dict:
+        return {'response': response, 'stamp': stamp}
+
+    def _store(self, query: str, entry: Dict):
+        try:
+            self.backend.set(self._hash_query(query), entry)
+            print(f"[CACHE] STORED for query: {query[:50]}...")
+        except Exception as e:
+            print(f"[CACHE] Backend error on set: {e}")
+
+    def set(self, query: str, response: Dict, stamp: Optional[Dict] = None):
+        """Cache a response with the stamp of the snapshot it was answered from (`IndexSnapshot.stamp`)"""
+        self._store(query, self._entry(response, stamp))
+
+    async def set_async(self, query: str, response: Dict, stamp: Optional[Dict] = None):
+        """`set` without blocking the event loop on a file or network backend"""
+        entry = self._entry(response, stamp)
+        if not self.blocking:
+            self._store(query, entry)
+        else:
+            await asyncio.to_thread(self._store, query, entry)
     
     def clear(self):
         """Clear all cache"""
-        self.cache.clear()
+        self.backend.clear()
         print(f"[CACHE] Cleared all entries")
-    
+
+    async def clear_async(self):
+        if not self.blocking:
+            self.clear()
+        else:
+            await asyncio.to_thread(self.clear)
+
     def stats(self) -> Dict:
         """Get cache statistics"""
+        backend_stats = self.backend.stats()
         return {
-            'size': len(self.cache),
+            'size': backend_stats['size'],
             'max_size': self.max_size,
+            'bytes': backend_stats['bytes'],
+            'max_bytes': backend_stats['max_bytes'],
+            'backend': backend_stats['backend'],
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
             'ttl_minutes': self.ttl.total_seconds() / 60
         }
 
-# Initialize cache (100 queries, 60 minutes TTL)
-query_cache = QueryCache(max_size=100, ttl_minutes=60)
+    async def stats_async(self) -> Dict:
+        return await asyncio.to_thread(self.stats) if self.blocking else self.stats()
+
+# Initialize cache (defaults: 100 queries, 60 minutes TTL, in-process memory)
+query_cache = QueryCache(
+    max_size=QUERY_CACHE_MAX_ENTRIES,
+    ttl_minutes=QUERY_CACHE_TTL_MINUTES,
+    backend=create_cache_backend(
+        QUERY_CACHE_BACKEND,
+        max_entries=QUERY_CACHE_MAX_ENTRIES,
+        max_bytes=QUERY_CACHE_MAX_BYTES,
+        ttl_seconds=QUERY_CACHE_TTL_MINUTES * 60,
+        path=QUERY_CACHE_PATH,
+        redis_url=QUERY_CACHE_REDIS_URL,
+    ),
+    generation=index_generation,
+)
+
+# Semantic tier: paraphrases of an answered query (cosine similarity of query embeddings)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "500"))
+semantic_cache = SemanticQueryCache(max_size=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD,
+                                   ttl_minutes=QUERY_CACHE_TTL_MINUTES, generation=index_generation)
+
+# Query text -> embedding, so a repeated query skips the Nomic round-trip even when
+# the answer caches miss (after a rebuild or cache clear). Not emptied by /cache/clear.
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2000"))
+QUERY_EMBEDDING_CACHE_TTL_MINUTES = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL_MINUTES", "1440"))
+query_embedding_cache = QueryEmbeddingCache(model=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION,
+                                            max_size=QUERY_EMBEDDING_CACHE_SIZE,
+                                            ttl_minutes=QUERY_EMBEDDING_CACHE_TTL_MINUTES)
+
+# Identical concurrent queries share one in-flight RAG pipeline run
+rag_flights = SingleFlight()
+
+reranker = LexicalReranker(budget_ms=RERANK_BUDGET_MS)
+# Which degradation level answered each pipeline run
+degradation_metrics = DegradationMetrics()
 
 # --- Helper Functions for Document Processing ---
+def publish_snapshot(snapshot: IndexSnapshot, generation: Optional[IndexGeneration] = None):
+    """Make `snapshot` the one new requests read; requests already running keep theirs."""
+    global index_snapshot
+    index_snapshot = snapshot
+    if generation is not None:
+        index_generation.update(generation)
+
+def convert_legacy_chunks() -> bool:
+    """Convert doc_chunks.json to the chunk store when only the JSON exists."""
+    if ChunkStore.exists(CHUNK_STORE_PATH) or not os.path.exists(DOC_CHUNKS_PATH):
+        return False
+    store = ChunkStore.from_json(DOC_CHUNKS_PATH)
+    store.save(CHUNK_STORE_PATH)
+    os.remove(DOC_CHUNKS_PATH)
+    print(f"[INDEX] Converted {DOC_CHUNKS_PATH} to the chunk store ({len(store)} chunks)")
+    return True
+
+def read_index_meta() -> Dict:
+    """index_meta.json of the published build ({} before the first build)"""
+    if not os.path.exists(INDEX_META_PATH):
+        return {}
+    with open(INDEX_META_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def published_chunk_store_path() -> Optional[str]:
+    """Chunk store of the published build, if there is one on disk"""
+    paths = published_build_paths(VECTOR_DB_DIR)
+    return paths[1] if paths and ChunkStore.exists(paths[1]) else None
+
+def published_build(meta: Dict) -> Tuple[int, Optional[str]]:
+    """(generation, build directory) that `meta` publishes"""
+    return int(meta.get('generation', 0)), published_build_dir(VECTOR_DB_DIR, meta)
+
+def load_published_build(meta: Dict) -> Tuple[IndexSnapshot, IndexGeneration]:
+    """Open the build `meta` (index_meta.json) names; an empty build gives an empty snapshot."""
+    generation = IndexGeneration.from_dict(meta, policy=CACHE_GENERATION_POLICY)
+    build_dir = published_build_dir(VECTOR_DB_DIR, meta)
+    if build_dir is None:
+        return IndexSnapshot(generation=generation.generation, files=generation.files), generation
+    snapshot = IndexSnapshot.load(*build_paths(build_dir), generation.generation, meta.get('index_settings'),
+                                  mmap=INDEX_MMAP, files=generation.files)
+    metric = metric_name(snapshot.index)
+    if metric != INDEX_METRIC:
+        print(f"[INDEX] Loaded index uses {metric} but INDEX_METRIC={INDEX_METRIC}; "
+              f"rebuild the index to switch.")
+    search = set_search_params(snapshot.index, INDEX_NPROBE, INDEX_EF_SEARCH)
+    return snapshot.with_settings(metric=metric, search=search), generation
+
+def reload_published_index() -> bool:
+    """Switch to the build index_meta.json names if another process published it.
+
+    Runs in a worker thread (see `watch_published_index`) and before every rebuild.
+    Returns True when a different build was loaded; if it cannot be loaded the
+    current snapshot keeps serving and the error is raised.
+    """
+    global served_build
+    with index_publish_lock:
+        meta = read_index_meta()
+        if published_build(meta) == served_build:
+            return False
+        snapshot, generation = load_published_build(meta)
+        # The other process also grew the embedding store; read it again on next use
+        embedding_stores.pop("search_document", None)
+        publish_snapshot(snapshot, generation)
+        served_build = published_build(meta)
+    return True
+
+async def watch_published_index():
+    """Keep this worker on the latest build when other workers (or rebuild_index.py) publish one"""
+    while True:
+        await asyncio.sleep(INDEX_RELOAD_SECONDS)
+        try:
+            if await asyncio.to_thread(reload_published_index):
+                print(f"[INDEX] Loaded generation {index_snapshot.generation} published by another process")
+        except Exception as e:
+            print(f"[INDEX] Could not load the build published by another process: {e}")
+
 def load_faiss_index_and_chunks():
     """Loads FAISS index and document chunks if they exist."""
-    global faiss_index, doc_chunks
-    if os.path.exists(FAISS_INDEX_PATH) and os.path.exists(DOC_CHUNKS_PATH):
+    global served_build
+    try:
+        convert_legacy_chunks()
+    except Exception as e:
+        print(f"Error converting {DOC_CHUNKS_PATH}: {e}")
+    try:
+        # One read: the generation, settings and file set all come from the same publish
+        meta = read_index_meta()
+    except Exception as e:
+        print(f"[INDEX] Could not read {INDEX_META_PATH}: {e}")
+        meta = {}
+    # Also when nothing loads: the watcher reacts to the next build published, not to this one
+    served_build = published_build(meta)
+    build_dir = published_build_dir(VECTOR_DB_DIR, meta)
+    index_path, chunks_path, _ = build_paths(build_dir) if build_dir else (None, None, None)
+    if build_dir and os.path.exists(index_path) and ChunkStore.exists(chunks_path):
         try:
             print("Loading FAISS index and document chunks...")
-            faiss_index = faiss.read_index(FAISS_INDEX_PATH)
-            with open(DOC_CHUNKS_PATH, 'r', encoding='utf-8') as f:
-                doc_chunks = json.load(f)
-            print("Loaded FAISS index and document chunks successfully.")
+            snapshot, generation = load_published_build(meta)
+            publish_snapshot(snapshot, generation)
+            print(f"Loaded FAISS index and document chunks successfully (generation {generation.generation}, "
+                  f"type {snapshot.settings.get('type', 'flat')}).")
         except Exception as e:
             print(f"Error loading FAISS index or chunks: {e}. Will attempt to re-process.")
-            faiss_index = None
-            doc_chunks = []
+            publish_snapshot(IndexSnapshot())
     else:
         print("FAISS index or document chunks not found. Will run pre-processing.")
-        faiss_index = None
-        doc_chunks = []
-
-def extract_text_from_docx(filepath):
-    """Extracts text from a .docx file."""
-    doc = Document(filepath)
-    full_text = []
-    for para in doc.paragraphs:
-        if para.text.strip():
-            full_text.append(para.text.strip())
-    return "\n".join(full_text)
-
-def chunk_text(text, max_chars=1000, overlap=100):
-    """Chunks text into smaller pieces with optional overlap."""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + max_chars, len(text))
-        chunk = text[start:end]
-        chunks.append(chunk)
-        if end == len(text):
-            break
-        start += (max_chars - overlap)
-    return chunks
+        publish_snapshot(IndexSnapshot())
+
+def nomic_task(task_type: str) -> str:
+    return "search_document" if (task_type or "").upper().endswith("DOCUMENT") else "search_query"
+
+def get_embedding_store(task_type: str = "RETRIEVAL_DOCUMENT") -> EmbeddingStore:
+    """Embedding cache for `task_type` under the configured model and dimension."""
+    task = nomic_task(task_type)
+    if task not in embedding_stores:
+        path = EMBEDDING_STORE_PATH if task == "search_document" else f"{EMBEDDING_STORE_PATH}_{task}"
+        embedding_stores[task] = EmbeddingStore(path, model=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION,
+                                                task_type=task, dtype=EMBEDDING_STORE_DTYPE).load()
+    return embedding_stores[task]
+
+def nomic_embed_batch(texts: List[str], task_type="RETRIEVAL_DOCUMENT") -> List[List[float]]:
+    """One Nomic embeddings API call for `texts`."""
+    model_for_nomic = (EMBEDDING_MODEL or "nomic-embed-text-v1.5").split("/")[-1]
+    out = embed.text(
+        texts=texts,
+        model=model_for_nomic,
+        task_type=nomic_task(task_type),
+        dimensionality=EMBEDDING_DIMENSION,
+    )
+    return out.get("embeddings", [])
+
+# Shared by every build so concurrent rebuild jobs and scripts stay under one request rate
+embed_rate_limiter = TokenBucket(EMBED_RATE_PER_SECOND, EMBED_RATE_BURST)
+
+def generate_embeddings_batch(texts: List[str], task_type: str,
+                              on_batch: Callable[[List[int], np.ndarray], None]) -> Dict[int, str]:
+    """Generates embeddings for a list of texts using Nomic embeddings API.
 
-def generate_embeddings_batch(texts: List[str], task_type="RETRIEVAL_DOCUMENT") -> List[List[float]]:
-    """Generates embeddings for a list of texts using Nomic embeddings API."""
-    embeddings: List[List[float]] = []
-    batch_size = 100
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i + batch_size]
+    Texts already in the embedding cache are served from it and each distinct text is
+    sent once; the rest go to Nomic in concurrent batches under the rate limiter,
+    retried on 429/5xx. New vectors are cached and checkpointed to disk every
+    EMBED_CHECKPOINT_SECONDS. `on_batch(positions, vectors)` receives every finished
+    batch; the positions of texts that could not be embedded are returned with their error.
+    """
+    store = get_embedding_store(task_type)
+    positions_by_key: Dict[str, List[int]] = {}
+    for position, text in enumerate(texts):
+        positions_by_key.setdefault(content_hash(text), []).append(position)
+
+    cached_keys = [key for key in positions_by_key if key in store]
+    missing = [key for key in positions_by_key if key not in store]
+    print(f"[EMBED] {len(missing)} texts to embed, {len(texts) - sum(len(positions_by_key[k]) for k in missing)} "
+          f"served from the embedding cache")
+    if cached_keys:
+        cached_vectors = store.get_many(cached_keys)
+        positions = [p for key in cached_keys for p in positions_by_key[key]]
+        on_batch(positions, np.repeat(cached_vectors, [len(positions_by_key[k]) for k in cached_keys], axis=0))
+    if not missing:
+        return {}
+
+    last_checkpoint = time.monotonic()
+
+    def _cache_batch(batch_positions: List[int], vectors: np.ndarray):
+        nonlocal last_checkpoint
+        keys = [missing[i] for i in batch_positions]
+        store.put_many(keys, vectors)
+        positions = [p for key in keys for p in positions_by_key[key]]
+        on_batch(positions, np.repeat(vectors, [len(positions_by_key[k]) for k in keys], axis=0))
+        if time.monotonic() - last_checkpoint >= EMBED_CHECKPOINT_SECONDS:
+            store.save()
+            last_checkpoint = time.monotonic()
+
+    failures = embed_in_batches(
+        [texts[positions_by_key[key][0]] for key in missing], lambda batch: nomic_embed_batch(batch, task_type),
+        _cache_batch, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_BUILD_CONCURRENCY,
+        limiter=embed_rate_limiter, max_attempts=EMBED_MAX_ATTEMPTS,
+    )
+    store.save()
+    return {p: error for i, error in failures.items() for p in positions_by_key[missing[i]]}
+
+def generate_embeddings(texts: List[str], task_type="RETRIEVAL_DOCUMENT") -> np.ndarray:
+    """Embeddings for every text, in order; raises instead of returning placeholder vectors."""
+    vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+
+    def _collect(positions: List[int], batch: np.ndarray):
+        for p, v in zip(positions, batch):
+            vectors[p] = v
+
+    failures = generate_embeddings_batch(texts, task_type, on_batch=_collect)
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(texts)} texts could not be embedded: "
+                           f"{next(iter(failures.values()))}")
+    return np.vstack(vectors) if vectors else np.zeros((0, EMBEDDING_DIMENSION), dtype='float32')
+
+def next_index_generation(file_fingerprints: Dict[str, str]) -> IndexGeneration:
+    """Generation id for a new index build (above both the loaded and the saved one)."""
+    on_disk = IndexGeneration.load(INDEX_META_PATH, policy=CACHE_GENERATION_POLICY)
+    base = on_disk if on_disk.generation > index_generation.generation else index_generation
+    return base.next(file_fingerprints)
+
+def remove_old_builds(published: Optional[str], previous: Optional[str], generation: int):
+    """Delete saved builds older than the previous one.
+
+    The previous build stays, since other worker processes may still be serving it
+    until they reload. Directories from generation - 1 upward are left alone: one of
+    them may be a build another process is still writing.
+    """
+    keep = {published, previous}
+    if VECTOR_DB_DIR not in keep:
+        legacy_files = [FAISS_INDEX_PATH, BM25_INDEX_PATH, DOC_CHUNKS_PATH] + [
+            CHUNK_STORE_PATH + suffix for suffix in (".text.bin", ".rows.npy", ".files.json")]
+        for path in legacy_files:
+            if os.path.exists(path):
+                os.remove(path)
+    for name in os.listdir(VECTOR_DB_DIR):
+        path = os.path.join(VECTOR_DB_DIR, name)
+        if not name.startswith("gen-") or path in keep or not os.path.isdir(path):
+            continue
         try:
-            task = "search_document" if (task_type or "").upper().endswith("DOCUMENT") else "search_query"
-            model_for_nomic = (EMBEDDING_MODEL or "nomic-embed-text-v1.5").split("/")[-1]
-            out = embed.text(
-                texts=batch_texts,
-                model=model_for_nomic,
-                task_type=task,
-                dimensionality=768,
-            )
-            batch_embeddings = out.get("embeddings", [])
-            if not batch_embeddings or len(batch_embeddings) != len(batch_texts):
-                raise ValueError(f"Nomic returned {len(batch_embeddings)} embeddings for {len(batch_texts)} inputs")
-            embeddings.extend(batch_embeddings)
-        except Exception as e:
-            print(f"Error generating embeddings for batch (index {i}): {e}")
-            traceback.print_exc()
-            # Fallback: zero vectors with Nomic dimension
-            embeddings.extend([np.zeros(768).tolist()] * len(batch_texts))
-    return embeddings
-
-async def preprocess_documents_and_build_index():
-    """Extract text, chunk, embed, and build/update FAISS index."""
-    global faiss_index, doc_chunks
-    print("Starting document pre-processing...")
+            build_generation = int(name.split("-")[1])
+        except ValueError:
+            continue
+        if build_generation < generation - 1:
+            shutil.rmtree(path, ignore_errors=True)
 
-    os.makedirs(DATA_DIR, exist_ok=True)
-    os.makedirs(VECTOR_DB_DIR, exist_ok=True)
+def publish_index_build(index, chunks: List[Dict], settings: Dict, file_fingerprints: Dict[str, str],
+                        previous_bm25: Optional[BM25Index] = None):
+    """Save a finished build to its own directory, then swap the caches and readers to it.
 
-    all_chunks_with_metadata = []
-    for filename in os.listdir(DATA_DIR):
+    Nothing the old build uses is overwritten; rewriting index_meta.json (one rename)
+    publishes the new file set as a whole. An `index` of None publishes an empty build.
+    The BM25 index is rebuilt for `chunks`; chunks already in `previous_bm25` reuse its tokenization.
+    """
+    global served_build
+    new_generation = next_index_generation(file_fingerprints)
+    bm25 = BM25Index.build(chunks, previous=previous_bm25)
+    snapshot = IndexSnapshot(index, ChunkStore.from_chunks(chunks), new_generation.generation, settings, bm25=bm25,
+                             files=new_generation.files)
+    build_dir = None
+    if snapshot.index is not None:
+        build_dir = os.path.join(VECTOR_DB_DIR, snapshot.save_build(VECTOR_DB_DIR))
+        get_embedding_store().save()
+        if INDEX_MMAP:
+            # Serve the saved files mapped, like a freshly started worker, instead of the heap copy just built
+            snapshot = IndexSnapshot.load(*build_paths(build_dir), new_generation.generation, settings,
+                                          files=new_generation.files)
+            set_search_params(snapshot.index, **{k: v for k, v in settings.get('search', {}).items()
+                                                 if k in ('nprobe', 'ef_search')})
+    saved_settings = {k: v for k, v in snapshot.settings.items() if k != 'search'}
+    with index_publish_lock:
+        previous_dir = published_build_dir(VECTOR_DB_DIR, read_index_meta())
+        new_generation.save(INDEX_META_PATH, build_dir=os.path.basename(build_dir) if build_dir else None,
+                            embedding_model=EMBEDDING_MODEL, chunk_count=len(snapshot.chunks),
+                            index_settings=saved_settings)
+        publish_snapshot(snapshot, new_generation)
+        served_build = (new_generation.generation, build_dir)
+    remove_old_builds(build_dir, previous_dir, new_generation.generation)
+    print(f"[INDEX] Generation {new_generation.generation} built at {new_generation.built_at}")
+
+# Progress callback of a rebuild: (stage, processed, total)
+ProgressCallback = Callable[[str, int, int], None]
+
+def _no_progress(stage: str, processed: int = 0, total: int = 0):
+    pass
+
+def list_data_files() -> Dict[str, str]:
+    """Fingerprint of every .docx in DATA_DIR."""
+    files = {}
+    for filename in sorted(os.listdir(DATA_DIR)):
         if filename.endswith(".docx") and not filename.startswith("~$"):
-            filepath = os.path.join(DATA_DIR, filename)
-            print(f"Processing {filepath}...")
-            try:
-                text = extract_text_from_docx(filepath)
-                chunks = chunk_text(text)
-                # Add metadata for each chunk
-                for chunk in chunks:
-                    all_chunks_with_metadata.append({
-                        "text": chunk,
-                        "filename": filename,
-                        "filepath": filepath
-                    })
-            except Exception as e:
-                print(f"Error processing {filepath}: {e}")
-                continue
+            files[filename] = file_fingerprint(os.path.join(DATA_DIR, filename))
+    return files
+
+def file_chunks(filename: str, pieces: List[Dict]) -> List[Dict]:
+    """Chunk records of one .docx; every chunk carries its FAISS id, content hash and heading path."""
+    filepath = os.path.join(DATA_DIR, filename)
+    chunks: Dict[int, Dict] = {}
+    for piece in pieces:
+        chunk = piece["text"]
+        cid = chunk_id(filename, chunk)
+        # The same text repeated within one file adds nothing to retrieval
+        if cid not in chunks:
+            chunks[cid] = {
+                "id": cid,
+                "content_hash": content_hash(chunk),
+                "text": chunk,
+                "heading": piece["heading"],
+                "filename": filename,
+                "filepath": filepath
+            }
+    return list(chunks.values())
 
-    if not all_chunks_with_metadata:
-        print("No text extracted from documents. Check your .docx files in backend/data.")
-        faiss_index = None
-        doc_chunks = []
-        if os.path.exists(FAISS_INDEX_PATH):
-            os.remove(FAISS_INDEX_PATH)
-        if os.path.exists(DOC_CHUNKS_PATH):
-            os.remove(DOC_CHUNKS_PATH)
+def extract_files(filenames: List[str], progress: ProgressCallback = _no_progress
+                  ) -> Tuple[Dict[str, List[Dict]], Dict[str, str]]:
+    """Extract and chunk `filenames` on the process pool.
+
+    Returns (chunks by file, error by file); files that fail are logged and left out.
+    """
+    if not filenames:
+        return {}, {}
+    paths = {os.path.join(DATA_DIR, filename): filename for filename in filenames}
+    start = datetime.now()
+    progress("extracting", 0, len(paths))
+    texts_by_path, errors = extract_many(list(paths), workers=EXTRACT_WORKERS,
+                                         on_file=lambda done: progress("extracting", done, len(paths)),
+                                         strategy=CHUNK_STRATEGY, max_chars=CHUNK_MAX_CHARS)
+    for path, error in errors.items():
+        print(f"Error processing {path}: {error}")
+    print(f"[INDEX] Extracted {len(texts_by_path)}/{len(paths)} files with {min(EXTRACT_WORKERS, len(paths))} "
+          f"worker(s) in {(datetime.now() - start).total_seconds():.2f}s")
+    return ({paths[path]: file_chunks(paths[path], texts) for path, texts in texts_by_path.items()},
+            {paths[path]: error for path, error in errors.items()})
+
+def embed_chunks(chunks: List[Dict], progress: ProgressCallback = _no_progress
+                 ) -> Tuple[List[Dict], np.ndarray, Dict[str, str]]:
+    """Embeddings for `chunks`; only texts missing from the embedding cache go to Nomic.
+
+    Returns (embedded chunks, their vectors, error by failed file). A file with any
+    chunk that could not be embedded is left out whole and not marked as indexed, so
+    the next rebuild retries it; no placeholder vector ever reaches the index.
+    """
+    vectors = np.zeros((len(chunks), EMBEDDING_DIMENSION), dtype='float32')
+    done = 0
+    progress("embedding", 0, len(chunks))
+
+    def _collect(positions: List[int], batch: np.ndarray):
+        nonlocal done
+        vectors[positions] = batch
+        done += len(positions)
+        progress("embedding", done, len(chunks))
+
+    failures = generate_embeddings_batch([chunk["text"] for chunk in chunks], "RETRIEVAL_DOCUMENT", _collect)
+    failed_files: Dict[str, str] = {}
+    for position, error in failures.items():
+        failed_files.setdefault(chunks[position]["filename"], error)
+    if failed_files:
+        print(f"[INDEX] {len(failures)} chunks could not be embedded; leaving out "
+              f"{len(failed_files)} file(s): {', '.join(failed_files)}")
+
+    keep = [i for i, chunk in enumerate(chunks) if chunk["filename"] not in failed_files]
+    return [chunks[i] for i in keep], prepare_vectors(vectors[keep], INDEX_METRIC), failed_files
+
+def chunk_ids(chunks: List[Dict]) -> np.ndarray:
+    return np.array([chunk["id"] for chunk in chunks], dtype='int64')
+
+def clear_index_files():
+    """Publish an empty build; the files of older builds are removed as usual"""
+    publish_index_build(None, [], {}, {})
+
+def clear_or_keep_index(current_files: Dict[str, str], errors: Dict[str, str]):
+    """Nothing was extracted: clear the index only when backend/data really has no documents.
+
+    A pool-level failure (BrokenProcessPool, a worker killed for memory) fails every file at
+    once; publishing an empty build then would wipe a working index, so keep the previous one.
+    """
+    if not current_files:
+        print("No documents in backend/data; publishing an empty index.")
+        clear_index_files()
         return
+    if errors:
+        raise RuntimeError(f"Extraction failed for {len(errors)} of {len(current_files)} file(s) "
+                           f"({next(iter(errors.values()))}); keeping the previous index")
+    raise RuntimeError("No text extracted from documents. Check your .docx files in backend/data; "
+                       "keeping the previous index")
+
+def can_update_incrementally(snapshot: IndexSnapshot) -> bool:
+    """The loaded index can take add/remove by chunk id and matches the configured type and metric."""
+    if not snapshot.ready:
+        return False
+    if not has_ids(snapshot.index):
+        print("[INDEX] Loaded index predates chunk ids; running a full rebuild.")
+        return False
+    built_type = snapshot.settings.get('requested_type', snapshot.settings.get('type', 'flat'))
+    if built_type != INDEX_TYPE or snapshot.settings.get('metric') != INDEX_METRIC:
+        print(f"[INDEX] Index was built as {built_type}/{snapshot.settings.get('metric')}, "
+              f"configured {INDEX_TYPE}/{INDEX_METRIC}; running a full rebuild.")
+        return False
+    # Indexes from before the chunker setting used fixed windows
+    if snapshot.settings.get('chunker', 'fixed') != CHUNKER:
+        print(f"[INDEX] Chunks were made with {snapshot.settings.get('chunker', 'fixed')}, configured {CHUNKER}; "
+              f"running a full rebuild.")
+        return False
+    return True
+
+def build_full_index(current_files: Dict[str, str], progress: ProgressCallback = _no_progress) -> Dict[str, str]:
+    """Re-extract every document and build a fresh index (embeddings still come from the store).
+
+    Returns the files left out because they could not be extracted or embedded.
+    """
+    all_chunks_with_metadata = []
+    file_fingerprints: Dict[str, str] = {}
+    extracted, extract_errors = extract_files(list(current_files), progress)
+    for filename, chunks in extracted.items():
+        all_chunks_with_metadata.extend(chunks)
+        file_fingerprints[filename] = current_files[filename]
 
-    print(f"Generated {len(all_chunks_with_metadata)} text chunks.")
-    doc_chunks = all_chunks_with_metadata
+    if not all_chunks_with_metadata:
+        clear_or_keep_index(current_files, extract_errors)
+        return {}
 
+    print(f"Generated {len(all_chunks_with_metadata)} text chunks.")
     print("Generating embeddings for document chunks (this might take a while)...")
-    # Extract only text for embedding generation
-    chunk_texts = [chunk["text"] for chunk in doc_chunks]
-    embeddings = generate_embeddings_batch(chunk_texts, task_type="RETRIEVAL_DOCUMENT")
-
-    if not embeddings or len(embeddings) != len(doc_chunks):
-        print("Failed to generate embeddings for all chunks. Aborting FAISS index creation.")
-        faiss_index = None
-        doc_chunks = []
-        if os.path.exists(FAISS_INDEX_PATH):
-            os.remove(FAISS_INDEX_PATH)
-        if os.path.exists(DOC_CHUNKS_PATH):
-            os.remove(DOC_CHUNKS_PATH)
-        return
-
-    embeddings_np = np.array(embeddings).astype('float32')
-    dimension = embeddings_np.shape[1]
+    all_chunks_with_metadata, embeddings_np, failed_files = embed_chunks(all_chunks_with_metadata, progress)
+    if not all_chunks_with_metadata:
+        # Keep serving the previous build rather than publishing an empty one
+        raise RuntimeError(f"No chunks could be embedded ({len(failed_files)} file(s) failed)")
+    for filename in failed_files:
+        file_fingerprints.pop(filename, None)
+    ids = chunk_ids(all_chunks_with_metadata)
+    progress("indexing", 0, len(ids))
+
+    settings = index_description(
+        INDEX_TYPE, embeddings_np.shape[1], len(embeddings_np), nlist=INDEX_NLIST or None,
+        pq_m=INDEX_PQ_M, pq_nbits=INDEX_PQ_NBITS, hnsw_m=INDEX_HNSW_M, metric=INDEX_METRIC,
+    )
+    settings['chunker'] = CHUNKER
+    new_index = build_index(embeddings_np, settings, ids=ids, ef_construction=INDEX_EF_CONSTRUCTION)
+    settings['search'] = set_search_params(new_index, INDEX_NPROBE, INDEX_EF_SEARCH)
+    if settings['type'] != "flat":
+        # Approximate index: measure how much of the exact top-k it still finds
+        recall = check_recall(new_index, embeddings_np, ids=ids, k=INDEX_RECALL_K)
+        settings['recall_check'] = {**recall, 'search': settings['search']}
+        print(f"[INDEX] {settings['factory']} recall@{recall['k']} = {recall['recall']:.3f} "
+              f"({recall['avg_search_ms']:.3f} ms/query)")
+        if recall['recall'] < INDEX_MIN_RECALL:
+            print(f"[INDEX] WARNING: recall below INDEX_MIN_RECALL={INDEX_MIN_RECALL}; "
+                  f"raise INDEX_NPROBE/INDEX_EF_SEARCH or use INDEX_TYPE=flat")
+
+    pruned = get_embedding_store().prune(chunk["content_hash"] for chunk in all_chunks_with_metadata)
+    if pruned:
+        print(f"[INDEX] Pruned {pruned} unused embeddings from the store")
+    progress("saving", 0, 0)
+    publish_index_build(new_index, all_chunks_with_metadata, settings, file_fingerprints)
+    return {**extract_errors, **failed_files}
+
+def update_index_incrementally(snapshot: IndexSnapshot, current_files: Dict[str, str],
+                               progress: ProgressCallback = _no_progress) -> Dict[str, str]:
+    """Remove chunks of changed/deleted files and add chunks of new/changed files by id.
+
+    Returns the files left out because they could not be extracted or embedded.
+    """
+    previous_files = index_generation.files
+    stale_files = {fn for fn, fp in previous_files.items() if current_files.get(fn) != fp}
+    new_files = [fn for fn, fp in current_files.items() if previous_files.get(fn) != fp]
+    if not stale_files and not new_files:
+        print("[INDEX] Knowledge base is up to date; nothing to re-index.")
+        return {}
+    print(f"[INDEX] Incremental update: {len(new_files)} new/changed file(s), "
+          f"{len(stale_files - set(new_files))} deleted file(s)")
+
+    stale_mask = snapshot.chunks.file_mask(stale_files)
+    kept_chunks = [snapshot.chunks[row] for row in np.flatnonzero(~stale_mask)]
+    removed_ids = snapshot.chunks.ids[stale_mask]
+    file_fingerprints = {fn: fp for fn, fp in previous_files.items() if fn not in stale_files}
+
+    new_chunks = []
+    extracted, extract_errors = extract_files(new_files, progress)
+    for filename, chunks in extracted.items():
+        new_chunks.extend(chunks)
+        file_fingerprints[filename] = current_files[filename]
+
+    if not kept_chunks and not new_chunks:
+        clear_or_keep_index(current_files, extract_errors)
+        return {}
+
+    settings = dict(snapshot.settings)
+    if len(removed_ids) and not supports_remove(snapshot.index):
+        # HNSW graphs cannot delete nodes: rebuild the graph from stored embeddings, no new Nomic calls for kept chunks
+        print(f"[INDEX] {settings.get('factory')} cannot remove vectors; rebuilding it from the embedding store")
+        all_chunks, vectors, failed_files = embed_chunks(kept_chunks + new_chunks, progress)
+        new_chunks = [chunk for chunk in new_chunks if chunk["filename"] not in failed_files]
+        kept_chunks = [chunk for chunk in kept_chunks if chunk["filename"] not in failed_files]
+        if not all_chunks:
+            raise RuntimeError(f"No chunks could be embedded ({len(failed_files)} file(s) failed)")
+        progress("indexing", 0, len(all_chunks))
+        updated_index = build_index(vectors, settings, ids=chunk_ids(all_chunks),
+                                    ef_construction=INDEX_EF_CONSTRUCTION)
+        settings['search'] = set_search_params(updated_index, INDEX_NPROBE, INDEX_EF_SEARCH)
+    else:
+        # Readers may be searching the published index: change a copy and publish that
+        # (a heap copy; a mapped index is read-only and its IVF lists cannot be cloned)
+        updated_index = writable_copy(snapshot.index, snapshot.index_path)
+        new_chunks, vectors, failed_files = embed_chunks(new_chunks, progress)
+        progress("indexing", 0, len(new_chunks))
+        removed = remove_vectors(updated_index, removed_ids)
+        if new_chunks:
+            add_vectors(updated_index, vectors, chunk_ids(new_chunks))
+        print(f"[INDEX] Removed {removed} vectors, added {len(new_chunks)} vectors")
+
+    for filename in failed_files:
+        file_fingerprints.pop(filename, None)
+    progress("saving", 0, 0)
+    publish_index_build(updated_index, kept_chunks + new_chunks, settings, file_fingerprints,
+                        previous_bm25=snapshot.bm25)
+    return {**extract_errors, **failed_files}
+
+def rebuild_index_files(full_rebuild: bool = False, progress: ProgressCallback = _no_progress) -> Dict[str, str]:
+    """Bring the FAISS index in line with the .docx files in backend/data (blocking).
+
+    By default only new, changed and deleted files are processed; `full_rebuild`
+    re-extracts every document and rebuilds the index structure from scratch.
+    """
+    print("Starting document pre-processing...")
 
-    faiss_index = faiss.IndexFlatL2(dimension)
-    faiss_index.add(embeddings_np)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(VECTOR_DB_DIR, exist_ok=True)
 
-    # Save FAISS index and chunks
-    faiss.write_index(faiss_index, FAISS_INDEX_PATH)
-    with open(DOC_CHUNKS_PATH, 'w', encoding='utf-8') as f:
-        json.dump(doc_chunks, f, ensure_ascii=False, indent=2)
+    # One rebuild at a time across worker processes; each starts from the latest published build
+    with build_lock(INDEX_BUILD_LOCK_PATH):
+        if reload_published_index():
+            print(f"[INDEX] Continuing from generation {index_snapshot.generation} published by another process")
+        progress("scanning", 0, 0)
+        current_files = list_data_files()
+        snapshot = index_snapshot
+        if not full_rebuild and can_update_incrementally(snapshot):
+            failed_files = update_index_incrementally(snapshot, current_files, progress)
+        else:
+            failed_files = build_full_index(current_files, progress)
 
     print("Document pre-processing complete. FAISS index created/updated and saved.")
+    return failed_files
+
+async def preprocess_documents_and_build_index(full_rebuild: bool = False,
+                                               progress: ProgressCallback = _no_progress) -> Dict[str, str]:
+    """Run `rebuild_index_files` in a worker thread so docx parsing and Nomic calls don't block the event loop.
+
+    Returns the files that could not be embedded (they stay out of the index until a later rebuild).
+    """
+    return await asyncio.to_thread(rebuild_index_files, full_rebuild, progress)
+
+async def run_index_job(job: IndexJob) -> Dict:
+    """Runner of the background index job queue"""
+    print(f"[INDEX_JOB] Job {job.id} started ({'full rebuild' if job.full_rebuild else 'incremental'}): {', '.join(job.reasons)}")
+    failed_files = await preprocess_documents_and_build_index(full_rebuild=job.full_rebuild, progress=job.progress)
+    snapshot = index_snapshot
+    print(f"[INDEX_JOB] Job {job.id} finished: {len(snapshot.chunks)} chunks, generation {snapshot.generation}, "
+          f"{len(failed_files)} file(s) could not be indexed")
+    return {"chunk_count": len(snapshot.chunks), "index_generation": snapshot.generation, "failed_files": failed_files}
+
+# Seconds a queued rebuild waits so a burst of uploads/deletes is merged into one job
+INDEX_JOB_DEBOUNCE_SECONDS = float(os.getenv("INDEX_JOB_DEBOUNCE_SECONDS", "2"))
+index_jobs = IndexJobQueue(run_index_job, debounce=INDEX_JOB_DEBOUNCE_SECONDS, status_dir=INDEX_JOB_STATUS_DIR)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # INI YANG BARU: Inisialisasi klien dan simpan di app.state
@@ -273,18 +981,35 @@ async def lifespan(app: FastAPI):
         print("OpenRouter client initialized and stored in app.state. Using model:", GENERATIVE_MODEL)
     except Exception as e:
         print(f"FATAL: Failed to initialize OpenRouter client: {e}")
+    app.state.embedding_service = EmbeddingService(
+        api_key=NOMIC_API_KEY,
+        model=EMBEDDING_MODEL,
+        max_workers=EMBED_WORKERS,
+        max_in_flight=EMBED_MAX_IN_FLIGHT,
+        timeout=EMBED_TIMEOUT_SECONDS,
+    )
+    print(f"Embedding service ready (workers={EMBED_WORKERS}, max_in_flight={EMBED_MAX_IN_FLIGHT}, timeout={EMBED_TIMEOUT_SECONDS}s)")
     print("Database tables created/verified.")
 
     print("Loading existing FAISS index...")
     load_faiss_index_and_chunks()
 
-    if faiss_index is None or not doc_chunks:
+    if not index_snapshot.ready:
         print("No existing index found. Building new index...")
         await preprocess_documents_and_build_index()
-        load_faiss_index_and_chunks()
+    if MMR_LAMBDA < 1.0:
+        # MMR reads chunk vectors from the embedding store; open it now rather than on the first query
+        get_embedding_store()
+    index_watcher = asyncio.create_task(watch_published_index()) if INDEX_RELOAD_SECONDS > 0 else None
 
     yield
     print("Application shutting down...")
+    if index_watcher is not None:
+        index_watcher.cancel()
+    await index_jobs.close()
+    app.state.embedding_service.close()
+    if getattr(app.state, "client", None) is not None:
+        await app.state.client.close()
 
 app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()
@@ -385,6 +1110,8 @@ class ChatResponse(BaseModel):
     summary: Optional[str] = None
     suggestions: Optional[str] = None
     is_greeting: bool = False
+    # Set when the answer did not come from the model in time (cached_near_match | extractive)
+    degraded: Optional[str] = None
 
 class SessionRequest(BaseModel):
     title: Optional[str] = None
@@ -429,6 +1156,10 @@ class AdminAuthResponse(BaseModel):
     token_type: str
     admin_email: str
 
+class IndexSearchParamsRequest(BaseModel):
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
  
 
 
@@ -507,112 +1238,203 @@ async def options_chat():
     print("[CHAT] OPTIONS request received")
     return PlainTextResponse(status_code=200)
 
-# (Letakkan ini di atas @app.post("/chat") )
+@app.options("/chat/stream")
+async def options_chat_stream():
+    """Handle CORS preflight for /chat/stream endpoint."""
+    return PlainTextResponse(status_code=200)
+
+
+# --- Server-Sent Events helpers ---
+def format_sse(event: str, data: Dict) -> str:
+    """Format one Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def wants_event_stream(request: Request) -> bool:
+    """True when the client asked for SSE through the Accept header."""
+    return "text/event-stream" in (request.headers.get("accept") or "").lower()
+
+def event_stream_response(events) -> StreamingResponse:
+    """Wrap an SSE generator; disable proxy buffering so tokens are flushed immediately."""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def chat_response_payload(chat_response: "ChatResponse") -> Dict:
+    """Fields of ChatResponse sent in the final `done` event."""
+    return {
+        "response": chat_response.response,
+        "session_id": chat_response.session_id,
+        "sources": chat_response.sources,
+        "sources_count": chat_response.sources_count,
+        "summary": chat_response.summary,
+        "suggestions": chat_response.suggestions,
+        "is_greeting": chat_response.is_greeting,
+        "degraded": chat_response.degraded,
+    }
+
+async def stream_single_response(chat_response: "ChatResponse"):
+    """Replay an already complete answer (greeting / cache hit) as SSE events."""
+    yield format_sse("token", {"content": chat_response.response})
+    yield format_sse("done", chat_response_payload(chat_response))
+
+def save_answer(answer: Dict, session_id: str, chat_service: ChatService) -> ChatResponse:
+    """Save an answer (cache entry shape) to this request's session and build its ChatResponse."""
+    chat_service.add_message(
+        session_id, "bot",
+        answer['response'],
+        answer.get('sources', []),
+        answer.get('summary'),
+        answer.get('suggestions')
+    )
+
+    return ChatResponse(
+        response=answer['response'],
+        session_id=session_id,
+        sources=answer.get('sources', []),
+        sources_count=len(answer.get('sources', [])),
+        summary=answer.get('summary'),
+        suggestions=answer.get('suggestions'),
+        is_greeting=False,
+        degraded=answer.get('degraded')
+    )
+
+def respond_from_cache(cached_response: Dict, session_id: str, chat_service: ChatService, stream: bool):
+    """Save a cached answer to the session history and return it (JSON or SSE)."""
+    cached_chat_response = save_answer(cached_response, session_id, chat_service)
+    if stream:
+        return event_stream_response(stream_single_response(cached_chat_response))
+    return cached_chat_response
+
+async def stream_flight_response(flight: Flight, session_id: str, chat_service: ChatService):
+    """
+    SSE view of a (possibly shared) RAG pipeline run: replay and follow its tokens,
+    then save this request's copy of the answer and finish with a `done` event.
+    """
+    streamed = False
+    try:
+        async for section, content in flight.subscribe():
+            streamed = True
+            if content:
+                yield format_sse("token", {"content": content, "section": section})
+            else:
+                # A new === SECTION === began; its text follows as token events
+                yield format_sse("section", {"section": section})
+
+        answer = await flight.result()
+        chat_response = save_answer(answer, session_id, chat_service)
+        if streamed and chat_response.degraded:
+            # The model stream was cut off; the client replaces the partial text with this answer
+            yield format_sse("degraded", {"level": chat_response.degraded, "content": chat_response.response})
+        elif not streamed:
+            # Pipeline answered without streaming (semantic cache hit or a non-stream leader)
+            yield format_sse("token", {"content": chat_response.response})
+        yield format_sse("done", chat_response_payload(chat_response))
+
+    except HTTPException as e:
+        yield format_sse("error", {"session_id": session_id, "detail": e.detail})
+    except Exception as e:
+        print(f"Error during stream processing for session {session_id}: {e}")
+        traceback.print_exc()
+        yield format_sse("error", {
+            "session_id": session_id,
+            "detail": f"Terjadi kesalahan saat memproses jawaban: {str(e)}"
+        })
+    finally:
+        # Sesi DB khusus stream dibuka oleh chat_with_rag; tutup setelah stream selesai
+        chat_service.db.close()
 
 async def stream_rag_response(
     query_text: str,
     unified_prompt: str,
-    session_id: str,
-    chat_service: ChatService,
-    query_cache: QueryCache,
-    chunks_by_file: Dict[str, List[str]] # <-- Tambahkan ini untuk parsing 'sources'
+    flight: Flight,
+    chunks_by_file: Dict[str, List[str]],
+    deadline: Optional[float] = None
 ):
     """
-    Generator function to stream response from OpenRouter,
-    then save the full response to DB/Cache after completion.
+    Stream the completion from OpenRouter, parsing sections as deltas arrive and
+    publishing (section, text) events to the flight (and so to every subscribed
+    SSE client). Returns (raw text, parsed answer).
     """
-    full_response_text = ""
+    parser = StructuredAnswerParser()
     start_time = datetime.now()
-    
-    try:
-        # 1. Panggil API dengan stream=True
-        print(f"[STREAM] Calling OpenRouter for session {session_id}...")
-        stream = get_openrouter_client().chat.completions.create(
-            model=GENERATIVE_MODEL,
-            messages=[{"role": "user", "content": unified_prompt}],
+    first_token_time = None
+
+    # 1. Panggil API dengan stream=True (client async bersama, retry sebelum byte pertama)
+    print(f"[STREAM] Calling OpenRouter for query: {query_text[:50]}...")
+    loop = asyncio.get_running_loop()
+    deadline = min(deadline or float("inf"), loop.time() + OPENROUTER_DEADLINE_SECONDS)
+
+    # 2. Iterasi stream: parse tiap potongan sekali dan teruskan per bagian ke semua subscriber
+    def _on_chunk(chunk):
+        nonlocal first_token_time
+        if not chunk.choices:
+            return
+        content = chunk.choices[0].delta.content or ""
+        if content:
+            if first_token_time is None:
+                first_token_time = datetime.now()
+                print(f"[TIMER] Time to first token: {first_token_time - start_time}")
+            for event in parser.feed(content):
+                flight.publish(event)
+
+    # Opening and reading the stream share the deadline (the HTTP timeout is per read only)
+    await consume_stream(
+        lambda: call_openrouter_with_retries(
+            app.state.client,
+            GENERATIVE_MODEL,
+            [{"role": "user", "content": unified_prompt}],
+            deadline=deadline,
             stream=True
-        )
-        
-        # 2. Iterasi stream dan yield (kirim) chunks ke client
-        for chunk in stream:
-            content = chunk.choices[0].delta.content or ""
-            if content:
-                full_response_text += content
-                yield content
-        
-        time_after_stream = datetime.now()
-        print(f"[TIMER] Stream completed in: {time_after_stream - start_time}")
-
-        # 3. Setelah stream selesai, PARSE respons lengkap
-        # (Logika ini disalin dari kode non-stream Anda)
-        
-        bot_response = full_response_text
-        summary = None
-        suggestions = None
-        sources = [] # Default
-
-        try:
-            if "=== JAWABAN UTAMA ===" in full_response_text and "=== KESIMPULAN ===" in full_response_text:
-                parts = full_response_text.split("=== JAWABAN UTAMA ===")
-                if len(parts) > 1:
-                    main_part = parts[1].split("=== KESIMPULAN ===")
-                    bot_response = main_part[0].strip()
-                    
-                    if len(main_part) > 1:
-                        rest = main_part[1]
-                        
-                        if "=== SARAN PRAKTIS ===" in rest:
-                            summary_part = rest.split("=== SARAN PRAKTIS ===")
-                            summary = summary_part[0].strip()
-                            
-                            if len(summary_part) > 1 and "=== SUMBER DOKUMEN ===" in summary_part[1]:
-                                suggestions_part = summary_part[1].split("=== SUMBER DOKUMEN ===")
-                                suggestions_text = suggestions_part[0].strip()
-                                if suggestions_text and "tidak ada saran" not in suggestions_text.lower():
-                                    suggestions = suggestions_text
-                                
-                                # EKSTRAKSI SUMBER YANG LEBIH BAIK
-                                # Gunakan chunks_by_file yang kita punya
-                                sources = [f"Dokumen: {filename}" for filename in chunks_by_file.keys()]
-
-            # Jika parsing gagal, fallback ke teks penuh
-            if not bot_response.strip():
-                bot_response = full_response_text
-                
-        except Exception as parse_error:
-            print(f"[STREAM] Could not parse structured response, using full text: {parse_error}")
-            bot_response = full_response_text
-            # Coba ambil sources dari context
-            sources = [f"Dokumen: {filename}" for filename in chunks_by_file.keys()]
-
-
-        # 4. Simpan ke Database (setelah stream selesai)
-        print(f"[STREAM] Saving full response to DB for session {session_id}")
-        chat_service.add_message(session_id, "bot", bot_response, sources, summary, suggestions)
-
-        # 5. Simpan ke Cache (setelah stream selesai)
-        print(f"[STREAM] Saving response to cache")
-        cache_data = {
-            'response': bot_response,
-            'sources': sources,
-            'summary': summary,
-            'suggestions': suggestions
+        ),
+        _on_chunk,
+        deadline,
+    )
+    for event in parser.finish():
+        flight.publish(event)
+
+    time_after_stream = datetime.now()
+    print(f"[TIMER] Stream completed in: {time_after_stream - start_time}")
+
+    # 3. Bagian sudah terkumpul selama stream; susun jawaban tanpa mem-parse ulang
+    full_response_text = parser.raw
+    if not full_response_text:
+        return full_response_text, {
+            'response': "Maaf, saya tidak dapat menghasilkan jawaban yang relevan saat ini.",
+            'sources': [],
+            'summary': None,
+            'suggestions': None
         }
-        query_cache.set(query_text, cache_data)
+    # Gunakan chunks_by_file sebagai daftar sumber
+    sources = [f"Dokumen: {filename}" for filename in chunks_by_file.keys()] if "sources" in parser.seen else []
+    return full_response_text, parser.to_answer(sources)
 
-    except Exception as e:
-        print(f"Error during stream processing for query '{query_text}': {e}")
-        traceback.print_exc()
-        # Kirim pesan error sebagai bagian dari stream
-        yield f"\n\n[ERROR] Terjadi kesalahan saat memproses jawaban: {str(e)}"
-    
 @app.post("/chat")
-async def chat_with_rag(
+async def chat_endpoint(
     chat_request: ChatRequest,
     request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_optional)
 ):
+    """Answer a chat query; streams SSE when the client sends `Accept: text/event-stream`."""
+    return await chat_with_rag(chat_request, db, current_user, stream=wants_event_stream(request))
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    chat_request: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_optional)
+):
+    """Streaming variant of /chat: `token` events followed by a final `done` event."""
+    return await chat_with_rag(chat_request, db, current_user, stream=True)
+
+async def chat_with_rag(
+    chat_request: ChatRequest,
+    db: Session,
+    current_user: Optional[User],
+    stream: bool = False
+):
 
     print("[CHAT] ===== CHAT ENDPOINT CALLED =====")
     print(f"[CHAT] Request received at: {datetime.utcnow()}")
@@ -621,12 +1443,14 @@ async def chat_with_rag(
 
     print(f"[CHAT] Received request: {chat_request.query}")
     print(f"[CHAT] Current user: {current_user.email if current_user else 'Guest'}")
-    print(f"[CHAT] FAISS index status: {faiss_index is not None}")
-    print(f"[CHAT] Doc chunks count: {len(doc_chunks) if doc_chunks else 0}")
+    # This request searches the snapshot current now, even if a rebuild swaps in another meanwhile
+    snapshot = index_snapshot
+    print(f"[CHAT] FAISS index status: {snapshot.index is not None}")
+    print(f"[CHAT] Doc chunks count: {len(snapshot.chunks)} (generation {snapshot.generation})")
 
-    if faiss_index is None or not doc_chunks:
+    if not snapshot.ready:
         # Memberikan pesan yang lebih informatif jika indeks belum siap
-        print(f"[CHAT] Error: System not ready - FAISS index: {faiss_index is not None}, Doc chunks: {len(doc_chunks) if doc_chunks else 0}")
+        print(f"[CHAT] Error: System not ready - FAISS index: {snapshot.index is not None}, Doc chunks: {len(snapshot.chunks)}")
         raise HTTPException(status_code=500, detail="Sistem belum siap. Indeks dokumen sedang dibuat atau belum ada dokumen yang diunggah. Mohon tunggu atau unggah dokumen.")
 
     query_text = chat_request.query
@@ -663,7 +1487,7 @@ async def chat_with_rag(
         # Save bot response without sources for greeting/test
         chat_service.add_message(session_id, "bot", response_text, [], None, None)
 
-        return ChatResponse(
+        greeting_response = ChatResponse(
             response=response_text,
             session_id=session_id,
             sources=[],
@@ -672,50 +1496,128 @@ async def chat_with_rag(
             suggestions=None,
             is_greeting=True
         )
+        if stream:
+            return event_stream_response(stream_single_response(greeting_response))
+        return greeting_response
 
     # Check cache before expensive RAG processing
-    cached_response = query_cache.get(query_text)
+    cached_response = await query_cache.get_async(query_text)
     if cached_response:
         # Save cached response to message history
-        chat_service.add_message(
-            session_id, "bot", 
-            cached_response['response'], 
-            cached_response.get('sources', []), 
-            cached_response.get('summary'), 
-            cached_response.get('suggestions')
-        )
-        
-        return ChatResponse(
-            response=cached_response['response'],
-            session_id=session_id,
-            sources=cached_response.get('sources', []),
-            sources_count=len(cached_response.get('sources', [])),
-            summary=cached_response.get('summary'),
-            suggestions=cached_response.get('suggestions'),
-            is_greeting=False
-        )
+        return respond_from_cache(cached_response, session_id, chat_service, stream)
+
+    # Single-flight: identical concurrent queries share one run of the RAG pipeline;
+    # every request still saves the answer to its own session
+    flight, is_leader = rag_flights.join(
+        normalize_query(query_text),
+        lambda flight: run_rag_pipeline(query_text, flight, stream, snapshot)
+    )
+    print(f"[SINGLE_FLIGHT] {'Started' if is_leader else 'Joined'} pipeline for query: {query_text[:50]}... (waiters={flight.waiters})")
+
+    if stream:
+        # The stream outlives this request's DB dependency, so it gets its own session.
+        return event_stream_response(stream_flight_response(flight, session_id, ChatService(SessionLocal())))
+
+    return save_answer(await flight.result(), session_id, chat_service)
+
+async def embed_query(query_text: str) -> np.ndarray:
+    """Query embedding from the query-embedding cache, or from Nomic (thread pool, bounded + timeout)."""
+    key = normalize_query(query_text)
+    query_vector = query_embedding_cache.get(key)
+    if query_vector is not None:
+        print(f"[QUERY_EMBED_CACHE] HIT for query: {query_text[:50]}...")
+        return query_vector
+    query_vector = await app.state.embedding_service.generate_embedding_async(
+        query_text, task_type="RETRIEVAL_QUERY"
+    )
+    query_embedding_cache.set(key, query_vector)
+    return query_vector
+
+def diversify_chunks(chunks: List[Dict], query_vector: np.ndarray, k: int,
+                     relevance_key: Optional[str] = None) -> List[Dict]:
+    """Pick `k` of `chunks` by maximal marginal relevance (MMR_LAMBDA) over their stored embeddings.
+
+    Vectors come from the document embedding store by content hash, the same vectors
+    the index was built from, read from one consistent view of the store even while
+    a rebuild prunes it. `relevance_key` names a chunk score to rank by instead of
+    cosine to the query. On any error the first `k` chunks are kept.
+    """
+    try:
+        # Chunks missing from the store get zero vectors, which never count as redundant
+        vectors, _ = get_embedding_store().lookup([chunk['content_hash'] for chunk in chunks])
+        relevance = None
+        if relevance_key:
+            scores = np.array([chunk[relevance_key] for chunk in chunks], dtype='float32')
+            relevance = scale_relevance(scores)
+        return [chunks[i] for i in mmr_select(query_vector, vectors, k, MMR_LAMBDA, relevance)]
+    except Exception as e:
+        print(f"[MMR] Falling back to retrieval order: {e}")
+        return chunks[:k]
+
+def lexical_chunks(snapshot: IndexSnapshot, query_text: str, k: int) -> List[Dict]:
+    """Strong BM25 matches for `query_text`, for answering when the query cannot be embedded"""
+    ids, scores = snapshot.bm25.search(query_text, k)
+    chunks = []
+    for cid, score in zip(ids.tolist(), scores.tolist()):
+        chunk = snapshot.get_chunk(cid) if score >= BM25_MIN_SCORE else None
+        if chunk is not None:
+            chunks.append(chunk)
+    return chunks
+
+def degraded_answer(reason: str, chunks: List[Dict], query_vector: Optional[np.ndarray] = None) -> Dict:
+    """
+    Best answer available without the model, one level at a time: a cached answer
+    to a similar question, then quotes of the retrieved chunks. With neither the
+    request fails with 504. The level used is recorded in `degradation_metrics`.
+    """
+    if query_vector is not None and SEMANTIC_CACHE_ENABLED:
+        match = semantic_cache.closest(query_vector, DEGRADE_NEAR_MATCH_MIN_SCORE)
+        if match:
+            response, score = match
+            degradation_metrics.record(CACHED_NEAR_MATCH, reason)
+            print(f"[DEGRADE] {reason}: serving cached near-match (similarity {score:.3f})")
+            return {**response, 'degraded': CACHED_NEAR_MATCH}
+    if chunks:
+        degradation_metrics.record(EXTRACTIVE, reason)
+        print(f"[DEGRADE] {reason}: serving extractive answer from {len(chunks)} chunks")
+        return extractive_answer(chunks)
+    degradation_metrics.record(UNAVAILABLE, reason)
+    print(f"[DEGRADE] {reason}: nothing to fall back to")
+    raise HTTPException(
+        status_code=504,
+        detail="Layanan sedang terlalu lama merespons. Mohon coba lagi beberapa saat.",
+    )
 
+async def run_rag_pipeline(query_text: str, flight: Flight, stream: bool, snapshot: IndexSnapshot) -> Dict:
+    """
+    Embed, retrieve, prompt and generate an answer for `query_text`.
+
+    Runs once per single-flight key; the returned answer (cache entry shape) is
+    shared by every request that joined the flight. Streaming runs publish tokens
+    to the flight as they arrive.
+
+    The run has CHAT_DEADLINE_SECONDS in total, split across embed / search /
+    generate. A stage that fails or runs out of time degrades the answer
+    (see `degraded_answer`) rather than failing the request.
+    """
     try:
+        budget = RequestBudget(CHAT_DEADLINE_SECONDS, CHAT_STAGE_SHARES)
         start_time = datetime.now()
         print(f"[TIMER] Start processing time: {start_time}")
-        # 1. Generate embedding for the query via Nomic
-        model_for_nomic = (EMBEDDING_MODEL or "nomic-embed-text-v1.5").split("/")[-1]
+        # 1. Embed the query once; the semantic cache and FAISS search below reuse this vector
         time_before_nomic = datetime.now()
         print(f"[TIMER] Time before Nomic API: {time_before_nomic - start_time}")
-        out = embed.text(
-            texts=[query_text],
-            model=model_for_nomic,
-            task_type="search_query",
-            dimensionality=768,
-        )
+        try:
+            query_vector = await asyncio.wait_for(embed_query(query_text), budget.time_left("embed"))
+        except Exception as e:
+            # No vector: no dense search and no semantic cache, but BM25 can still find the passages
+            reason = "embed_timeout" if isinstance(e, asyncio.TimeoutError) else "embed_error"
+            print(f"[DEGRADE] Query embedding failed after {budget.elapsed():.2f}s: {e!r}")
+            return degraded_answer(reason, lexical_chunks(snapshot, query_text, RETRIEVAL_TOP_K))
         time_after_nomic = datetime.now()
         print(f"[TIMER] Time after Nomic API: {time_after_nomic - time_before_nomic}")
-        vec = out.get("embeddings", [None])[0]
-        if vec is None:
-            raise ValueError(f"Unexpected response format from Nomic embed: {out}")
 
-        query_vector = np.array(vec).astype('float32')
-        index_dim = faiss_index.d
+        index_dim = snapshot.index.d
         if query_vector.shape[0] != index_dim:
             raise HTTPException(
                 status_code=500,
@@ -725,41 +1627,115 @@ async def chat_with_rag(
                 ),
             )
 
-        query_embedding = query_vector.reshape(1, -1)
-
-        # 2. Search FAISS index for relevant chunks
-        k = 8 # Optimized: reduced from 15 to 8 for faster processing
+        # Semantic cache tier: a paraphrase of an already answered question
+        if SEMANTIC_CACHE_ENABLED:
+            semantic_response = semantic_cache.get(query_vector, query_text)
+            if semantic_response:
+                degradation_metrics.record(FULL)
+                return semantic_response
+
+        metric = metric_name(snapshot.index)
+        query_embedding = prepare_vectors(query_vector, metric)
+
+        # 2. Search FAISS index (and the BM25 index in hybrid mode) for relevant chunks
+        k = RETRIEVAL_TOP_K
+        hybrid = RETRIEVAL_MODE == "hybrid" and len(snapshot.bm25) > 0
+        mmr = MMR_LAMBDA < 1.0
+        # Qualifying chunks the reranker and MMR choose k from
+        pool_size = max(k, MMR_CANDIDATES if mmr else 0, RERANK_CANDIDATES if RERANK_ENABLED else 0)
         time_before_faiss = datetime.now()
         print(f"[TIMER] Time before FAISS search: {time_before_faiss - time_after_nomic}")
-        distances, indices = faiss_index.search(query_embedding, k)
+        distances, indices = snapshot.search(query_embedding, max(pool_size, HYBRID_CANDIDATES) if hybrid else pool_size)
         time_after_faiss = datetime.now()
         print(f"[TIMER] Time after FAISS search: {time_after_faiss - time_before_faiss}")
-        # Filter out invalid indices and apply score threshold
-        # Score threshold: 0.7 (optimized for better relevance)
-        score_threshold = 0.7
+        # Cosine similarity for normalized inner-product indexes, 1/(1+L2) for legacy ones
+        score_threshold = RETRIEVAL_MIN_SCORE if metric == "cosine" else LEGACY_L2_MIN_SCORE
+        scores = similarity_scores(distances[0], metric)
+        dense_scores = {int(idx): float(score) for score, idx in zip(scores, indices[0]) if idx >= 0}
+
+        if hybrid:
+            bm25_ids, bm25_values = snapshot.bm25.search(query_text, HYBRID_CANDIDATES)
+            bm25_scores = dict(zip(bm25_ids.tolist(), bm25_values.tolist()))
+            fused_scores = dict(reciprocal_rank_fusion([list(dense_scores), list(bm25_scores)], k=RRF_K))
+            print(f"[TIMER] Time after BM25 search + fusion: {datetime.now() - time_after_faiss}")
+            candidate_ids = list(fused_scores)
+        else:
+            bm25_scores, fused_scores = {}, {}
+            candidate_ids = list(dense_scores)
+
+        def chunk_with_scores(cid: int) -> Optional[Dict]:
+            chunk = snapshot.get_chunk(cid)
+            if chunk is None:
+                return None
+            chunk_data = chunk.copy()
+            chunk_data['similarity_score'] = dense_scores.get(cid)
+            chunk_data['position'] = snapshot.chunks.row_of(cid)
+            if hybrid:
+                chunk_data['bm25_score'] = bm25_scores.get(cid)
+                chunk_data['rrf_score'] = fused_scores[cid]
+            # Ranking score used from here on: fused rank in hybrid mode, cosine otherwise
+            chunk_data['score'] = fused_scores[cid] if hybrid else chunk_data['similarity_score']
+            return chunk_data
+
+        # A chunk qualifies on either side: cosine above the threshold, or (hybrid) a strong exact-term match
         relevant_chunks_with_metadata = []
-
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            if 0 <= idx < len(doc_chunks):
-                # Convert distance to similarity score (FAISS uses L2 distance, lower is better)
-                # For L2 distance, we can use 1/(1+distance) as similarity
-                similarity_score = 1.0 / (1.0 + distance)
-
-                if similarity_score >= score_threshold:
-                    chunk_data = doc_chunks[idx].copy()
-                    chunk_data['similarity_score'] = similarity_score
+        for cid in candidate_ids:
+            if len(relevant_chunks_with_metadata) >= pool_size:
+                break
+            if dense_scores.get(cid, float("-inf")) >= score_threshold or bm25_scores.get(cid, 0.0) >= BM25_MIN_SCORE:
+                chunk_data = chunk_with_scores(cid)
+                if chunk_data is not None:
                     relevant_chunks_with_metadata.append(chunk_data)
 
-        # If no chunks meet threshold, take top 5 chunks anyway (fallback)
-        if not relevant_chunks_with_metadata:
-            relevant_chunks_with_metadata = [doc_chunks[i] for i in indices[0][:5] if 0 <= i < len(doc_chunks)]
-        else:
-            # Limit to top 5 chunks for context (optimized from 8)
-            relevant_chunks_with_metadata = relevant_chunks_with_metadata[:5]
+        # If no chunks meet threshold, keep only the best few (fallback)
+        if not relevant_chunks_with_metadata and RETRIEVAL_FALLBACK_K > 0:
+            relevant_chunks_with_metadata = [
+                chunk_data for chunk_data in map(chunk_with_scores, candidate_ids[:RETRIEVAL_FALLBACK_K])
+                if chunk_data is not None
+            ]
+            print(f"[RETRIEVAL] No chunk above {score_threshold}; using top {len(relevant_chunks_with_metadata)} as fallback")
+
+        # Reranking and MMR are optional refinements; skip them once the search stage is out of time
+        refine = budget.time_left("search") > 0
+        if not refine:
+            print(f"[DEGRADE] Search stage over budget after {budget.elapsed():.2f}s; skipping rerank and MMR")
+
+        # Rescore by query terms, Pasal references and heading paths within the latency budget
+        reranked = False
+        if refine and RERANK_ENABLED and len(relevant_chunks_with_metadata) > 1:
+            rerank_scores, rerank_ms = reranker.rerank(
+                query_text, relevant_chunks_with_metadata,
+                [chunk_data['score'] for chunk_data in relevant_chunks_with_metadata], snapshot.bm25,
+            )
+            if rerank_scores is None:
+                print(f"[RERANK] Over the {RERANK_BUDGET_MS} ms budget ({rerank_ms:.2f} ms); keeping retrieval order")
+            else:
+                relevant_chunks_with_metadata = apply_scores(relevant_chunks_with_metadata, rerank_scores)
+                for chunk_data in relevant_chunks_with_metadata:
+                    chunk_data['score'] = chunk_data['rerank_score']
+                reranked = True
+                print(f"[RERANK] Reranked {len(relevant_chunks_with_metadata)} candidates in {rerank_ms:.2f} ms")
+
+        # Near-duplicates (amended text, neighbouring windows) give way to chunks that add something new
+        if refine and mmr and len(relevant_chunks_with_metadata) > k:
+            pool = len(relevant_chunks_with_metadata)
+            relevant_chunks_with_metadata = diversify_chunks(relevant_chunks_with_metadata, query_embedding[0], k,
+                                                             relevance_key='score' if hybrid or reranked else None)
+            print(f"[MMR] Kept {len(relevant_chunks_with_metadata)} of {pool} candidates (lambda={MMR_LAMBDA})")
+        relevant_chunks_with_metadata = relevant_chunks_with_metadata[:k]
+
+        # Dedupe, merge neighbouring chunks and fill the prompt's token budget, best first
+        packed = pack_context(
+            relevant_chunks_with_metadata, CONTEXT_TOKEN_BUDGET,
+            score=lambda c: c['score'],
+            position=lambda c: c['position'],
+        )
+        print(f"[CONTEXT] Packed {len(packed.chunks)}/{len(relevant_chunks_with_metadata)} chunks into "
+              f"~{packed.tokens}/{packed.budget} tokens ({packed.merged} merged, {packed.dropped} dropped)")
 
         # Extract text for processing and group by filename
         chunks_by_file = {}
-        for chunk_data in relevant_chunks_with_metadata:
+        for chunk_data in packed.chunks:
             filename = chunk_data["filename"]
             if filename not in chunks_by_file:
                 chunks_by_file[filename] = []
@@ -767,24 +1743,33 @@ async def chat_with_rag(
 
         # Debug info with optimized retrieval metrics
         print(f"[OPTIMIZATION] Query: {query_text}")
-        print(f"[OPTIMIZATION] Config: k={k}, threshold={score_threshold}, max_chunks=5")
+        print(f"[OPTIMIZATION] Config: k={k}, metric={metric}, threshold={score_threshold}, "
+              f"mode={'hybrid' if hybrid else 'dense'}")
         print(f"[OPTIMIZATION] Found {len(relevant_chunks_with_metadata)} chunks from {len(chunks_by_file)} files")
 
         # Show similarity scores for debugging
-        for i, chunk_data in enumerate(relevant_chunks_with_metadata[:5]):  # Show top 5
-            score = chunk_data.get('similarity_score', 'N/A')
-            print(f"Chunk {i+1}: similarity={score:.3f}" if score != 'N/A' else f"Chunk {i+1}: similarity=N/A")
+        for i, chunk_data in enumerate(relevant_chunks_with_metadata):
+            similarity = chunk_data['similarity_score']
+            line = f"Chunk {i+1}: similarity={'-' if similarity is None else f'{similarity:.3f}'}"
+            if hybrid:
+                bm25_score = chunk_data['bm25_score']
+                line += f" bm25={'-' if bm25_score is None else f'{bm25_score:.2f}'} rrf={chunk_data['rrf_score']:.4f}"
+            print(line)
 
         for filename, chunks in chunks_by_file.items():
             print(f"File {filename}: {len(chunks)} chunks")
 
         if not relevant_chunks_with_metadata:
-            return {"response": "Maaf, saya tidak menemukan informasi relevan dalam dokumen peraturan yang ada untuk pertanyaan Anda."}
+            degradation_metrics.record(FULL)
+            return {
+                'response': "Maaf, saya tidak menemukan informasi relevan dalam dokumen peraturan yang ada untuk pertanyaan Anda.",
+                'sources': [],
+                'summary': None,
+                'suggestions': None
+            }
 
         # 3. Construct prompt for Gemini (RAG approach) - OPTIMIZED UNIFIED PROMPT
-        # Combine all chunks for context
-        all_relevant_texts = [chunk_data["text"] for chunk_data in relevant_chunks_with_metadata]
-        context = "\n\n".join(all_relevant_texts)
+        context = packed.text
 
         # Prepare document sources info for structured output
         sources_info = []
@@ -935,136 +1920,78 @@ Informasi: [Penjelasan 2-3 kalimat tentang apa yang dijelaskan dokumen ini terka
 
 KUALITAS OUTPUT: Pastikan jawaban sangat terstruktur, mudah dibaca, dan profesional seperti dokumen resmi universitas."""
 
-        # Single unified API call using OpenRouter Chat Completions with retry + fallbacks
-        print(f"[OPTIMIZATION] Using unified prompt - single API call via OpenRouter Chat Completions")
-
-        def call_with_retries(model_name: str):
-            max_attempts = 3
-            backoff_seconds = 0.6
-            last_error = None
-            for attempt in range(1, max_attempts + 1):
-                try:
-                    print(f"[OPENROUTER] Attempt {attempt}/{max_attempts} using model: {model_name}")
-                    return get_openrouter_client().chat.completions.create(
-                        model=model_name,
-                        messages=[{"role": "user", "content": unified_prompt}],
-                    )
-                except Exception as err:
-                    last_error = err
-                    err_text = str(err)
-                    is_rate_limited = (
-                        "429" in err_text
-                        or "rate limit" in err_text.lower()
-                        or "rate-limited" in err_text.lower()
-                    )
-                    if attempt < max_attempts and is_rate_limited:
-                        print(f"[OPENROUTER] Rate limited on {model_name}. Backing off {backoff_seconds:.1f}s then retry...")
-                        time.sleep(backoff_seconds)
-                        backoff_seconds *= 2
-                        continue
-                    print(f"[OPENROUTER] Error on {model_name}: {err}")
-                    break
-            raise last_error if last_error else RuntimeError("Unknown error calling OpenRouter")
+        # Not enough time left for the model to write an answer: do not start it
+        if budget.remaining() < CHAT_MIN_GENERATE_SECONDS:
+            print(f"[DEGRADE] Only {budget.remaining():.2f}s left before generation")
+            return degraded_answer("budget_exhausted", packed.chunks, query_vector)
+        # The model gets what is left of the request budget, capped by the provider deadline
+        generate_deadline = min(budget.end, asyncio.get_running_loop().time() + OPENROUTER_DEADLINE_SECONDS)
 
-        # Try only the primary model with retries (no fallbacks)
-        try:
-            completion = call_with_retries(GENERATIVE_MODEL)
-            print(f"[OPENROUTER] Success with model: {GENERATIVE_MODEL}")
-        except Exception:
-            # Explicitly raise with friendly message
-            raise HTTPException(
-                status_code=500,
-                detail=(
-                    "Terjadi kesalahan saat menghubungi penyedia model (kemungkinan rate limit). "
-                    "Mohon coba lagi beberapa saat atau ganti CHAT_MODEL ke model lain."
-                ),
-            )
-        time_after_prompt = datetime.now()
-        print(f"[TIMER] Time after prompt: {time_after_prompt - time_before_prompt}")
-        response_text = (completion.choices[0].message.content if completion and completion.choices else None)
-
-        if not response_text:
-            bot_response = "Maaf, saya tidak dapat menghasilkan jawaban yang relevan saat ini."
-            summary = None
-            suggestions = None
-            sources = []
-        else:
-            
-            # Parse structured response
-            # Extract main answer (between === JAWABAN UTAMA === and === KESIMPULAN ===)
-            bot_response = response_text
-            summary = None
-            suggestions = None
-            sources = []
-            
+        if stream:
+            # Streaming path: tokens reach every subscriber as they arrive
+            print(f"[OPTIMIZATION] Streaming unified prompt via OpenRouter (SSE)")
             try:
-                # Try to parse structured sections
-                if "=== JAWABAN UTAMA ===" in response_text and "=== KESIMPULAN ===" in response_text:
-                    parts = response_text.split("=== JAWABAN UTAMA ===")
-                    if len(parts) > 1:
-                        main_part = parts[1].split("=== KESIMPULAN ===")
-                        bot_response = main_part[0].strip()
-                        
-                        if len(main_part) > 1:
-                            rest = main_part[1]
-                            
-                            # Extract summary
-                            if "=== SARAN PRAKTIS ===" in rest:
-                                summary_part = rest.split("=== SARAN PRAKTIS ===")
-                                summary = summary_part[0].strip()
-                                
-                                # Extract suggestions
-                                if len(summary_part) > 1 and "=== SUMBER DOKUMEN ===" in summary_part[1]:
-                                    suggestions_part = summary_part[1].split("=== SUMBER DOKUMEN ===")
-                                    suggestions_text = suggestions_part[0].strip()
-                                    if suggestions_text and "tidak ada saran" not in suggestions_text.lower():
-                                        suggestions = suggestions_text
-                                    
-                                    # Extract sources
-                                    if len(suggestions_part) > 1:
-                                        sources_text = suggestions_part[1].strip()
-                                        if sources_text and len(sources_text) > 20:
-                                            # Split by "Dokumen:" to get individual sources
-                                            source_items = [s.strip() for s in sources_text.split("Dokumen:") if s.strip()]
-                                            sources = [f"Dokumen: {s}" for s in source_items]
-                
-                # If parsing failed, use the whole response as answer
-                if not bot_response or bot_response == response_text:
-                    bot_response = response_text
-                    # Try simple extraction for summary at least
-                    if "kesimpulan:" in response_text.lower():
-                        parts = response_text.lower().split("kesimpulan:")
-                        if len(parts) > 1:
-                            summary_candidate = parts[1].split("\n\n")[0].strip()
-                            if len(summary_candidate) < 500:  # Reasonable summary length
-                                summary = summary_candidate
-                                
-            except Exception as parse_error:
-                print(f"[OPTIMIZATION] Could not parse structured response, using full text: {parse_error}")
-                bot_response = response_text
-
-        # Save bot response
-        chat_service.add_message(session_id, "bot", bot_response, sources, summary, suggestions)
-
-        # Cache the response for future similar queries
-        cache_data = {
-            'response': bot_response,
-            'sources': sources,
-            'summary': summary,
-            'suggestions': suggestions
-        }
-        query_cache.set(query_text, cache_data)
-
-        return ChatResponse(
-            response=bot_response,
-            session_id=session_id,
-            sources=sources,
-            sources_count=len(sources),
-            summary=summary,
-            suggestions=suggestions,
-            is_greeting=False
-        )
+                response_text, answer = await stream_rag_response(
+                    query_text, unified_prompt, flight, chunks_by_file, deadline=generate_deadline
+                )
+            except Exception as e:
+                reason = "generate_timeout" if isinstance(e, asyncio.TimeoutError) else "provider_error"
+                print(f"[DEGRADE] Streaming generation failed after {budget.elapsed():.2f}s: {e!r}")
+                return degraded_answer(reason, packed.chunks, query_vector)
+        else:
+            # Single unified API call using OpenRouter Chat Completions with retry + fallbacks
+            print(f"[OPTIMIZATION] Using unified prompt - single API call via OpenRouter Chat Completions")
 
+            # Try only the primary model with retries (no fallbacks)
+            try:
+                # The HTTP timeout is per read; wait_for bounds the whole call by the request budget
+                completion = await asyncio.wait_for(
+                    call_openrouter_with_retries(
+                        app.state.client,
+                        GENERATIVE_MODEL,
+                        [{"role": "user", "content": unified_prompt}],
+                        deadline=generate_deadline,
+                    ),
+                    timeout=max(0.0, generate_deadline - asyncio.get_running_loop().time()),
+                )
+                print(f"[OPENROUTER] Success with model: {GENERATIVE_MODEL}")
+            except asyncio.TimeoutError:
+                print(f"[DEGRADE] Generation timed out after {budget.elapsed():.2f}s")
+                return degraded_answer("generate_timeout", packed.chunks, query_vector)
+            except Exception as e:
+                # Rate limit or provider outage: fall back instead of failing the request
+                print(f"[DEGRADE] Provider error with {GENERATIVE_MODEL}: {e!r}")
+                return degraded_answer("provider_error", packed.chunks, query_vector)
+            time_after_prompt = datetime.now()
+            print(f"[TIMER] Time after prompt: {time_after_prompt - time_before_prompt}")
+            response_text = (completion.choices[0].message.content if completion and completion.choices else None)
+
+            if not response_text:
+                answer = {
+                    'response': "Maaf, saya tidak dapat menghasilkan jawaban yang relevan saat ini.",
+                    'sources': [],
+                    'summary': None,
+                    'suggestions': None
+                }
+            else:
+                # Parse structured sections (=== JAWABAN UTAMA ===, === KESIMPULAN ===, ...)
+                parsed = parse_answer(response_text)
+                answer = parsed.to_answer(parsed.listed_sources())
+
+        # Cache the response for future similar queries (only real model answers)
+        if response_text:
+            # Stamped with the build this answer was retrieved from, even if a newer one was published meanwhile
+            stamp = snapshot.stamp(chunks_by_file.keys())
+            await query_cache.set_async(query_text, answer, stamp)
+            if SEMANTIC_CACHE_ENABLED:
+                semantic_cache.set(query_vector, query_text, answer, stamp)
+
+        degradation_metrics.record(FULL)
+        print(f"[TIMER] Pipeline finished in {budget.elapsed():.2f}s of {budget.total:.0f}s budget")
+        return answer
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during chat processing for query '{query_text}': {e}")
         # Log the full traceback for debugging in development
@@ -1256,18 +2183,15 @@ async def get_knowledge_files(admin_email: str = Depends(get_current_admin), db:
     admin_service = AdminService(db)
     files = admin_service.get_knowledge_files()
 
-    # Enrich with processed chunk counts using current doc_chunks (or file fallback)
+    # Enrich with processed chunk counts using the current snapshot (or file fallback)
     try:
-        chunks_source = doc_chunks
-        if (not chunks_source) and os.path.exists(DOC_CHUNKS_PATH):
-            with open(DOC_CHUNKS_PATH, 'r', encoding='utf-8') as f:
-                chunks_source = json.load(f)
+        chunks_source = index_snapshot.chunks
+        chunks_path = published_chunk_store_path() if not len(chunks_source) else None
+        if chunks_path:
+            chunks_source = ChunkStore.load(chunks_path)
 
-        counts_by_filename: Dict[str, int] = {}
-        for ch in chunks_source or []:
-            filename = ch.get('filename')
-            if filename:
-                counts_by_filename[filename] = counts_by_filename.get(filename, 0) + 1
+        # Counted from the row table; no chunk text is decoded
+        counts_by_filename = chunks_source.counts_by_filename()
 
         # files is expected to be a list of dict-like objects
         enriched = []
@@ -1338,20 +2262,14 @@ async def sync_files_from_data_dir(
         except Exception as e:
             print(f"Sync error for {filename}: {e}")
 
-    # Rebuild index if we added anything
-    knowledge_base_updated = False
-    if created:
-        try:
-            await preprocess_documents_and_build_index()
-            load_faiss_index_and_chunks()
-            knowledge_base_updated = True
-        except Exception as e:
-            print(f"Error rebuilding knowledge base after sync: {e}")
+    # Rebuild index in the background if we added anything
+    job = index_jobs.submit(reason=f"sync {len(created)} file(s)") if created else None
 
     return {
         "synced": len(created),
         "created": created,
-        "knowledge_base_updated": knowledge_base_updated,
+        "knowledge_base_updated": False,
+        "index_job": job.to_dict() if job else None,
     }
 
 @app.post("/admin/files/upload")
@@ -1401,30 +2319,19 @@ async def upload_knowledge_file(
             uploaded_by=admin_email
         )
 
-        # Trigger reindexing immediately after upload
-        print("File uploaded successfully. Rebuilding knowledge base...")
-        try:
-            await preprocess_documents_and_build_index()
-            load_faiss_index_and_chunks()
-            print("Knowledge base rebuilt successfully after file upload.")
+        # Queue reindexing; poll /admin/index/jobs/{job_id} for progress
+        job = index_jobs.submit(reason=f"upload {knowledge_file.filename}")
+        print(f"File uploaded successfully. Knowledge base update queued as job {job.id}")
 
-            return {
-                "message": "File uploaded successfully and knowledge base updated",
-                "file_id": knowledge_file.id,
-                "filename": knowledge_file.filename,
-                "file_size": knowledge_file.file_size,
-                "knowledge_base_updated": True
-            }
-        except Exception as rebuild_error:
-            print(f"Error rebuilding knowledge base after upload: {rebuild_error}")
-            return {
-                "message": "File uploaded successfully but knowledge base update failed",
-                "file_id": knowledge_file.id,
-                "filename": knowledge_file.filename,
-                "file_size": knowledge_file.file_size,
-                "knowledge_base_updated": False,
-                "error": str(rebuild_error)
-            }
+        return {
+            "message": "File uploaded successfully; knowledge base update queued",
+            "file_id": knowledge_file.id,
+            "filename": knowledge_file.filename,
+            "file_size": knowledge_file.file_size,
+            "knowledge_base_updated": False,
+            "job_id": job.id,
+            "index_job": job.to_dict()
+        }
 
     except Exception as e:
         # Clean up file if database operation failed
@@ -1446,58 +2353,149 @@ async def delete_knowledge_file(
     admin_service = AdminService(db)
 
     if admin_service.delete_knowledge_file(file_id):
-        # Rebuild knowledge base after file deletion
-        print("File deleted successfully. Rebuilding knowledge base...")
-        try:
-            await preprocess_documents_and_build_index()
-            load_faiss_index_and_chunks()
-            print("Knowledge base rebuilt successfully after file deletion.")
-            return {
-                "message": "File deleted successfully and knowledge base updated",
-                "knowledge_base_updated": True
-            }
-        except Exception as e:
-            print(f"Error rebuilding knowledge base after deletion: {e}")
-            return {
-                "message": "File deleted successfully but knowledge base update failed",
-                "knowledge_base_updated": False,
-                "error": str(e)
-            }
+        # Queue reindexing; poll /admin/index/jobs/{job_id} for progress
+        job = index_jobs.submit(reason=f"delete file {file_id}")
+        print(f"File deleted successfully. Knowledge base update queued as job {job.id}")
+        return {
+            "message": "File deleted successfully; knowledge base update queued",
+            "knowledge_base_updated": False,
+            "job_id": job.id,
+            "index_job": job.to_dict()
+        }
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found"
         )
 
+@app.post("/admin/index/rebuild")
+async def rebuild_knowledge_index(admin_email: str = Depends(get_current_admin)):
+    """Queue a full rebuild: re-extract every document and rebuild the index structure (stored embeddings are reused)"""
+    print(f"[INDEX] Full rebuild requested by {admin_email}")
+    job = index_jobs.submit(full_rebuild=True, reason=f"full rebuild by {admin_email}")
+    return {"message": "Knowledge base rebuild queued", "job_id": job.id, "index_job": job.to_dict()}
+
+@app.get("/admin/index/jobs")
+async def list_index_jobs(admin_email: str = Depends(get_current_admin)):
+    """Recent index jobs of every worker process, newest first"""
+    return {"jobs": index_jobs.statuses()}
+
+@app.get("/admin/index/jobs/{job_id}")
+async def get_index_job(job_id: str, admin_email: str = Depends(get_current_admin)):
+    """Status, stage, chunks processed and ETA of an index job"""
+    # The job may be running in another worker process; its status file is shared
+    job_status = index_jobs.status(job_id)
+    if job_status is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Index job not found")
+    return job_status
+
+@app.get("/admin/index/settings")
+async def get_index_settings(admin_email: str = Depends(get_current_admin)):
+    """Type, build settings, recall check and current search parameters of the loaded index"""
+    snapshot = index_snapshot
+    return {
+        "index_loaded": snapshot.index is not None,
+        "vector_count": snapshot.vector_count,
+        "configured_type": INDEX_TYPE,
+        "index_generation": snapshot.generation,
+        **snapshot.settings,
+    }
+
+@app.post("/admin/index/settings")
+async def update_index_search_params(request: IndexSearchParamsRequest, admin_email: str = Depends(get_current_admin)):
+    """Tune nprobe (IVF) / efSearch (HNSW) of the loaded index without rebuilding"""
+    snapshot = index_snapshot
+    if snapshot.index is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Index belum dimuat")
+    for name, value in (("nprobe", request.nprobe), ("ef_search", request.ef_search)):
+        if value is not None and value < 1:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{name} harus >= 1")
+    # The published index is shared by in-flight requests: the new values only go into the
+    # next snapshot's settings, which `IndexSnapshot.search` passes per call
+    current = snapshot.settings.get('search') or {}
+    search = resolve_search_params(snapshot.index, request.nprobe or current.get('nprobe'),
+                                   request.ef_search or current.get('ef_search'))
+    publish_snapshot(snapshot.with_settings(search=search))
+    print(f"[INDEX] Search params updated by {admin_email}: {search}")
+    return {"type": snapshot.settings.get('type', 'flat'), "search": search}
+
 @app.get("/cache/stats")
 async def get_cache_stats():
     """Get cache statistics"""
-    stats = query_cache.stats()
+    stats = await query_cache.stats_async()
     return {
         "cache_size": stats['size'],
         "cache_max_size": stats['max_size'],
         "cache_ttl_minutes": stats['ttl_minutes'],
-        "cache_hit_rate": f"{stats['size']}/{stats['max_size']}"
+        "cache_hit_rate": f"{stats['size']}/{stats['max_size']}",
+        "cache_backend": stats['backend'],
+        "cache_bytes": stats['bytes'],
+        "cache_max_bytes": stats['max_bytes'],
+        "cache_hits": stats['hits'],
+        "cache_misses": stats['misses'],
+        "cache_stale": stats['stale'],
+        "index_generation": index_generation.generation,
+        "cache_generation_policy": CACHE_GENERATION_POLICY,
+        "semantic_cache_enabled": SEMANTIC_CACHE_ENABLED,
+        "semantic_cache": semantic_cache.stats(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "single_flight": rag_flights.stats()
     }
 
 @app.post("/cache/clear")
 async def clear_cache(current_user: User = Depends(get_current_user)):
     """Clear all cache (requires authentication)"""
-    query_cache.clear()
+    await query_cache.clear_async()
+    semantic_cache.clear()
     return {"message": "Cache cleared successfully"}
 
+def process_memory() -> Dict:
+    """Resident memory of this worker in MB. On Linux, `file_mb` is the part backed by
+    mapped files (shared between workers through the page cache) and `anon_mb` the
+    private heap; elsewhere only the peak RSS is known."""
+    try:
+        fields = {}
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    fields[key] = int(value.split()[0]) / 1024
+        return {
+            "pid": os.getpid(),
+            "rss_mb": round(fields.get("VmRSS", 0), 1),
+            "anon_mb": round(fields.get("RssAnon", 0), 1),
+            "file_mb": round(fields.get("RssFile", 0) + fields.get("RssShmem", 0), 1),
+        }
+    except OSError:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"pid": os.getpid(), "peak_rss_mb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+
 @app.get("/health")
 async def health_check():
     """Endpoint to check if the server is running and index is loaded."""
-    status = "OK" if faiss_index is not None and len(doc_chunks) > 0 else "Indexing_In_Progress_or_Failed"
-    chunk_count_val = len(doc_chunks) if doc_chunks else 0
-    cache_stats = query_cache.stats()
+    snapshot = index_snapshot
+    status = "OK" if snapshot.ready else "Indexing_In_Progress_or_Failed"
+    chunk_count_val = len(snapshot.chunks)
+    cache_stats = await query_cache.stats_async()
+    embedding_service = getattr(app.state, "embedding_service", None)
     return {
         "status": status, 
-        "index_loaded": faiss_index is not None, 
+        "index_loaded": snapshot.index is not None, 
         "chunk_count": chunk_count_val,
+        "index_generation": index_generation.generation,
+        "index_type": snapshot.settings.get('type', 'flat') if snapshot.index is not None else None,
         "cache_size": cache_stats['size'],
-        "cache_enabled": True
+        "cache_enabled": True,
+        "embedding": embedding_service.stats() if embedding_service else None,
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "index_mmap": snapshot.mapped,
+        "retrieval_mode": RETRIEVAL_MODE,
+        "bm25_terms": len(snapshot.bm25.vocab),
+        "reranker": reranker.stats() if RERANK_ENABLED else None,
+        "degradation": {**degradation_metrics.stats(), "deadline_seconds": CHAT_DEADLINE_SECONDS},
+        "memory": process_memory()
     }
 
 
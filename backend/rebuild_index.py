@@ -1,20 +1,33 @@
 #!/usr/bin/env python3
 """
 Rebuild FAISS index with all documents
+
+Chunk texts already in the embedding cache (vector_db/embeddings.*) are not sent
+to Nomic again, so a rebuild after changing one document only embeds its new text.
+The new index is built in memory and saved to a directory of its own, which is
+published only once it is complete, so a failed rebuild leaves the previous index
+in place.
+
+Usage: python rebuild_index.py [--reembed]
+  --reembed  also discard stored chunk embeddings and embed everything again
 """
 import os
-import shutil
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 load_dotenv()
 
-# Import after loading env
-from main import preprocess_documents_and_build_index, FAISS_INDEX_PATH, DOC_CHUNKS_PATH, VECTOR_DB_DIR, DATA_DIR
 import asyncio
 
-async def rebuild_index():
+async def rebuild_index(reembed: bool = False):
+    # Import after loading env, and only here: extraction workers (spawned processes)
+    # re-import this script as their __main__ and must not load the whole app
+    from main import preprocess_documents_and_build_index, published_chunk_store_path, DOC_CHUNKS_PATH, DATA_DIR, EMBEDDING_STORE_PATH, INDEX_META_PATH, CACHE_GENERATION_POLICY
+    from app.services.index_generation import IndexGeneration
+    from app.services.chunk_store import ChunkStore
+
     print("🔄 Rebuilding FAISS index with all documents...")
     
     # Check how many documents we have
@@ -30,44 +43,53 @@ async def rebuild_index():
         print("❌ No documents found in data folder!")
         return
     
-    # Remove existing index to force rebuild
-    if os.path.exists(FAISS_INDEX_PATH):
-        print(f"🗑️ Removing existing FAISS index: {FAISS_INDEX_PATH}")
-        os.remove(FAISS_INDEX_PATH)
-    
-    if os.path.exists(DOC_CHUNKS_PATH):
-        print(f"🗑️ Removing existing doc chunks: {DOC_CHUNKS_PATH}")
-        os.remove(DOC_CHUNKS_PATH)
+    # The old index stays in place until the new build is published over it
+    previous_generation = IndexGeneration.load(INDEX_META_PATH, policy=CACHE_GENERATION_POLICY).generation
+
+    if reembed:
+        for suffix in (".npy", ".json"):
+            if os.path.exists(EMBEDDING_STORE_PATH + suffix):
+                print(f"🗑️ Removing stored embeddings: {EMBEDDING_STORE_PATH + suffix}")
+                os.remove(EMBEDDING_STORE_PATH + suffix)
     
     # Rebuild index
     print("\n🚀 Starting document processing...")
-    await preprocess_documents_and_build_index()
+    try:
+        failed_files = await preprocess_documents_and_build_index(full_rebuild=True)
+    except Exception as e:
+        print(f"❌ Failed to rebuild FAISS index ({e}); the previous index was kept.")
+        return
     
     # Check results
-    if os.path.exists(FAISS_INDEX_PATH) and os.path.exists(DOC_CHUNKS_PATH):
-        print("✅ FAISS index rebuilt successfully!")
+    generation = IndexGeneration.load(INDEX_META_PATH, policy=CACHE_GENERATION_POLICY).generation
+    chunks_path = published_chunk_store_path()
+    if generation > previous_generation and chunks_path:
+        print(f"✅ FAISS index rebuilt successfully! (generation {generation})")
+
+        # The chunk store replaces the old JSON chunk list
+        if os.path.exists(DOC_CHUNKS_PATH):
+            print(f"🗑️ Removing legacy doc chunks: {DOC_CHUNKS_PATH}")
+            os.remove(DOC_CHUNKS_PATH)
         
         # Load and check chunks
-        import json
-        with open(DOC_CHUNKS_PATH, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
+        chunks = ChunkStore.load(chunks_path)
         
         print(f"📈 Total chunks created: {len(chunks)}")
         
         # Count chunks per document
-        doc_chunks = {}
-        for chunk in chunks:
-            filename = chunk.get('filename', 'Unknown')
-            if filename not in doc_chunks:
-                doc_chunks[filename] = 0
-            doc_chunks[filename] += 1
+        doc_chunks = chunks.counts_by_filename()
         
         print("\n📋 Chunks per document:")
         for filename, count in sorted(doc_chunks.items()):
             print(f"  📄 {filename}: {count} chunks")
+
+        if failed_files:
+            print("\n⚠️ Not indexed (extraction or embedding failed, run again to retry):")
+            for filename, error in sorted(failed_files.items()):
+                print(f"  📄 {filename}: {error}")
             
     else:
         print("❌ Failed to rebuild FAISS index!")
 
 if __name__ == "__main__":
-    asyncio.run(rebuild_index())
+    asyncio.run(rebuild_index(reembed="--reembed" in sys.argv))
@@ -0,0 +1,79 @@
+import pytest
+
+from app.services.answer_parser import StructuredAnswerParser, parse_answer
+
+OUTPUT = (
+    "Baik.\n"
+    "=== JAWABAN UTAMA ===\nMahasiswa dapat mengajukan cuti akademik paling lama dua semester.\n"
+    "=== KESIMPULAN ===\nCuti maksimal dua semester.\n"
+    "=== SARAN PRAKTIS ===\nAjukan sebelum semester dimulai.\n"
+    "=== SUMBER DOKUMEN ===\nDokumen: peraturan_akademik.docx\nDokumen: panduan_cuti.docx\n"
+)
+
+
+def stream(deltas):
+    parser = StructuredAnswerParser()
+    events = []
+    for delta in deltas:
+        events.extend(parser.feed(delta))
+    events.extend(parser.finish())
+    return parser, events
+
+
+def section_texts(events):
+    texts = {}
+    for section, text in events:
+        texts[section] = texts.get(section, "") + text
+    return {section: text.strip() for section, text in texts.items()}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 11, 64])
+def test_markers_split_across_deltas(size):
+    parser, events = stream([OUTPUT[i:i + size] for i in range(0, len(OUTPUT), size)])
+    whole = parse_answer(OUTPUT)
+
+    assert parser.seen == ["answer", "summary", "suggestions", "sources"]
+    for section in ("preamble", "answer", "summary", "suggestions", "sources"):
+        assert parser.text(section) == whole.text(section)
+    assert section_texts(events) == {section: whole.text(section)
+                                     for section in ("preamble", "answer", "summary", "suggestions", "sources")}
+    assert parser.raw == OUTPUT
+    assert not any("===" in text for _, text in events)
+
+
+def test_marker_split_exactly_at_its_boundaries():
+    marker = "=== KESIMPULAN ==="
+    deltas = ["=== JAWABAN UTAMA ===\nIsi jawaban. ", marker[:4], marker[4:13], marker[13:], "\nRingkas."]
+    parser, _ = stream(deltas)
+    assert parser.text("answer") == "Isi jawaban."
+    assert parser.text("summary") == "Ringkas."
+
+
+def test_held_back_prefix_that_is_not_a_marker_is_released():
+    parser = StructuredAnswerParser()
+    assert parser.feed("=== JAWABAN UTAMA ===\nNilai ==") == [("answer", ""), ("answer", "\nNilai ")]
+    assert parser.feed(" 3,00") == [("answer", "== 3,00")]
+    assert parser.finish() == []
+
+
+def test_pending_tail_flushed_at_finish():
+    parser = StructuredAnswerParser()
+    parser.feed("=== JAWABAN UTAMA ===\nSelesai ===")
+    assert parser.finish() == [("answer", "===")]
+    assert parser.text("answer") == "Selesai ==="
+
+
+def test_to_answer_from_structured_output():
+    answer = parse_answer(OUTPUT).to_answer(["Dokumen: a.docx"])
+    assert answer["response"] == "Mahasiswa dapat mengajukan cuti akademik paling lama dua semester."
+    assert answer["summary"] == "Cuti maksimal dua semester."
+    assert answer["suggestions"] == "Ajukan sebelum semester dimulai."
+    assert parse_answer(OUTPUT).listed_sources() == [
+        "Dokumen: peraturan_akademik.docx", "Dokumen: panduan_cuti.docx"]
+
+
+def test_unstructured_output_is_the_whole_answer():
+    answer = parse_answer("Jawaban tanpa penanda.\n=== SARAN PRAKTIS ===\nTidak ada saran.").to_answer([])
+    assert answer["response"].startswith("Jawaban tanpa penanda.")
+    assert answer["summary"] is None
+    assert answer["suggestions"] is None
@@ -0,0 +1,98 @@
+import math
+from collections import Counter
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+WORDS = "mahasiswa cuti akademik semester wisuda skripsi dosen nilai ujian beasiswa".split()
+
+
+def make_chunks(count, seed):
+    rng = np.random.default_rng(seed)
+    return [{"id": 1000 + i, "text": " ".join(rng.choice(WORDS, size=int(rng.integers(3, 25))))}
+            for i in range(count)]
+
+
+def brute_force_scores(chunks, query, k1=1.2, b=0.75):
+    """BM25 of every chunk for `query`, straight from the formula"""
+    docs = [Counter(tokenize(chunk["text"])) for chunk in chunks]
+    n = len(docs)
+    avg_len = sum(sum(doc.values()) for doc in docs) / n
+    scores = {}
+    for chunk, doc in zip(chunks, docs):
+        length = sum(doc.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            df = sum(1 for other in docs if term in other)
+            idf = math.log1p((n - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        if score:
+            scores[chunk["id"]] = score
+    return scores
+
+
+@pytest.mark.parametrize("query", ["cuti akademik", "wisuda", "nilai ujian ujian dosen", "beasiswa skripsi mahasiswa"])
+def test_scores_match_brute_force(query):
+    chunks = make_chunks(60, seed=7)
+    index = BM25Index.build(chunks)
+    expected = brute_force_scores(chunks, query)
+
+    ids, scores = index.search(query, k=len(chunks))
+    assert dict(zip(ids.tolist(), scores.tolist())) == pytest.approx(expected, rel=1e-5)
+    assert (np.diff(scores) <= 0).all()
+
+    top_ids, _ = index.search(query, k=5)
+    assert sorted(expected.values(), reverse=True)[:5] == pytest.approx(
+        [expected[cid] for cid in top_ids.tolist()], rel=1e-5)
+
+
+def test_incremental_build_and_load_score_like_a_fresh_build(tmp_path):
+    chunks = make_chunks(40, seed=3)
+    previous = BM25Index.build(chunks[:30])
+    incremental = BM25Index.build(chunks[10:], previous=previous)
+    fresh = BM25Index.build(chunks[10:])
+    path = str(tmp_path / "bm25.npz")
+    incremental.save(path)
+    loaded = BM25Index.load(path)
+
+    for index in (incremental, loaded):
+        ids, scores = index.search("cuti semester", k=40)
+        fresh_ids, fresh_scores = fresh.search("cuti semester", k=40)
+        assert dict(zip(ids.tolist(), scores.tolist())) == pytest.approx(
+            dict(zip(fresh_ids.tolist(), fresh_scores.tolist())), rel=1e-6)
+
+
+def test_unknown_terms_and_empty_index():
+    index = BM25Index.build(make_chunks(5, seed=1))
+    assert len(index.search("kalkulus", k=5)[0]) == 0
+    assert len(BM25Index.empty().search("cuti", k=5)[0]) == 0
+
+
+def test_reference_term_outranks_loose_words():
+    index = BM25Index.build([
+        {"id": 1, "text": "Pasal 5 mengatur cuti. Ayat 23 tentang semester."},
+        {"id": 2, "text": "Pasal 23 mengatur cuti akademik."},
+    ])
+    ids, _ = index.search("pasal 23", k=2)
+    assert ids.tolist()[0] == 2
+
+
+def test_reciprocal_rank_fusion_order():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [cid for cid, _ in fused] == [1, 3, 2, 4]
+    scores = dict(fused)
+    assert scores[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores[4] == pytest.approx(1 / 63)
+
+
+def test_reciprocal_rank_fusion_ties_keep_first_seen_order():
+    fused = reciprocal_rank_fusion([[7, 8], [8, 7]])
+    assert [cid for cid, _ in fused] == [7, 8]
+    assert fused[0][1] == pytest.approx(fused[1][1])
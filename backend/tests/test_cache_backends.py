@@ -0,0 +1,173 @@
+import time
+
+import pytest
+
+from app.services import cache_backends
+from app.services.cache_backends import MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend
+
+
+class FakeRedis:
+    """In-process stand-in for the Redis commands RedisCacheBackend uses (bytes in, bytes out)"""
+
+    def __init__(self):
+        self.strings = {}  # key -> (value, expires_at or None)
+        self.zsets = {}
+        self.hashes = {}
+
+    @staticmethod
+    def _b(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        item = self.strings.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and time.time() >= expires_at:
+            del self.strings[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.strings[key] = (self._b(value), time.time() + ex if ex else None)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.zsets.pop(key, None)
+            self.hashes.pop(key, None)
+
+    def incrby(self, key, amount):
+        value = int(self.get(key) or 0) + amount
+        self.strings[key] = (self._b(value), None)
+        return value
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrange(self, key, start, stop):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        members = [self._b(member) for member, _ in members]
+        return members[start:] if stop == -1 else members[start:stop + 1]
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = self._b(value)
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((getattr(self.client, name), args, kwargs))
+        return queue
+
+    def execute(self):
+        return [call(*args, **kwargs) for call, args, kwargs in self.calls]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_backends.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_backend(request, tmp_path):
+    def make(**limits):
+        limits = {"max_entries": 100, "max_bytes": 1024 * 1024, "ttl_seconds": 60, **limits}
+        if request.param == "sqlite":
+            return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), **limits)
+        if request.param == "redis":
+            return RedisCacheBackend(client=FakeRedis(), **limits)
+        return MemoryCacheBackend(**limits)
+    return make
+
+
+def test_round_trip(make_backend, clock):
+    backend = make_backend()
+    backend.set("a", {"response": "jawaban", "sources": ["Dokumen: a.pdf"]})
+    assert backend.get("a") == {"response": "jawaban", "sources": ["Dokumen: a.pdf"]}
+    assert backend.get("missing") is None
+
+
+def test_ttl_expiry(make_backend, clock):
+    backend = make_backend(ttl_seconds=60)
+    backend.set("a", {"v": 1})
+    clock.now += 59
+    assert backend.get("a") == {"v": 1}
+    clock.now += 2
+    assert backend.get("a") is None
+    assert backend.usage() == (0, 0)
+
+
+def test_entry_cap_evicts_least_recently_used(make_backend, clock):
+    backend = make_backend(max_entries=2)
+    backend.set("a", {"v": 1})
+    clock.now += 1
+    backend.set("b", {"v": 2})
+    clock.now += 1
+    assert backend.get("a") == {"v": 1}  # "b" is now the least recently used
+    clock.now += 1
+    backend.set("c", {"v": 3})
+    assert backend.get("b") is None
+    assert backend.get("a") == {"v": 1}
+    assert backend.get("c") == {"v": 3}
+    assert backend.usage()[0] == 2
+
+
+def test_byte_cap(make_backend, clock):
+    entry_bytes = len(cache_backends.CacheBackend._encode({"v": "x" * 100}))
+    backend = make_backend(max_bytes=entry_bytes * 2 + entry_bytes // 2)
+    for i, key in enumerate("abc"):
+        clock.now += 1
+        backend.set(key, {"v": str(i) * 100})
+    entries, total = backend.usage()
+    assert entries == 2
+    assert total <= backend.max_bytes
+    assert backend.get("a") is None
+    assert backend.get("c") == {"v": "2" * 100}
+
+
+def test_oversized_value_is_not_stored(make_backend, clock):
+    backend = make_backend(max_bytes=50)
+    backend.set("a", {"v": "x" * 100})
+    assert backend.get("a") is None
+    assert backend.usage() == (0, 0)
+
+
+def test_replace_and_clear(make_backend, clock):
+    backend = make_backend()
+    backend.set("a", {"v": "x" * 10})
+    backend.set("a", {"v": "y"})
+    assert backend.get("a") == {"v": "y"}
+    assert backend.usage() == (1, len(cache_backends.CacheBackend._encode({"v": "y"})))
+    backend.clear()
+    assert backend.usage() == (0, 0)
+    assert backend.get("a") is None
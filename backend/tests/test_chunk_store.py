@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.chunk_store import ChunkStore
+
+CHUNKS = [
+    {"id": 42, "text": "Pasal 1\nMahasiswa wajib hadir.", "heading": "Pasal 1",
+     "filename": "a.docx", "filepath": "data/a.docx"},
+    {"id": -7, "text": "Ketentuan umum — berlaku ✓", "filename": "b.docx", "filepath": "data/b.docx"},
+    {"id": 3, "text": "Pasal 2\nCuti akademik.", "heading": "Pasal 2",
+     "filename": "a.docx", "filepath": "data/a.docx"},
+]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(tmp_path, mmap):
+    original = ChunkStore.from_chunks(CHUNKS)
+    path = str(tmp_path / "chunks")
+    original.save(path)
+    assert ChunkStore.exists(path)
+
+    loaded = ChunkStore.load(path, mmap=mmap)
+    assert list(loaded) == list(original)
+    assert len(loaded) == 3
+    assert loaded[1]["text"] == "Ketentuan umum — berlaku ✓"
+    assert loaded[1]["heading"] == ""
+    assert loaded[0]["heading"] == "Pasal 1"
+    assert loaded.get(-7)["filename"] == "b.docx"
+    assert loaded.get(999) is None
+    assert loaded.row_of(3) == 2
+    assert loaded.counts_by_filename() == {"a.docx": 2, "b.docx": 1}
+    assert loaded.file_mask(["a.docx"]).tolist() == [True, False, True]
+
+
+def test_mmap_load_maps_instead_of_copying(tmp_path):
+    path = str(tmp_path / "chunks")
+    ChunkStore.from_chunks(CHUNKS).save(path)
+    store = ChunkStore.load(path, mmap=True)
+    assert isinstance(store._text, np.memmap)
+    assert isinstance(store._rows, np.memmap)
+    assert not isinstance(ChunkStore.load(path, mmap=False)._text, np.memmap)
+
+
+def test_empty_store_round_trip(tmp_path):
+    path = str(tmp_path / "chunks")
+    ChunkStore.empty().save(path)
+    loaded = ChunkStore.load(path)
+    assert len(loaded) == 0 and list(loaded) == []
+    assert loaded.get(1) is None
+
+
+def test_content_hash_survives_round_trip(tmp_path):
+    chunks = [dict(CHUNKS[0], content_hash="ab" * 32)]
+    path = str(tmp_path / "chunks")
+    ChunkStore.from_chunks(chunks).save(path)
+    assert ChunkStore.load(path)[0]["content_hash"] == "ab" * 32
+
+
+def test_torn_file_set_is_rejected(tmp_path):
+    path = str(tmp_path / "chunks")
+    ChunkStore.from_chunks(CHUNKS).save(path)
+    ChunkStore.from_chunks(CHUNKS[:1]).save(str(tmp_path / "other"))
+    (tmp_path / "other.text.bin").replace(tmp_path / "chunks.text.bin")
+    with pytest.raises(ValueError):
+        ChunkStore.load(path)
+
+
+def test_from_json_matches_from_chunks(tmp_path):
+    json_path = tmp_path / "doc_chunks.json"
+    json_path.write_text(json.dumps(CHUNKS), encoding="utf-8")
+    assert list(ChunkStore.from_json(str(json_path))) == list(ChunkStore.from_chunks(CHUNKS))
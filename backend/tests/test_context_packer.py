@@ -0,0 +1,45 @@
+from app.services.context_packer import estimate_tokens, pack_context
+
+
+def chunk(position, heading, body, score=1.0, filename="peraturan.docx"):
+    return {"filename": filename, "heading": heading, "text": f"{heading}\n{body}" if heading else body,
+            "position": position, "score": score}
+
+
+def pack(chunks, budget=1000):
+    return pack_context(chunks, budget, score=lambda c: c["score"], position=lambda c: c["position"])
+
+
+def test_merged_neighbours_with_different_pasal_keep_their_headings():
+    pasal_3 = chunk(7, "BAB II > Pasal 3", "(1) Mahasiswa wajib mengisi KRS setiap semester.", score=0.9)
+    pasal_4 = chunk(8, "BAB II > Pasal 4", "(1) Cuti akademik paling lama dua semester.", score=0.8)
+    packed = pack([pasal_4, pasal_3])
+
+    assert packed.merged == 1
+    assert packed.text == (
+        "[Dokumen: peraturan.docx]\n"
+        "BAB II > Pasal 3\n(1) Mahasiswa wajib mengisi KRS setiap semester.\n"
+        "BAB II > Pasal 4\n(1) Cuti akademik paling lama dua semester."
+    )
+
+
+def test_merged_ayat_split_keeps_each_ayat_span():
+    first = chunk(3, "Pasal 9 ayat (1)-(2)", "(1) Satu.\n(2) Dua.")
+    second = chunk(4, "Pasal 9 ayat (3)", "(3) Tiga.")
+    packed = pack([first, second])
+    assert "Pasal 9 ayat (1)-(2)\n(1) Satu.\n(2) Dua.\nPasal 9 ayat (3)\n(3) Tiga." in packed.text
+
+
+def test_identical_heading_is_written_once_and_overlap_removed():
+    first = chunk(0, "", "Mahasiswa yang tidak membayar UKT sampai batas waktu dinyatakan")
+    second = chunk(1, "", "sampai batas waktu dinyatakan mengundurkan diri.")
+    packed = pack([first, second])
+    assert packed.text.endswith("Mahasiswa yang tidak membayar UKT sampai batas waktu dinyatakan mengundurkan diri.")
+
+
+def test_budget_drops_lower_scored_passages():
+    best = chunk(0, "Pasal 1", "kata " * 50, score=0.9, filename="a.docx")
+    other = chunk(0, "Pasal 2", "kata " * 50, score=0.5, filename="b.docx")
+    packed = pack([other, best], budget=estimate_tokens(f"[Dokumen: a.docx]\n{best['text']}"))
+    assert [c["filename"] for c in packed.chunks] == ["a.docx"]
+    assert packed.dropped == 1
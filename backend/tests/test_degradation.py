@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.services.degradation import (
+    EXTRACTIVE, FULL, DegradationMetrics, RequestBudget, consume_stream, extractive_answer,
+)
+
+
+class FakeStream:
+    """Async stream that yields `items`, then sleeps `gap` seconds before every further item"""
+
+    def __init__(self, items, gap=None, forever=False):
+        self.items = list(items)
+        self.gap = gap
+        self.forever = forever
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.items:
+            yield item
+        while self.forever:
+            await asyncio.sleep(self.gap)
+            yield "."
+
+    async def close(self):
+        self.closed = True
+
+
+def run_stream(stream, seconds, open_delay=0.0):
+    received = []
+
+    async def open_stream():
+        await asyncio.sleep(open_delay)
+        return stream
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await consume_stream(open_stream, received.append, loop.time() + seconds)
+            return None, loop.time() - start
+        except asyncio.TimeoutError as e:
+            return e, loop.time() - start
+
+    error, elapsed = asyncio.run(main())
+    return received, error, elapsed
+
+
+def test_complete_stream_within_deadline():
+    stream = FakeStream(["a", "b", "c"])
+    received, error, _ = run_stream(stream, 1.0)
+    assert error is None
+    assert received == ["a", "b", "c"]
+    assert stream.closed
+
+
+def test_stalled_stream_stops_at_deadline():
+    stream = FakeStream(["first"], gap=60, forever=True)
+    received, error, elapsed = run_stream(stream, 0.2)
+    assert isinstance(error, asyncio.TimeoutError)
+    assert received == ["first"]
+    assert elapsed < 1.0
+    assert stream.closed
+
+
+def test_trickling_stream_stops_at_deadline():
+    # Each chunk arrives well inside any per-read timeout, but the whole stream never ends
+    stream = FakeStream([], gap=0.02, forever=True)
+    received, error, elapsed = run_stream(stream, 0.3)
+    assert isinstance(error, asyncio.TimeoutError)
+    assert 0 < len(received) < 30
+    assert elapsed < 1.0
+    assert stream.closed
+
+
+def test_slow_open_counts_against_deadline():
+    stream = FakeStream(["a"])
+    received, error, elapsed = run_stream(stream, 0.1, open_delay=5)
+    assert isinstance(error, asyncio.TimeoutError)
+    assert received == []
+    assert elapsed < 1.0
+
+
+def test_budget_stage_ends_carry_over():
+    async def main():
+        budget = RequestBudget(10, {"embed": 0.2, "search": 0.1, "generate": 1.0})
+        return budget.time_left("embed"), budget.time_left("search"), budget.time_left("generate")
+
+    embed, search, generate = asyncio.run(main())
+    assert embed == pytest.approx(2, abs=0.1)
+    assert search == pytest.approx(3, abs=0.1)
+    assert generate == pytest.approx(10, abs=0.1)
+
+
+def test_extractive_answer_quotes_chunks_with_sources():
+    chunks = [
+        {"heading": "Pasal 5", "text": "Pasal 5\n(1) Mahasiswa wajib hadir.", "filename": "a.docx"},
+        {"heading": "", "text": "Ketentuan lain.", "filename": "b.docx"},
+    ]
+    answer = extractive_answer(chunks)
+    assert answer["degraded"] == EXTRACTIVE
+    assert "**Pasal 5**\n(1) Mahasiswa wajib hadir." in answer["response"]
+    assert answer["sources"] == ["Dokumen: a.docx", "Dokumen: b.docx"]
+
+    metrics = DegradationMetrics()
+    metrics.record(FULL)
+    metrics.record(EXTRACTIVE, "generate_timeout")
+    assert metrics.stats()["degraded_rate"] == 0.5
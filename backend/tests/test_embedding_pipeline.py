@@ -0,0 +1,67 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.embedding_pipeline import embed_in_batches, is_retryable_embedding_error
+
+
+class HTTPError(Exception):
+    def __init__(self, message, status_code=None, response=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class Timeout(Exception):
+    """Named like requests.exceptions.Timeout, the base of its ReadTimeout"""
+
+
+class ReadTimeout(Timeout):
+    pass
+
+
+@pytest.mark.parametrize("err", [
+    ConnectionResetError("reset by peer"),
+    TimeoutError(),
+    ReadTimeout("read timed out"),
+    HTTPError("slow down", status_code=429),
+    HTTPError("bad gateway", response=Response(502)),
+    Exception("503: Service Unavailable"),
+    Exception("(500, 'internal error')"),
+])
+def test_transient_errors_are_retried(err):
+    assert is_retryable_embedding_error(err)
+
+
+@pytest.mark.parametrize("err", [
+    ValueError("Nomic returned 500 embeddings for 499 inputs"),
+    HTTPError("invalid request: field 'timeout' not allowed", status_code=400),
+    HTTPError("connection limit for this key", response=Response(403)),
+    Exception("400: batch of 500 texts is too large"),
+])
+def test_other_errors_are_not_retried(err):
+    assert not is_retryable_embedding_error(err)
+
+
+def test_retries_only_transient_failures():
+    calls = {"flaky": 0, "bad": 0}
+
+    def embed_batch(texts):
+        calls[texts[0]] += 1
+        if texts[0] == "flaky" and calls["flaky"] == 1:
+            raise HTTPError("rate limited", status_code=429)
+        if texts[0] == "bad":
+            raise HTTPError("bad request", status_code=400)
+        return [[1.0, 0.0]]
+
+    received = []
+    failures = embed_in_batches(["flaky", "bad"], embed_batch, lambda positions, vectors: received.extend(positions),
+                                batch_size=1, concurrency=1, backoff_base=0.0)
+    assert received == [0]
+    assert list(failures) == [1]
+    assert calls == {"flaky": 2, "bad": 1}
@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.embedding_store import EmbeddingStore
+
+
+def vectors_for(keys, dimension=8):
+    return np.array([[hash((key, d)) % 97 + 1 for d in range(dimension)] for key in keys], dtype=np.float32)
+
+
+def test_put_many_appends_batches(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings"), model="m", dimension=8)
+    keys = [f"k{i}" for i in range(2500)]
+    for start in range(0, len(keys), 100):
+        batch = keys[start:start + 100]
+        assert store.put_many(batch, vectors_for(batch)) == len(batch)
+    assert len(store) == len(keys)
+    np.testing.assert_array_equal(store.get_many(keys), vectors_for(keys))
+    # Already stored keys and zero vectors (failed calls) are skipped
+    assert store.put_many(["k1", "new"], np.zeros((2, 8), dtype=np.float32)) == 0
+
+
+def test_save_load_then_put(tmp_path):
+    path = str(tmp_path / "embeddings")
+    store = EmbeddingStore(path, model="m", dimension=8)
+    store.put_many(["a", "b"], vectors_for(["a", "b"]))
+    store.save()
+
+    loaded = EmbeddingStore(path, model="m", dimension=8).load()
+    assert loaded.put_many(["c"], vectors_for(["c"])) == 1
+    np.testing.assert_array_equal(loaded.get_many(["a", "b", "c"]), vectors_for(["a", "b", "c"]))
+    assert len(EmbeddingStore(path, model="other", dimension=8).load()) == 0
+
+
+def test_prune_keeps_only_referenced_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings"), model="m", dimension=8)
+    store.put_many(["a", "b", "c"], vectors_for(["a", "b", "c"]))
+    assert store.prune(["c", "a"]) == 1
+    assert "b" not in store
+    np.testing.assert_array_equal(store.get_many(["a", "c"]), vectors_for(["a", "c"]))
+    store.put_many(["d"], vectors_for(["d"]))
+    np.testing.assert_array_equal(store.get("d"), vectors_for(["d"])[0])
+
+
+def test_lookup_stays_consistent_while_pruning(tmp_path):
+    import threading
+
+    keys = [f"k{i}" for i in range(400)]
+    expected = vectors_for(keys)
+    store = EmbeddingStore(str(tmp_path / "embeddings"), model="m", dimension=8)
+    store.put_many(keys, vectors_for(keys))
+    stop = threading.Event()
+
+    def rebuild():
+        # Alternately drop and re-add half of the keys, as rebuilds prune and re-embed
+        while not stop.is_set():
+            store.prune(keys[::2])
+            store.put_many(keys[1::2], vectors_for(keys[1::2]))
+
+    writer = threading.Thread(target=rebuild)
+    writer.start()
+    try:
+        for _ in range(300):
+            vectors, found = store.lookup(keys)
+            np.testing.assert_array_equal(vectors[found], expected[found])
+            assert not vectors[~found].any()
+    finally:
+        stop.set()
+        writer.join()
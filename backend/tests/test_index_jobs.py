@@ -0,0 +1,29 @@
+import asyncio
+
+from app.services.index_jobs import IndexJobQueue
+
+
+def test_job_status_is_readable_from_another_process(tmp_path):
+    status_dir = str(tmp_path / "jobs")
+
+    async def runner(job):
+        job.progress("embedding", 5, 10)
+        return {"chunk_count": 10}
+
+    async def main():
+        queue = IndexJobQueue(runner, debounce=0, status_dir=status_dir)
+        job = queue.submit(reason="upload a.docx")
+        queued = IndexJobQueue(runner, status_dir=status_dir).status(job.id)
+        while job.status not in ("done", "failed"):
+            await asyncio.sleep(0.01)
+        return job, queued
+
+    job, queued = asyncio.run(main())
+    # A queue in another worker has no such job in memory, only the shared status file
+    other_worker = IndexJobQueue(runner, status_dir=status_dir)
+    assert queued["status"] == "queued"
+    assert other_worker.status(job.id) == job.to_dict()
+    assert other_worker.status(job.id)["result"] == {"chunk_count": 10}
+    assert [status["id"] for status in other_worker.statuses()] == [job.id]
+    assert other_worker.status("missing") is None
+    assert other_worker.status("../jobs") is None
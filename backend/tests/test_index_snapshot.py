@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+from app.services.bm25_index import BM25Index
+from app.services.chunk_store import ChunkStore
+from app.services.index_generation import IndexGeneration
+from app.services.index_snapshot import IndexSnapshot, build_paths, published_build_paths
+from app.services.vector_index import build_index, chunk_id, index_description, prepare_vectors
+
+
+def make_snapshot(generation, texts):
+    chunks = [{"id": chunk_id("a.docx", text), "text": text, "filename": "a.docx"} for text in texts]
+    vectors = prepare_vectors(np.random.default_rng(generation).standard_normal((len(texts), 8)))
+    ids = np.array([chunk["id"] for chunk in chunks], dtype="int64")
+    index = build_index(vectors, index_description("flat", 8, len(texts)), ids=ids)
+    return IndexSnapshot(index, ChunkStore.from_chunks(chunks), generation, bm25=BM25Index.build(chunks))
+
+
+def test_answer_stamped_from_its_snapshot_goes_stale_after_rebuild():
+    live = IndexGeneration(1, {"a.docx": "a1", "b.docx": "b1"})
+    snapshot = IndexSnapshot(generation=1, files=dict(live.files))
+    # A rebuild that changed a.docx is published while the request is still running
+    live.update(live.next({"a.docx": "a2", "b.docx": "b1"}))
+
+    assert not live.is_current(snapshot.stamp(["a.docx"]))
+    assert live.is_current(snapshot.stamp(["b.docx"]))
+    assert snapshot.with_settings(search={}).stamp(["a.docx"]) == {"generation": 1, "files": {"a.docx": "a1"}}
+
+
+def test_each_build_is_saved_to_its_own_directory(tmp_path):
+    # Same chunk count in both builds, as after an incremental update that swapped one text
+    first = make_snapshot(1, ["pasal 1 lama", "pasal 2"])
+    second = make_snapshot(2, ["pasal 1 baru", "pasal 2"])
+    first_dir = first.save_build(str(tmp_path))
+    second_dir = second.save_build(str(tmp_path))
+
+    assert first_dir != second_dir and first_dir.startswith("gen-1-") and second_dir.startswith("gen-2-")
+    for name, expected in ((first_dir, "pasal 1 lama"), (second_dir, "pasal 1 baru")):
+        paths = build_paths(os.path.join(str(tmp_path), name))
+        loaded = IndexSnapshot.load(*paths, mmap=True)
+        assert loaded.index_path == paths[0]
+        assert [chunk["text"] for chunk in loaded.chunks] == [expected, "pasal 2"]
+        found, _ = loaded.bm25.search(expected.split()[-1], 1)
+        assert loaded.get_chunk(found[0])["text"] == expected
+
+
+def test_metadata_names_the_published_build(tmp_path):
+    root = str(tmp_path)
+    # Before per-build directories the files sat in vector_db itself
+    assert published_build_paths(root) == build_paths(root)
+
+    name = make_snapshot(3, ["pasal 1"]).save_build(root)
+    meta_path = os.path.join(root, "index_meta.json")
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"generation": 3, "build_dir": name}, f)
+    assert published_build_paths(root) == build_paths(os.path.join(root, name))
+
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"generation": 4, "build_dir": None}, f)
+    assert published_build_paths(root) is None
+
+
+def test_search_settings_are_passed_per_call_not_set_on_the_shared_index():
+    rng = np.random.default_rng(5)
+    vectors = prepare_vectors(rng.standard_normal((2000, 16)))
+    settings = index_description("ivf_flat", 16, len(vectors), nlist=32)
+    index = build_index(vectors, settings, ids=np.arange(len(vectors), dtype="int64"))
+    published = IndexSnapshot(index, settings={**settings, "search": {"nprobe": 1}})
+    tuned = published.with_settings(search={"nprobe": 32})
+
+    queries = prepare_vectors(rng.standard_normal((100, 16)))
+    exact = np.argmax(queries @ vectors.T, axis=1)
+    _, narrow = published.search(queries, 1)
+    _, wide = tuned.search(queries, 1)
+    assert (wide[:, 0] == exact).all()
+    assert (narrow[:, 0] != exact).any()
+    # Requests still holding the published snapshot keep its setting; the index is untouched
+    assert index.nprobe == 1 and published.settings["search"] == {"nprobe": 1}
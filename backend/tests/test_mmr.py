@@ -0,0 +1,30 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.mmr import mmr_select, scale_relevance
+
+
+@pytest.mark.parametrize("scores", [[0.0, 0.0, 0.0], [-0.5, -0.2, -0.9], [0.0, -1.0, 0.0], [2.0, 2.0]])
+def test_scale_relevance_is_finite_for_non_positive_scores(scores):
+    relevance = scale_relevance(np.array(scores))
+    assert np.isfinite(relevance).all()
+    assert relevance.min() >= 0 and relevance.max() == pytest.approx(1.0)
+
+
+def test_scale_relevance_keeps_order_and_ratio():
+    assert scale_relevance(np.array([0.02, 0.01, 0.015])) == pytest.approx([1.0, 0.5, 0.75])
+    assert np.argsort(-scale_relevance(np.array([-0.5, -0.2, -0.9]))).tolist() == [1, 0, 2]
+    assert scale_relevance(np.array([])).size == 0
+
+
+def test_mmr_with_negative_scores_follows_score_order():
+    vectors = np.eye(3, dtype=np.float32)
+    relevance = scale_relevance(np.array([-0.5, -0.2, -0.9]))
+    assert mmr_select(vectors[0], vectors, 3, 0.7, relevance) == [1, 0, 2]
+
+
+def test_mmr_skips_near_duplicate():
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]], dtype=np.float32)
+    relevance = scale_relevance(np.array([1.0, 0.95, 0.6]))
+    assert mmr_select(vectors[0], vectors, 2, 0.5, relevance) == [0, 2]
@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.index_generation import IndexGeneration
+from app.services.semantic_cache import SemanticQueryCache
+
+
+def unit(angle):
+    """2-d unit vector at `angle` radians, so cosine between two is cos(difference)"""
+    return np.array([np.cos(angle), np.sin(angle)], dtype=np.float32)
+
+
+def test_hit_above_threshold_miss_below():
+    cache = SemanticQueryCache(threshold=0.95, near_miss_margin=0.05)
+    cache.set(unit(0.0), "syarat wisuda", {"response": "A"})
+
+    assert cache.get(unit(0.2), "paraphrase")["response"] == "A"  # cos 0.980
+    assert cache.get(unit(0.4), "near") is None                   # cos 0.921
+    assert cache.get(unit(1.2), "other") is None                  # cos 0.362
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["near_misses"]) == (1, 2, 1)
+
+
+def test_returns_the_most_similar_entry():
+    cache = SemanticQueryCache(threshold=0.9)
+    cache.set(unit(0.0), "a", {"response": "A"})
+    cache.set(unit(0.3), "b", {"response": "B"})
+    assert cache.get(unit(0.25))["response"] == "B"
+    assert cache.get(unit(0.05))["response"] == "A"
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = SemanticQueryCache(max_size=2, threshold=0.99)
+    cache.set(unit(0.0), "a", {"response": "A"})
+    cache.set(unit(1.0), "b", {"response": "B"})
+    assert cache.get(unit(0.0))["response"] == "A"
+    cache.set(unit(2.0), "c", {"response": "C"})
+    assert cache.get(unit(1.0)) is None
+    assert cache.get(unit(0.0))["response"] == "A"
+    assert cache.stats()["size"] == 2
+
+
+def test_rebuild_invalidates_answers_from_changed_files():
+    generation = IndexGeneration(1, {"a.docx": "a1", "b.docx": "b1"})
+    cache = SemanticQueryCache(threshold=0.95, generation=generation)
+    cache.set(unit(0.0), "from a", {"response": "A"}, stamp=generation.stamp(["a.docx"]))
+    cache.set(unit(1.5), "from b", {"response": "B"}, stamp=generation.stamp(["b.docx"]))
+
+    generation.update(generation.next({"a.docx": "a2", "b.docx": "b1"}))
+
+    assert cache.get(unit(0.0)) is None
+    assert cache.get(unit(1.5))["response"] == "B"
+    assert cache.stats()["stale"] == 1
+    assert cache.stats()["size"] == 1
+
+
+def test_strict_policy_drops_every_older_entry():
+    generation = IndexGeneration(1, {"a.docx": "a1"}, policy="strict")
+    cache = SemanticQueryCache(threshold=0.95, generation=generation)
+    cache.set(unit(0.0), "from a", {"response": "A"}, stamp=generation.stamp(["a.docx"]))
+    generation.update(generation.next({"a.docx": "a1"}))
+    assert cache.get(unit(0.0)) is None
+
+
+def test_unstamped_entry_is_never_served_once_generations_are_tracked():
+    cache = SemanticQueryCache(threshold=0.95, generation=IndexGeneration(1))
+    cache.set(unit(0.0), "q", {"response": "A"})
+    assert cache.get(unit(0.0)) is None
+    assert cache.closest(unit(0.0), 0.5) is None
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def test_waiters_get_the_leaders_result():
+    calls = 0
+
+    async def main():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def producer(flight):
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"response": "A"}
+
+        joined = [flights.join("q", producer) for _ in range(3)]
+        assert [leader for _, leader in joined] == [True, False, False]
+        assert len({id(flight) for flight, _ in joined}) == 1
+        release.set()
+        results = await asyncio.gather(*(flight.result() for flight, _ in joined))
+        return results, flights.stats()
+
+    results, stats = asyncio.run(main())
+    assert calls == 1
+    assert results == [{"response": "A"}] * 3
+    assert stats == {"in_flight": 0, "started": 1, "coalesced": 2}
+
+
+def test_waiters_get_the_leaders_error():
+    async def main():
+        flights = SingleFlight()
+
+        async def producer(flight):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("model down")
+
+        joined = [flights.join("q", producer) for _ in range(2)]
+        return await asyncio.gather(*(flight.result() for flight, _ in joined), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, RuntimeError) and str(e) == "model down" for e in errors)
+
+
+def test_late_subscriber_replays_stream_from_the_start():
+    async def main():
+        flights = SingleFlight()
+        halfway = asyncio.Event()
+        release = asyncio.Event()
+
+        async def producer(flight):
+            flight.publish("a")
+            halfway.set()
+            await release.wait()
+            flight.publish("b")
+            return "ab"
+
+        flights.join("q", producer)
+        await halfway.wait()
+        follower, leader = flights.join("q", producer)
+        release.set()
+        tokens = [token async for token in follower.subscribe()]
+        return leader, tokens, await follower.result()
+
+    leader, tokens, result = asyncio.run(main())
+    assert not leader
+    assert tokens == ["a", "b"]
+    assert result == "ab"
+
+
+def test_cancelled_waiter_does_not_cancel_the_flight():
+    async def main():
+        flights = SingleFlight()
+
+        async def producer(flight):
+            await asyncio.sleep(0.05)
+            return "done"
+
+        flight, _ = flights.join("q", producer)
+        waiter = asyncio.create_task(flight.result())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await flight.result()
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_finished_flight_is_not_reused():
+    async def main():
+        flights = SingleFlight()
+
+        async def producer(flight):
+            return "answer"
+
+        first, _ = flights.join("q", producer)
+        await first.result()
+        second, leader = flights.join("q", producer)
+        await second.result()
+        return first is second, leader
+
+    same, leader = asyncio.run(main())
+    assert not same and leader
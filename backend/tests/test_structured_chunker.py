@@ -0,0 +1,37 @@
+import re
+
+from app.services.structured_chunker import structured_chunks
+
+
+def test_short_pasal_is_one_chunk_with_heading_path():
+    chunks = structured_chunks([
+        "BAB III", "PERKULIAHAN",
+        "Pasal 12",
+        "(1) Perkuliahan dilaksanakan dalam satu semester sebanyak enam belas kali pertemuan.",
+        "(2) Kehadiran mahasiswa paling sedikit 75% dari jumlah pertemuan.",
+    ])
+    assert len(chunks) == 1
+    assert chunks[0]["heading"] == "BAB III PERKULIAHAN > Pasal 12"
+    assert chunks[0]["text"].startswith("BAB III PERKULIAHAN > Pasal 12\n(1) Perkuliahan")
+
+
+def test_long_list_splits_between_items():
+    items = []
+    for letter in "abcdefgh":
+        items.append(f"{letter}. Mahasiswa {letter} memenuhi syarat yang ditetapkan " + "dengan ketentuan rinci " * 5 + ";")
+        items.append(f"keterangan lanjutan untuk huruf {letter} yang tetap menjadi bagian butir tersebut.")
+    paragraphs = ["Pasal 20", "(1) Mahasiswa dinyatakan lulus apabila memenuhi persyaratan sebagai berikut:"] + items
+    chunks = structured_chunks(paragraphs, max_chars=700)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        body = chunk["text"].split("\n")[1:]
+        assert re.match(r"^(\(1\)|[a-h]\.)", body[0]), body[0]
+        # Every item keeps its continuation line
+        for line, following in zip(body, body[1:] + [""]):
+            if re.match(r"^[a-h]\. ", line):
+                assert following == f"keterangan lanjutan untuk huruf {line[0]} yang tetap menjadi bagian butir tersebut."
+    # The lead-in stays with the first item
+    first_body = chunks[0]["text"].split("\n")[1:]
+    assert first_body[0].endswith("sebagai berikut:") and first_body[1].startswith("a. ")
+    assert all(chunk["heading"].startswith("Pasal 20 ayat (1)") for chunk in chunks)
@@ -0,0 +1,73 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+
+from app.services.index_snapshot import IndexSnapshot
+from app.services.vector_index import (
+    add_vectors, build_index, chunk_id, index_description, prepare_vectors, read_index,
+    remove_vectors, writable_copy,
+)
+
+DIM = 16
+
+
+def make_chunks(filename, count, seed):
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for i in range(count):
+        text = f"{filename} pasal {i}"
+        chunks.append({"id": chunk_id(filename, text), "text": text, "filename": filename})
+    return chunks, prepare_vectors(rng.standard_normal((count, DIM)))
+
+
+def chunk_ids(chunks):
+    return np.array([chunk["id"] for chunk in chunks], dtype="int64")
+
+
+def paths(tmp_path):
+    return str(tmp_path / "faiss_index.bin"), str(tmp_path / "chunks"), str(tmp_path / "bm25.npz")
+
+
+def publish(tmp_path, index, chunks):
+    """Save like publish_index_build, then reopen the files mapped"""
+    from app.services.bm25_index import BM25Index
+    from app.services.chunk_store import ChunkStore
+    IndexSnapshot(index, ChunkStore.from_chunks(chunks), 1, bm25=BM25Index.build(chunks)).save(*paths(tmp_path))
+    return IndexSnapshot.load(*paths(tmp_path), mmap=True)
+
+
+def test_flat_index_is_not_reported_mapped_without_ifc(tmp_path):
+    chunks, vectors = make_chunks("a.docx", 50, 0)
+    index = build_index(vectors, index_description("flat", DIM, len(vectors)), ids=chunk_ids(chunks))
+    path = str(tmp_path / "flat.bin")
+    faiss.write_index(index, path)
+    _, mapped = read_index(path, mmap=True)
+    assert mapped == hasattr(faiss, "IO_FLAG_MMAP_IFC")
+
+
+def test_incremental_update_after_mapped_ivf_publish(tmp_path):
+    old_chunks, old_vectors = make_chunks("a.docx", 1200, 1)
+    settings = index_description("ivf_flat", DIM, len(old_vectors), nlist=16)
+    index = build_index(old_vectors, settings, ids=chunk_ids(old_chunks))
+    snapshot = publish(tmp_path, index, old_chunks)
+    assert snapshot.mapped
+    with pytest.raises(RuntimeError):
+        faiss.clone_index(snapshot.index)
+
+    # Delete a.docx's first 200 chunks and add b.docx, as update_index_incrementally does
+    new_chunks, new_vectors = make_chunks("b.docx", 100, 2)
+    updated = writable_copy(snapshot.index, paths(tmp_path)[0])
+    assert remove_vectors(updated, chunk_ids(old_chunks[:200])) == 200
+    add_vectors(updated, new_vectors, chunk_ids(new_chunks))
+    # The published (mapped) snapshot is untouched
+    assert snapshot.index.ntotal == 1200
+
+    republished = publish(tmp_path, updated, old_chunks[200:] + new_chunks)
+    assert republished.mapped
+    assert republished.index.ntotal == 1100
+    faiss.downcast_index(republished.index).nprobe = 16
+    _, found = republished.index.search(new_vectors[:5], 1)
+    assert found[:, 0].tolist() == chunk_ids(new_chunks[:5]).tolist()
+    _, found = republished.index.search(old_vectors[:5], 1)
+    assert not set(found[:, 0].tolist()) & set(chunk_ids(old_chunks[:200]).tolist())